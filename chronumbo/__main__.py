@@ -0,0 +1,43 @@
+import argparse
+
+from chronumbo.core.jobs import (
+    run_job
+)
+
+from chronumbo.core.toolkit import (
+    Profiler
+)
+
+
+def main(argv=None):
+    """
+    Command line entry point; runs the metrics of a job config over one read of the source, and prints rows and
+    seconds per stage, e.g.:
+
+        python -m chronumbo kpi-job.json --verbose
+        python -m chronumbo kpi-job.toml --only project_res_time correspondence --profile spans.json
+
+    See run_job() for the config format.
+
+    :param argv:                list, optional          command line arguments; sys.argv if None
+    :return:                    df                      rows and seconds per stage
+    """
+
+    parser = argparse.ArgumentParser(prog='chronumbo', description='Run many event delta metrics over one read of '
+                                                                   'an event log, and write each to its target.')
+    parser.add_argument('config', help='JSON or TOML job config')
+    parser.add_argument('--only', nargs='+', metavar='METRIC', help='names of metrics to run; all if omitted')
+    parser.add_argument('--profile', metavar='PATH', help='write profiler spans of the run to PATH, as JSON')
+    parser.add_argument('--verbose', action='store_true', help='print status while running')
+    args = parser.parse_args(argv)
+
+    with Profiler() as profiler:
+        report = run_job(args.config, only=args.only, verbose=args.verbose)
+
+    profiler.to_json(args.profile) if args.profile else None
+    print(report.to_string(index=False)) if not args.verbose else None     # run_job() prints it if verbose
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from chronumbo.core.toolkit import (
+    span
+)
+
+
+# default histogram bucket edges, in seconds: 1 min, 5 min, 15 min, 1 h, 4 h, 8 h, 1 d, 2 d, 7 d, 14 d, 30 d, 90 d
+DEFAULT_BUCKETS = (0, 60, 300, 900, 3600, 14400, 28800, 86400, 172800, 604800, 1209600, 2592000, 7776000)
+
+# default rolling window sizes of rolling_summary()
+DEFAULT_WINDOWS = ('7D', '30D', '90D')
+
+# values a t-digest buffers before compressing, as a multiple of its compression; see _Summary
+DIGEST_BUFFER = 5
+
+# statistics rolling_summary() can compute, besides percentiles
+ROLLING_STATS = ('count', 'sum', 'mean', 'min', 'max')
+
+
+class DeltaSummary:
+    """
+    Mergeable summary of time deltas per group and period, kept without holding on to every delta.
+
+    Interval tables (from add_event_delta_single() or add_event_delta_paired() with output='intervals') are fed to
+    update() as they are produced, e.g. chunk by chunk from stream_event_delta(); for each key (by columns and
+    period), the summary keeps a count, sum, minimum and maximum, counts per fixed histogram bucket, and a t-digest
+    sketch for approximate percentiles. Summaries built separately, e.g. one per partition or worker process, can be
+    combined with merge(), so no rows need to be materialized in one place.
+
+    Example usage is as follows:
+
+        summary = DeltaSummary(by='team', period='W')
+
+        for intervals in stream_event_delta(chunks, add_event_delta_single, id_field='project_id',
+                                            date_field='event_date', output='intervals', ...):
+            intervals['team'] = teams.loc[intervals['project_id']].to_numpy()
+            summary.update(intervals)
+
+        summary.to_frame(percentiles=(0.5, 0.9, 0.99))      # one row per team and week
+        summary.histogram()                                 # one row per team, week and bucket
+
+    Columns given in by must be present in the tables passed to update(); columns of the event row which ended the
+    interval can be added from the event log with start_row or end_row, e.g. df.loc[intervals['end_row'], 'team'].
+    Rows with a missing delta are skipped.
+
+    :param by:                  str or list, optional   column(s) to group summaries by
+    :param period:              str, optional           pandas period frequency to group by (e.g. 'W', 'M'), or None
+    :param period_field:        str, optional           column containing date used for period
+    :param value_field:         str, optional           column containing time delta in seconds
+    :param buckets:             tuple, optional         ascending histogram bucket edges, in seconds
+    :param compression:         int, optional           t-digest compression; higher is more accurate and larger
+    """
+
+    def __init__(self, by=None, period=None, period_field='end_ts', value_field='delta_sec', buckets=DEFAULT_BUCKETS,
+                 compression=200):
+        self.by = [by] if isinstance(by, str) else list(by or [])
+        self.period = period
+        self.period_field = period_field
+        self.value_field = value_field
+        self.buckets = np.asarray(buckets, dtype=np.float64)
+        self.compression = compression
+        self.summaries = {}
+
+    def __len__(self):
+        return len(self.summaries)
+
+    def update(self, intervals):
+        """
+        Adds deltas from an interval table to the summary.
+
+        :param intervals:       df, required            table with value_field, and by and period_field columns
+        :return:                object                  this summary, updated
+        """
+
+        with span('aggregate', rows=len(intervals)):
+            intervals = intervals[intervals[self.value_field].notna()]
+            if intervals.empty:
+                return self
+
+            keys = [intervals[col] for col in self.by]
+            if self.period:
+                keys.append(intervals[self.period_field].dt.to_period(self.period).rename('period'))
+
+            values = intervals[self.value_field].astype('float64')
+            if not keys:
+                self._summary(()).update(values.to_numpy())
+                return self
+
+            for key, group in values.groupby(keys, sort=False, dropna=False, observed=True):
+                self._summary(key if isinstance(key, tuple) else (key,)).update(group.to_numpy())
+
+        return self
+
+    def merge(self, other):
+        """
+        Combines another summary, built with the same parameters, into this one; e.g. summaries of partitions of an
+        event log, or of chunks processed in separate runs.
+
+        :param other:           object, required        DeltaSummary to combine into this one
+        :return:                object                  this summary, updated
+        """
+
+        if (self.by, self.period, self.value_field) != (other.by, other.period, other.value_field) \
+                or not np.array_equal(self.buckets, other.buckets):
+            raise ValueError('cannot merge DeltaSummary objects with different by, period, value_field or buckets')
+
+        for key, summary in other.summaries.items():
+            self._summary(key).merge(summary)
+
+        return self
+
+    def to_frame(self, percentiles=(0.5, 0.9, 0.99)):
+        """
+        Returns one row per key, with count, mean, minimum, maximum and approximate percentiles of the delta in
+        seconds; percentile columns are named by percent, e.g. 'p50', 'p90', 'p99', 'p99.9'.
+
+        :param percentiles:     tuple, optional         percentiles to estimate, as fractions
+        :return:                df                      summary per key
+        """
+
+        rows = []
+        for key, summary in self.summaries.items():
+            row = dict(zip(self._key_columns, key))
+            row.update(count=summary.count, mean=summary.total / summary.count, min=summary.minimum,
+                       max=summary.maximum)
+            row.update({f'p{q * 100:g}': summary.quantile(q) for q in percentiles})
+            rows.append(row)
+
+        columns = self._key_columns + ['count', 'mean', 'min', 'max'] + [f'p{q * 100:g}' for q in percentiles]
+        return pd.DataFrame(rows, columns=columns)
+
+    def histogram(self):
+        """
+        Returns counts per key and histogram bucket. Bucket bounds are inclusive of bucket_lo and exclusive of
+        bucket_hi; the first and last buckets are open-ended, with bucket_lo or bucket_hi of -inf or inf.
+
+        :return:                df                      count per key and bucket
+        """
+
+        edges = np.concatenate([[-np.inf], self.buckets, [np.inf]])
+        rows = []
+        for key, summary in self.summaries.items():
+            for lo, hi, count in zip(edges[:-1], edges[1:], summary.histogram):
+                rows.append(dict(zip(self._key_columns, key), bucket_lo=lo, bucket_hi=hi, count=int(count)))
+
+        return pd.DataFrame(rows, columns=self._key_columns + ['bucket_lo', 'bucket_hi', 'count'])
+
+    @property
+    def _key_columns(self):
+        return self.by + (['period'] if self.period else [])
+
+    def _summary(self, key):
+        if key not in self.summaries:
+            self.summaries[key] = _Summary(self.buckets, self.compression)
+        return self.summaries[key]
+
+
+class _Summary:
+    """
+    Count, sum, extremes, histogram and t-digest of the deltas of one key of a DeltaSummary.
+
+    The t-digest is a merging t-digest, kept as arrays of centroid means and weights, sorted by mean. New values are
+    merged in, then neighbouring centroids are combined only while each centroid spans at most one unit of the k2
+    scale function, k(q) = compression / (4 log(n / compression) + 24) * log(q / (1 - q)), i.e. while
+    k(q_right) - k(q_left) <= 1. As k2 is unbounded at q = 0 and q = 1, centroids at the tails, where p99 and above
+    are read, hold single values, and those near the median are large. Quantiles are interpolated between centroid
+    midpoints, treating single-value centroids as exact, and between the outer centroids and the minimum or maximum.
+
+    As in the merging t-digest, new values are buffered alongside the centroids, and only merged in once there are
+    more than DIGEST_BUFFER times compression of them, or when a quantile is read; so summaries of many small keys
+    are not compressed on every update.
+    """
+
+    def __init__(self, buckets, compression):
+        self.buckets = buckets
+        self.compression = compression
+        self.count = 0
+        self.total = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.histogram = np.zeros(len(buckets) + 1, dtype=np.int64)
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.compressed = True
+
+    def update(self, values):
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.histogram += np.bincount(np.searchsorted(self.buckets, values, side='right'),
+                                      minlength=len(self.histogram))
+        self._add(values, np.ones(len(values)))
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.histogram += other.histogram
+        self._add(other.means, other.weights)
+
+    def quantile(self, q):
+        if not self.count:
+            return np.nan
+
+        if not self.compressed:
+            self._compress(self.means, self.weights)
+
+        means, weights, n = self.means, self.weights, self.count
+        index = q * n
+        if len(means) == 1:
+            return self.minimum + q * (self.maximum - self.minimum)
+        if index < 1:
+            return self.minimum
+        if index > n - 1:
+            return self.maximum
+
+        # between the extremes and the outer centroids, if those hold more than one value
+        if weights[0] > 1 and index < weights[0] / 2:
+            return self.minimum + (index - 1) / (weights[0] / 2 - 1) * (means[0] - self.minimum)
+        if weights[-1] > 1 and n - index <= weights[-1] / 2:
+            return self.maximum - (n - index - 1) / (weights[-1] / 2 - 1) * (self.maximum - means[-1])
+
+        # each centroid's mean sits at the midpoint of its weight; a single value covers half a unit either side of it
+        midpoints = np.cumsum(weights) - weights / 2
+        i = int(np.searchsorted(midpoints, index, side='right')) - 1
+        if i < 0:
+            return float(means[0])
+        if i >= len(means) - 1:
+            return float(means[-1])
+
+        left_unit = right_unit = 0.0
+        if weights[i] == 1:
+            if index - midpoints[i] < 0.5:
+                return float(means[i])
+            left_unit = 0.5
+        if weights[i + 1] == 1:
+            if midpoints[i + 1] - index <= 0.5:
+                return float(means[i + 1])
+            right_unit = 0.5
+
+        left = index - midpoints[i] - left_unit
+        right = midpoints[i + 1] - index - right_unit
+        return float((means[i] * right + means[i + 1] * left) / (left + right))
+
+    def _add(self, means, weights):
+        self.means = np.concatenate([self.means, means])
+        self.weights = np.concatenate([self.weights, weights])
+        self.compressed = False
+        if len(self.means) > DIGEST_BUFFER * self.compression:
+            self._compress(self.means, self.weights)
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        # greedily, as in the merging t-digest: each centroid takes the following ones while its q range stays within
+        # one unit of the scale from where it starts; one search per centroid kept, rather than a loop over values
+        n = weights.sum()
+        right = np.cumsum(weights) / n
+        normalizer = self.compression / (4 * math.log(n / self.compression) + 24)
+        starts = []
+        start = 0
+        while start < len(means):
+            starts.append(start)
+            left = float(right[start - 1]) if start else 0.0
+            if not 0 < left < 1:
+                start += 1
+                continue
+            limit = 1 / (1 + math.exp(-(math.log(left / (1 - left)) + 1 / normalizer)))
+            start = max(int(right.searchsorted(limit, side='right')), start + 1)
+
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+        self.compressed = True
+
+
+def rolling_summary(intervals, windows=DEFAULT_WINDOWS, by=None, date_field='end_ts', value_field='delta_sec',
+                    stats=('count', 'mean'), percentiles=(0.5, 0.9), freq=None):
+    """
+    Rolling statistics of deltas over several trailing windows at once, e.g. 7, 30 and 90 day average resolution
+    time per team, keyed by end date and by columns:
+
+        rolling_df = rolling_summary(intervals, windows=('7D', '30D', '90D'), by='team', freq='D')
+
+        team   end_ts       count_7d  mean_7d   p50_7d    p90_7d    count_30d  mean_30d  ...
+        -----  -----------  --------  --------  --------  --------  ---------  --------
+        infra  2023-10-01   12        86412.5   43200.0   259200.0  41         91022.3
+        infra  2023-10-02   9         79120.0   40210.0   201600.0  43         90110.8
+
+    Each row covers deltas whose date_field is within the window ending at (and including) its key date, i.e. in
+    (date - window, date]. With freq (a fixed frequency such as 'D' or 'h'), dates are floored to it first, so there
+    is one row per group and day, and a '7D' window covers that day and the six before it. Only dates on which a delta
+    ended are keyed; rows with a missing date or delta are skipped.
+
+    Rows are sorted once by group and date. Window bounds are then found for every row by one merge of row dates with
+    window start dates, and count, sum and mean of every window come from differences of one running sum, so no
+    window is recomputed from scratch. Minimum, maximum and percentiles slide over the sorted rows with pandas' rolling
+    windows, which add and drop one value at a time; percentiles are exact, with linear interpolation.
+
+    Works on interval tables (output='intervals') and, with date_field and value_field set, on event logs annotated
+    by add_event_delta_single() or add_event_delta_paired(), e.g. value_field='project_res_time_delta_sec'.
+
+    :param intervals:           df, required            table with value_field, date_field and by columns
+    :param windows:             tuple, optional         window sizes, as accepted by pandas.Timedelta (e.g. '7D')
+    :param by:                  str or list, optional   column(s) to group windows by
+    :param date_field:          str, optional           column containing date each delta is keyed by
+    :param value_field:         str, optional           column containing time delta in seconds
+    :param stats:               tuple, optional         statistics to compute; any of ROLLING_STATS
+    :param percentiles:         tuple, optional         percentiles to compute, as fractions; named e.g. 'p50', 'p90'
+    :param freq:                str, optional           fixed frequency to floor dates to, e.g. 'D'; None for none
+    :return:                    df                      by columns, date_field, and one column per statistic and
+                                                        window, named e.g. 'mean_7d', 'p90_30d'
+    """
+
+    by = [by] if isinstance(by, str) else list(by or [])
+    invalid = [stat for stat in stats if stat not in ROLLING_STATS]
+    if invalid:
+        raise ValueError(f'stats {invalid} invalid; must be in {ROLLING_STATS}')
+    widths = {_window_label(window): pd.Timedelta(window) for window in windows}
+    if any(width <= pd.Timedelta(0) for width in widths.values()):
+        raise ValueError(f'windows {windows} invalid; must be positive')
+
+    with span('rolling', rows=len(intervals)):
+        keep = intervals[value_field].notna() & intervals[date_field].notna()
+        dates = intervals.loc[keep, date_field]
+        dates = dates.dt.floor(freq) if freq else dates
+        values = intervals.loc[keep, value_field].astype('float64').to_numpy()
+        stamps = pd.DatetimeIndex(dates).as_unit('ns').asi8
+        if by:
+            codes = intervals.loc[keep, by].groupby(by, sort=True, dropna=False, observed=True).ngroup().to_numpy()
+        else:
+            codes = np.zeros(len(values), dtype=np.int64)
+
+        # sort once by group and date; each key is the last row of its group and date, so includes ties
+        order = np.lexsort((stamps, codes))
+        codes, stamps, values = codes[order], stamps[order], values[order]
+        last = np.flatnonzero(np.append((np.diff(codes) != 0) | (np.diff(stamps) != 0), True))
+
+        result = intervals.loc[keep, by].iloc[order[last]].reset_index(drop=True)
+        result[date_field] = dates.iloc[order[last]].reset_index(drop=True)
+
+        running = np.concatenate([[0.0], np.cumsum(values)])
+        series = pd.Series(values, index=pd.DatetimeIndex(stamps))
+        windowed = series.groupby(codes, sort=True) if by else series
+        window_starts = _window_starts(codes, stamps, [width.value for width in widths.values()])
+        for (label, width), starts in zip(widths.items(), window_starts):
+            starts = starts[last]
+            count = last + 1 - starts
+            total = running[last + 1] - running[starts]
+            for stat in stats:
+                if stat == 'count':
+                    result[f'count_{label}'] = count
+                elif stat == 'sum':
+                    result[f'sum_{label}'] = total
+                elif stat == 'mean':
+                    result[f'mean_{label}'] = total / count
+                else:
+                    result[f'{stat}_{label}'] = getattr(windowed.rolling(width), stat)().to_numpy()[last]
+            for q in percentiles:
+                result[f'p{q * 100:g}_{label}'] = windowed.rolling(width).quantile(q).to_numpy()[last]
+
+    return result
+
+
+def _window_starts(codes, stamps, widths):
+    """
+    Helper function to find the first row of the trailing window of each row, for rows sorted by group and date:
+    the first row of the same group dated after the row's date less width. Equivalent to a searchsorted per group,
+    done for all groups at once: dates are replaced by their rank among distinct dates, so group and rank combine
+    into one sorted integer key, and window start dates are ranked against the same distinct dates.
+
+    :param codes:               ndarray, required       group code per row, sorted
+    :param stamps:              ndarray, required       int64 date per row, sorted within group
+    :param widths:              list, required          window widths, in the units of stamps
+    :return:                    list                    position of first row in window per row, per width
+    """
+
+    distinct, ranks = np.unique(stamps, return_inverse=True)
+    stride = len(distinct) + 1
+    keys = codes * stride + ranks + 1
+    return [np.searchsorted(keys, codes * stride + np.searchsorted(distinct, stamps - width, side='right'),
+                            side='right') for width in widths]
+
+
+def _window_label(window):
+    """
+    Helper function to name a window in column names, e.g. '7D' as '7d'.
+
+    :param window:              str, required           window size, as accepted by pandas.Timedelta
+    :return:                    str                     label
+    """
+
+    if isinstance(window, str):
+        return window.replace(' ', '').lower()
+    seconds = pd.Timedelta(window).total_seconds()
+    unit, size = next((unit, size) for unit, size in (('d', 86400), ('h', 3600), ('min', 60), ('s', 1))
+                      if seconds % size == 0 or unit == 's')
+    return f'{seconds / size:g}{unit}'
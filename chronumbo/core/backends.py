@@ -0,0 +1,473 @@
+import pandas as pd
+
+from chronumbo.core.conditions import (
+    compile_conditions,
+    condition_fields
+)
+
+from chronumbo.core.event_log import (
+    PreparedEventLog
+)
+
+
+# backend the delta functions run on for frames of each package other than pandas; see frame_backend()
+FRAME_BACKENDS = {
+    'polars': 'polars',
+    'pyarrow': 'polars',                    # Arrow tables run on the Polars engine, without copying
+}
+
+# prefix of helper columns added to Polars frames while computing deltas; dropped from results
+_HELPER_PREFIX = '__chronumbo_'
+
+
+def frame_backend(df):
+    """
+    Finds the backend to compute deltas on for a frame, by the package its type comes from, without importing
+    optional packages: 'pandas' for DataFrames and PreparedEventLog, 'polars' for Polars DataFrames and LazyFrames,
+    and for pyarrow Tables, which are read and returned by the Polars engine.
+
+    :param df:                  df, required            DataFrame, PreparedEventLog, LazyFrame or pyarrow Table
+    :return:                    str                     'pandas' or 'polars'
+    """
+
+    if isinstance(df, (pd.DataFrame, PreparedEventLog)):
+        return 'pandas'
+
+    package = type(df).__module__.split('.')[0]
+    if package not in FRAME_BACKENDS:
+        raise ValueError(f'frame type {type(df).__name__} invalid; must be pandas, Polars or pyarrow')
+    return FRAME_BACKENDS[package]
+
+
+def polars_event_delta_single(df, col_prefix, id_field, date_field, start_conditions, end_conditions,
+                              start_flag='start', end_flag='end', start_na_flag='start-na', end_na_flag='end-na',
+                              start_at_earliest=True, end_at_latest=True, use_earliest_if_no_start=False,
+                              use_latest_if_no_end=False, output='log'):
+    """
+    Polars implementation of add_event_delta_single(), called by it for Polars and pyarrow frames; see
+    add_event_delta_single() for parameters. Results match the pandas implementation with typed_output=True.
+
+    The metric is built as one lazy query: per-group first and last start and end rows, and earliest and latest rows,
+    are broadcast to each row with window expressions (or aggregated with group_by() for output='intervals'), dates
+    are taken from those rows by position, and flags and deltas are computed as expressions. Polars optimizes the
+    plan as a whole (e.g. reading only the columns used, from a scan) and runs it on all cores. A LazyFrame is
+    returned as a LazyFrame, not yet collected; a DataFrame or pyarrow Table is returned as the same type.
+
+    Rows keep their order, and are grouped as by df.groupby(), as for pandas DataFrames. Flag columns are Enums of the
+    flag labels, the delta column is a Duration and delta_sec is Float64, with nulls elsewhere. For output='intervals',
+    start_row and end_row are row positions, as Polars frames have no index.
+
+    :return:                    df                      input frame with new flag and delta columns, or table of
+                                                        intervals
+    """
+
+    pl, lf, finish = _polars_frame(df)
+    row, date = pl.col(_helper('row')), pl.col(date_field)
+    schema = lf.collect_schema()
+    start = conditions_to_polars(start_conditions, schema) & pl.col(id_field).is_not_null()
+    end = conditions_to_polars(end_conditions, schema) & pl.col(id_field).is_not_null() & ~start
+
+    lf = lf.with_row_index(_helper('row'))
+    aggregates = dict(
+        first_row=row.min(),
+        start_first=pl.when(start).then(row).min(),
+        start_last=pl.when(start).then(row).max(),
+        end_first=pl.when(end).then(row).min(),
+        end_last=pl.when(end).then(row).max(),
+        earliest=row.get(date.arg_min()),              # first row of ties, as in the pandas implementation
+        latest=row.get(date.arg_max()),
+    )
+
+    h = {name: pl.col(_helper(name)) for name in ('start_first', 'start_last', 'end_first', 'end_last', 'earliest',
+                                                  'latest', 'start_pos', 'end_pos', 'delta_pos', 'no_start', 'no_end')}
+    no_start = (h['start_first'].is_null() & h['earliest'].is_not_null()) if use_earliest_if_no_start else pl.lit(False)
+    no_end = (h['end_first'].is_null() & h['latest'].is_not_null()) if use_latest_if_no_end else pl.lit(False)
+    positions = [
+        no_start.alias(_helper('no_start')),
+        no_end.alias(_helper('no_end')),
+        pl.coalesce(h['start_first' if start_at_earliest else 'start_last'],
+                    h['earliest'] if use_earliest_if_no_start else pl.lit(None)).alias(_helper('start_pos')),
+        pl.coalesce(h['end_last' if end_at_latest else 'end_first'],
+                    h['latest'] if use_latest_if_no_end else pl.lit(None)).alias(_helper('end_pos')),
+        pl.coalesce(h['end_last'], h['latest'] if use_latest_if_no_end else pl.lit(None)).alias(_helper('delta_pos')),
+    ]
+
+    if output == 'log':
+        # per-group positions broadcast to rows with window expressions, and dates taken by row position, which is
+        # far cheaper than joining a table of groups back to every row
+        valid = pl.col(id_field).is_not_null()
+        lf = lf.with_columns(
+            pl.when(valid).then(expr.over(id_field)).alias(_helper(name))
+            for name, expr in aggregates.items() if name != 'first_row'
+        ).with_columns(positions).with_columns(
+            date.gather(h['start_pos']).alias(_helper('start_ts')),
+            date.gather(h['end_pos']).alias(_helper('end_ts')),
+        )
+        start_flagged = row == h['start_first'] if start_at_earliest else start
+        end_flagged = end if end_at_latest else row == h['end_first']
+        measured = (row == h['delta_pos']) & h['start_pos'].is_not_null() & h['end_pos'].is_not_null()
+        delta = pl.col(_helper('end_ts')) - pl.col(_helper('start_ts'))
+
+        lf = lf.with_columns(
+            _flag(pl, [(start_flagged, start_flag), (h['no_start'] & (row == h['earliest']), start_na_flag)])
+            .alias(f'{col_prefix}_start'),
+            _flag(pl, [(end_flagged, end_flag), (h['no_end'] & (row == h['latest']), end_na_flag)])
+            .alias(f'{col_prefix}_end'),
+            pl.when(measured).then(delta).alias(f'{col_prefix}_delta'),
+            pl.when(measured).then(_total_seconds(pl, delta)).alias(f'{col_prefix}_delta_sec'),
+        )
+        return finish(lf.select(pl.exclude(f'^{_HELPER_PREFIX}.*$')))
+
+    groups = lf.filter(pl.col(id_field).is_not_null()).group_by(id_field).agg(
+        expr.alias(_helper(name)) for name, expr in aggregates.items()
+    ).with_columns(positions)
+    groups = _join_dates(pl, groups, lf, date_field, h['start_pos'], h['end_pos'])
+
+    kinds = pl.Enum(list(dict.fromkeys((start_flag, start_na_flag)))), \
+        pl.Enum(list(dict.fromkeys((end_flag, end_na_flag))))
+    intervals = groups.filter(h['start_pos'].is_not_null() & h['end_pos'].is_not_null()) \
+        .sort(_helper('first_row')).select(
+            pl.col(id_field),
+            pl.col(_helper('start_ts')).alias('start_ts'),
+            pl.col(_helper('end_ts')).alias('end_ts'),
+            h['start_pos'].alias('start_row'),
+            h['end_pos'].alias('end_row'),
+            pl.when(h['no_start']).then(pl.lit(start_na_flag)).otherwise(pl.lit(start_flag))
+            .cast(kinds[0]).alias('start_kind'),
+            pl.when(h['no_end']).then(pl.lit(end_na_flag)).otherwise(pl.lit(end_flag))
+            .cast(kinds[1]).alias('end_kind'),
+            _total_seconds(pl, pl.col(_helper('end_ts')) - pl.col(_helper('start_ts'))).alias('delta_sec'),
+        )
+    return finish(intervals)
+
+
+def polars_event_delta_paired(df, col_prefix, id_field, date_field, start_conditions, end_conditions,
+                              start_flag='start', end_flag='end', output='log', pairing='first_start', max_gap=None):
+    """
+    Polars implementation of add_event_delta_paired(), called by it for Polars and pyarrow frames; see
+    add_event_delta_paired() for parameters. Results match the pandas implementation with typed_output=True, and
+    frames are returned as with polars_event_delta_single().
+
+    Pairs are found as in the pandas implementation, without a per-row loop: by a state machine on cumulative sums
+    for pairing='first_start' (see _toggle_pairs()), or by an as-of join for other pairings (see _asof_pairs()).
+
+    :return:                    df                      input frame with new flag and delta columns, or table of pairs
+    """
+
+    pl, lf, finish = _polars_frame(df)
+    row = pl.col(_helper('row'))
+    schema = lf.collect_schema()
+    is_start = conditions_to_polars(start_conditions, schema)
+    is_end = conditions_to_polars(end_conditions, schema)
+
+    lf = lf.with_row_index(_helper('row'))
+    candidates = lf.select(row, pl.col(id_field), pl.col(date_field),
+                           is_start.alias(_helper('start')), is_end.alias(_helper('end'))) \
+        .filter((pl.col(_helper('start')) | pl.col(_helper('end'))) & pl.col(id_field).is_not_null())
+
+    if pairing == 'first_start':
+        pairs, opened = _toggle_pairs(pl, candidates, id_field, date_field)
+    else:
+        pairs, opened = _asof_pairs(pl, candidates, id_field, date_field, pairing), None
+
+    # pairs further apart than max_gap are dropped; a 'first_start' start stays flagged, as if never closed
+    delta = pl.col(date_field) - pl.col(_helper('start_ts'))
+    if max_gap is not None:
+        pairs = pairs.filter(~(delta > max_gap).fill_null(False))
+    if opened is None:
+        opened = pairs.select(pl.col(_helper('pair_start')).alias(_helper('row'))).unique()
+
+    if output == 'intervals':
+        # pairs are ordered by the first row of their group in the log, then by start row for 'each_start', or by
+        # end row otherwise, as with pandas
+        group_rows = lf.group_by(id_field).agg(row.min().alias(_helper('group_row')))
+        order = _helper('pair_start') if pairing == 'each_start' else _helper('row')
+        pairs = pairs.join(group_rows, on=id_field, how='left')
+        return finish(pairs.sort(_helper('group_row'), order).select(
+            pl.col(id_field),
+            pl.col(_helper('start_ts')).alias('start_ts'),
+            pl.col(date_field).alias('end_ts'),
+            pl.col(_helper('pair_start')).alias('start_row'),
+            row.alias('end_row'),
+            pl.lit(start_flag).cast(pl.Enum([start_flag])).alias('start_kind'),
+            pl.lit(end_flag).cast(pl.Enum([end_flag])).alias('end_kind'),
+            _total_seconds(pl, delta).alias('delta_sec'),
+        ))
+
+    # a row may open one pair and close another with 'latest_start'; it is then flagged as an end
+    opens, closes = pl.col(_helper('opens')).is_not_null(), pl.col(_helper('closes')).is_not_null()
+    ends = pairs.select(row, pl.lit(True).alias(_helper('closes')), delta.alias(_helper('delta')))
+    lf = lf.join(opened.with_columns(pl.lit(True).alias(_helper('opens'))), on=_helper('row'), how='left',
+                 maintain_order='left') \
+        .join(ends, on=_helper('row'), how='left', maintain_order='left') \
+        .with_columns(
+            _flag(pl, [(opens & ~closes, start_flag), (closes, end_flag)]).alias(f'{col_prefix}_delta'),
+            _total_seconds(pl, pl.col(_helper('delta'))).alias(f'{col_prefix}_delta_sec'),
+            pl.col(_helper('delta')).alias(f'{col_prefix}_delta_td'),
+        )
+    return finish(lf.select(pl.exclude(f'^{_HELPER_PREFIX}.*$')))
+
+
+def _toggle_pairs(pl, candidates, id_field, date_field):
+    """
+    Helper function to pair rows for pairing='first_start', as _pair_positions() does in chronumbo.main: among rows
+    matching start or end conditions, each row's open or closed state is worked out from the nearest preceding
+    start-only or end-only row and the number of rows matching both since then. Accepted rows then alternate start,
+    end within each group, so each accepted end closes the accepted start before it.
+
+    :param pl:                  module, required        polars
+    :param candidates:          object, required        LazyFrame of rows matching start or end conditions, in row
+                                                        order, with row, id_field, date_field, start and end columns
+    :param id_field:            str, required           column name used to group data
+    :param date_field:          str, required           column containing event date
+    :return pairs:              object                  LazyFrame of pairs; end row and date, pair_start and start_ts
+            opened:             object                  LazyFrame of accepted start rows, including unclosed ones
+    """
+
+    row = pl.col(_helper('row'))
+    h = {name: pl.col(_helper(name)) for name in ('start', 'end', 'both', 'pure', 'first', 'head', 'seen',
+                                                  'open_before', 'open_after', 'accepted_start', 'accepted_end')}
+
+    # candidates are few, so are sorted once by group and row; each group's rows, and each run within it, are then
+    # contiguous, and the state machine runs on plain cumulative sums and fills rather than per-group windows
+    candidates = candidates.sort(id_field, _helper('row'))
+
+    # each run begins at a start-only or end-only row, or at the first row of a group, followed by rows matching both;
+    # a row matching both toggles the state, which at the head of a run is open if the head is start-only
+    candidates = candidates.with_columns(
+        (h['start'] & h['end']).alias(_helper('both')),
+        (~(h['start'] & h['end'])).alias(_helper('pure')),
+        (pl.col(id_field) != pl.col(id_field).shift(1)).fill_null(True).alias(_helper('first')),
+    ).with_columns(
+        (h['pure'] | h['first']).alias(_helper('head')),
+        h['both'].cast(pl.Int64).cum_sum().alias(_helper('seen')),
+    ).with_columns(
+        pl.when(h['both'])
+        .then(pl.when(h['head']).then(h['pure'] & h['start']).forward_fill()
+              ^ ((h['seen'] - pl.when(h['head']).then(h['seen'] - h['both'].cast(pl.Int64)).forward_fill()) % 2
+                 == 0))
+        .otherwise(pl.lit(False)).alias(_helper('open_before')),
+    ).with_columns(
+        pl.when(h['both']).then(~h['open_before']).otherwise(h['start']).alias(_helper('open_after')),
+    ).with_columns(
+        pl.when(h['pure'])
+        .then(pl.when(h['first']).then(pl.lit(False)).otherwise(h['open_after'].shift(1)))
+        .otherwise(h['open_before']).alias(_helper('open_before')),
+    ).with_columns(
+        (h['start'] & ~h['open_before']).alias(_helper('accepted_start')),
+        (h['end'] & h['open_before']).alias(_helper('accepted_end')),
+    )
+
+    # accepted rows alternate start, end within each group, so each accepted end follows its start
+    accepted = candidates.filter(h['accepted_start'] | h['accepted_end']).with_columns(
+        row.shift(1).alias(_helper('pair_start')),
+        pl.col(date_field).shift(1).alias(_helper('start_ts')),
+    )
+    pairs = accepted.filter(h['accepted_end']) \
+        .select(row, pl.col(id_field), pl.col(date_field), pl.col(_helper('pair_start')), pl.col(_helper('start_ts')))
+    return pairs, accepted.filter(h['accepted_start']).select(row)
+
+
+def _asof_pairs(pl, candidates, id_field, date_field, pairing):
+    """
+    Helper function to pair rows for pairing='each_start' or 'latest_start', as _pair_positions_asof() does in
+    chronumbo.main: an as-of join by id_field on row position, of starts to the next end after each ('forward'), or
+    of ends to the latest start before each ('backward'). A row matching both conditions is never paired with itself.
+
+    :param pl:                  module, required        polars
+    :param candidates:          object, required        LazyFrame of rows matching start or end conditions, in row
+                                                        order, with row, id_field, date_field, start and end columns
+    :param id_field:            str, required           column name used to group data
+    :param date_field:          str, required           column containing event date
+    :param pairing:             str, required           'each_start' or 'latest_start'
+    :return:                    object                  LazyFrame of pairs; end row and date, pair_start and start_ts
+    """
+
+    row = pl.col(_helper('row'))
+    starts = candidates.filter(pl.col(_helper('start'))).select(
+        pl.col(id_field), row.alias(_helper('pair_start')), pl.col(date_field).alias(_helper('start_ts'))
+    )
+    ends = candidates.filter(pl.col(_helper('end'))).select(pl.col(id_field), row, pl.col(date_field))
+
+    if pairing == 'each_start':
+        pairs = starts.join_asof(ends, left_on=_helper('pair_start'), right_on=_helper('row'), by=id_field,
+                                 strategy='forward', allow_exact_matches=False, check_sortedness=False)
+        pairs = pairs.filter(row.is_not_null())
+    else:
+        pairs = ends.join_asof(starts, left_on=_helper('row'), right_on=_helper('pair_start'), by=id_field,
+                               strategy='backward', allow_exact_matches=False, check_sortedness=False)
+        pairs = pairs.filter(pl.col(_helper('pair_start')).is_not_null())
+
+    return pairs.select(row, pl.col(id_field), pl.col(date_field), pl.col(_helper('pair_start')),
+                        pl.col(_helper('start_ts')))
+
+
+def conditions_to_polars(conditions, schema):
+    """
+    Translates conditions (see compile_conditions()) into a Polars boolean expression. Missing values never match an
+    operator other than 'isnull', and '$not' negates the result, as in pandas; 'regex' patterns use Polars' regex
+    syntax.
+
+    :param conditions:          dict, required          dict of column names and expected values or operator dicts
+    :param schema:              dict, required          column names and Polars dtypes of the frame
+    :return:                    object                  Polars expression
+    """
+
+    pl = _import_polars()
+    node = compile_conditions(conditions)
+    missing = [field for field in condition_fields(node) if field not in schema]
+    if missing:
+        raise ValueError(f'condition columns {missing} not found')
+    return _node_to_polars(pl, node, schema)
+
+
+def _node_to_polars(pl, node, schema):
+    """
+    Helper function to translate a condition tree from compile_conditions() into a Polars expression.
+
+    :param pl:                  module, required        polars
+    :param node:                tuple, required         condition tree
+    :param schema:              dict, required          column names and Polars dtypes of the frame
+    :return:                    object                  Polars expression
+    """
+
+    kind = node[0]
+    if kind in ('and', 'or'):
+        children = [_node_to_polars(pl, child, schema) for child in node[1]]
+        if not children:
+            return pl.lit(kind == 'and')
+        return pl.all_horizontal(children) if kind == 'and' else pl.any_horizontal(children)
+    if kind == 'not':
+        return ~_node_to_polars(pl, node[1], schema)
+
+    _, field, op, operand = node
+    col = pl.col(field)
+    if op in ('isnull', 'notnull'):
+        return col.is_null() == (operand == (op == 'isnull'))
+
+    if schema[field].is_temporal():
+        operand = _temporal_operand(operand)
+
+    if op == 'eq':
+        expr = col == operand
+    elif op == 'ne':
+        expr = col != operand
+    elif op in ('in', 'not_in'):
+        expr = col.is_in(list(operand)) if op == 'in' else ~col.is_in(list(operand))
+        expr = expr & col.is_not_null()
+    elif op in ('gt', 'ge', 'lt', 'le'):
+        expr = getattr(col, op)(operand)
+    elif op == 'between':
+        expr = col.is_between(operand[0], operand[1], closed='both')
+    else:
+        text = col if schema[field] == pl.String else col.cast(pl.String)
+        if op in ('startswith', 'endswith', 'contains'):
+            method = {'startswith': text.str.starts_with, 'endswith': text.str.ends_with,
+                      'contains': lambda pattern: text.str.contains(pattern, literal=True)}[op]
+            patterns = operand if isinstance(operand, tuple) else (operand,)
+            expr = pl.any_horizontal([method(pattern) for pattern in patterns])
+        else:
+            expr = text.str.contains(operand)
+
+    return expr.fill_null(False)
+
+
+def _temporal_operand(operand):
+    """
+    Helper function to convert date strings in an operand to datetimes, for comparison with a temporal column.
+
+    :param operand:             any, required           operand of a condition tree leaf
+    :return:                    any                     operand, with strings as datetime.datetime
+    """
+
+    if isinstance(operand, tuple):
+        return tuple(_temporal_operand(value) for value in operand)
+    return pd.Timestamp(operand).to_pydatetime() if isinstance(operand, str) else operand
+
+
+def _polars_frame(df):
+    """
+    Helper function to take a Polars DataFrame, LazyFrame or pyarrow Table as a LazyFrame, with a function to return
+    a result as the same type as df.
+
+    :param df:                  df, required            Polars DataFrame, LazyFrame or pyarrow Table
+    :return pl:                 module                  polars
+            lf:                 object                  LazyFrame
+            finish:             function                converts a LazyFrame result to the type of df
+    """
+
+    pl = _import_polars()
+    if isinstance(df, pl.LazyFrame):
+        return pl, df, lambda result: result
+    if isinstance(df, pl.DataFrame):
+        return pl, df.lazy(), lambda result: result.collect()
+    return pl, pl.from_arrow(df).lazy(), lambda result: result.collect().to_arrow()
+
+
+def _join_dates(pl, groups, lf, date_field, start_pos, end_pos):
+    """
+    Helper function to add the dates at each group's start and end rows to a table of groups.
+
+    :param pl:                  module, required        polars
+    :param groups:              object, required        LazyFrame of groups, with start and end row positions
+    :param lf:                  object, required        LazyFrame of events, with row positions
+    :param date_field:          str, required           column containing event date
+    :param start_pos:           object, required        expression of start row position
+    :param end_pos:             object, required        expression of end row position
+    :return:                    object                  LazyFrame of groups, with start_ts and end_ts helper columns
+    """
+
+    dates = lf.select(pl.col(_helper('row')), pl.col(date_field))
+    for name, position in (('start_ts', start_pos), ('end_ts', end_pos)):
+        groups = groups.with_columns(position.alias(_helper('at'))).join(
+            dates.rename({_helper('row'): _helper('at'), date_field: _helper(name)}), on=_helper('at'), how='left'
+        ).drop(_helper('at'))
+    return groups
+
+
+def _flag(pl, cases):
+    """
+    Helper function to build a flag column expression, as an Enum of the flag labels; the first matching case wins.
+
+    :param pl:                  module, required        polars
+    :param cases:               list, required          (condition expression, flag label) pairs
+    :return:                    object                  Polars expression
+    """
+
+    expr = pl.when(cases[0][0]).then(pl.lit(cases[0][1]))
+    for condition, flag in cases[1:]:
+        expr = expr.when(condition).then(pl.lit(flag))
+    return expr.otherwise(pl.lit(None)).cast(pl.Enum(list(dict.fromkeys(flag for _, flag in cases))))
+
+
+def _total_seconds(pl, delta):
+    """
+    Helper function to convert a Duration expression to float seconds, with the same steps as _total_seconds() in
+    chronumbo.main, so results are bit-identical to the pandas implementation.
+
+    :param pl:                  module, required        polars
+    :param delta:               object, required        Duration expression
+    :return:                    object                  Float64 expression
+    """
+
+    microseconds = delta.dt.total_microseconds()
+    seconds = microseconds.floordiv(10 ** 6)
+    return seconds.cast(pl.Float64) + (microseconds - seconds * 10 ** 6) / 1e6
+
+
+def _helper(name):
+    return f'{_HELPER_PREFIX}{name}'
+
+
+def _import_polars():
+    """
+    Helper function to import polars only when a Polars or pyarrow frame is passed, as it is an optional dependency.
+
+    :return:                    module                  polars
+    """
+
+    try:
+        import polars as pl
+    except ImportError:
+        raise ImportError('polars must be installed to compute deltas on Polars or pyarrow frames; pip install polars')
+    return pl
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+
+# day from which business time is counted; any fixed day works, as only differences are used
+BUSINESS_ORIGIN = np.datetime64('1970-01-01', 'D')
+
+
+class BusinessCalendar:
+    """
+    Working hours, working days, holidays and timezone used to measure deltas in business time, e.g. for SLAs; pass
+    to add_event_delta_single() or add_event_delta_paired() as business_calendar to add a column,
+    {col_prefix}_delta_business_sec, alongside delta_sec:
+
+        calendar = BusinessCalendar(start='09:00', end='17:30', weekmask='Mon Tue Wed Thu Fri',
+                                    holidays=['2023-12-25', '2023-12-26', '2024-01-01'], tz='Europe/London')
+
+        df = add_event_delta_single(df=df, col_prefix='project_res_time', ..., business_calendar=calendar)
+
+    Business seconds are counted over whole arrays, without a per-row loop. Each timestamp is mapped to the business
+    seconds elapsed since a fixed origin: whole working days before its date (numpy.busday_count()) times the length
+    of the working day, plus the part of its own day's working hours already passed, if its date is a working day.
+    The delta is the difference between the values at end and start, so time outside working hours, on weekends and
+    on holidays is not counted, and events outside working hours count from the next opening or to the last close.
+
+    Working hours are in local time of tz. If tz is given, timezone-aware dates are converted to it, and naive dates
+    are taken to be UTC; if tz is None, dates are used as they are, in their own local time. Working hours must not
+    cross midnight.
+
+    :param start:               str, optional           start of working hours, 'HH:MM' or 'HH:MM:SS'
+    :param end:                 str, optional           end of working hours, 'HH:MM' or 'HH:MM:SS'
+    :param weekmask:            str, optional           working days, as accepted by numpy, e.g. 'Mon Tue Wed Thu Fri'
+                                                        or '1111100'
+    :param holidays:            list, optional          non-working dates
+    :param tz:                  str, optional           timezone of working hours, e.g. 'America/New_York'
+    """
+
+    def __init__(self, start='09:00', end='17:00', weekmask='Mon Tue Wed Thu Fri', holidays=None, tz=None):
+        self.start = _seconds_of_day(start)
+        self.end = _seconds_of_day(end)
+        if not 0 <= self.start < self.end <= 86400:
+            raise ValueError(f'working hours {start} to {end} invalid; start must be before end, within one day')
+
+        # normalised through numpy, so equal calendars have equal reprs whatever form they were given in
+        calendar = np.busdaycalendar(weekmask=weekmask, holidays=np.array(
+            pd.to_datetime(list(holidays or [])).to_numpy(dtype='datetime64[D]')
+        ))
+        self.weekmask = calendar.weekmask
+        self.holidays = calendar.holidays
+        self.tz = tz
+
+    def __repr__(self):
+        weekmask = ''.join('1' if day else '0' for day in self.weekmask)
+        holidays = [str(day) for day in self.holidays]
+        return (f'BusinessCalendar(start={self.start}, end={self.end}, weekmask={weekmask!r}, holidays={holidays}, '
+                f'tz={self.tz!r})')
+
+    @property
+    def day_seconds(self):
+        return self.end - self.start
+
+    def seconds(self, starts, ends):
+        """
+        Business seconds between each start and end; negative where end is before start, NaN where either is missing.
+
+        :param starts:          series, required        datetime series of start dates
+        :param ends:            series, required        datetime series of end dates, aligned to starts
+        :return:                ndarray                 float business seconds per start, end pair
+        """
+
+        return self.elapsed(ends) - self.elapsed(starts)
+
+    def elapsed(self, dates):
+        """
+        Business seconds from a fixed origin to each date; differences between these are business time deltas.
+
+        :param dates:           series, required        datetime series
+        :return:                ndarray                 float business seconds per date; NaN where date is missing
+        """
+
+        values = self._local(dates)
+        missing = np.isnat(values)
+        values = np.where(missing, BUSINESS_ORIGIN, values).astype('datetime64[us]')
+
+        days = values.astype('datetime64[D]')
+        time_of_day = (values - days) / np.timedelta64(1, 's')
+        whole_days = np.busday_count(BUSINESS_ORIGIN, days, weekmask=self.weekmask, holidays=self.holidays)
+        is_working = np.is_busday(days, weekmask=self.weekmask, holidays=self.holidays)
+
+        elapsed = whole_days * float(self.day_seconds) \
+            + np.where(is_working, np.clip(time_of_day - self.start, 0, self.day_seconds), 0.0)
+        elapsed[missing] = np.nan
+        return elapsed
+
+    def _local(self, dates):
+        """
+        Helper function to convert dates to naive local time of tz, as a numpy array.
+
+        :param dates:           series, required        datetime series
+        :return:                ndarray                 datetime64 array
+        """
+
+        dates = pd.Series(dates)
+        if self.tz is not None:
+            if dates.dt.tz is None:
+                dates = dates.dt.tz_localize('UTC')
+            dates = dates.dt.tz_convert(self.tz)
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        return dates.to_numpy(dtype='datetime64[us]')
+
+
+def _seconds_of_day(value):
+    """
+    Helper function to convert a time of day, e.g. '09:00', '17:30:00' or datetime.time, to seconds since midnight.
+
+    :param value:               str, required           time of day
+    :return:                    int                     seconds since midnight
+    """
+
+    parts = [int(part) for part in str(value).split(':')]
+    hours, minutes, seconds = (parts + [0, 0])[:3]
+    return hours * 3600 + minutes * 60 + seconds
@@ -0,0 +1,295 @@
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+# import pyarrow              # must be installed for ResultCache; imported when results are cached
+
+from chronumbo.core.toolkit import (
+    span
+)
+
+
+# bumped whenever the delta functions change what they return, so results cached by earlier versions are not reused
+CACHE_VERSION = 2
+
+# default size limit of a ResultCache, in bytes
+CACHE_MAX_BYTES = 1_000_000_000
+
+
+class ResultCache:
+    """
+    On-disk cache of delta function results, so reruns of the same metric against an unchanged event log return
+    immediately. Pass it to add_event_delta_single() or add_event_delta_paired() as cache:
+
+        cache = ResultCache('~/.cache/chronumbo', max_bytes=2_000_000_000)
+
+        df = add_event_delta_single(df=df, col_prefix='project_res_time', ..., cache=cache)     # computed, stored
+        df = add_event_delta_single(df=df, col_prefix='project_res_time', ..., cache=cache)     # read from cache
+
+    Results are keyed by the function, every parameter that affects the result (conditions, flags, earliest/latest
+    options, typed_output, output) and a fingerprint of the event log: its row count, index, and a checksum of each
+    column the metric reads (see fingerprint()). Other columns, e.g. results of earlier metrics, do not affect the key.
+    For output='log', only the columns the metric adds are stored, and are added to the event log on a hit, as they
+    would be if computed.
+
+    Each result is a Parquet file in path. When the files exceed max_bytes, the least recently used are removed;
+    reading a result marks it as used. Files are written under a temporary name and renamed, so processes can share a
+    cache. Requires pyarrow.
+
+    :param path:                str, required           directory to store results in; created if it does not exist
+    :param max_bytes:           int, optional           most bytes of results to keep
+    :param verbose:             bool, optional          if True, print status to terminal
+    """
+
+    def __init__(self, path, max_bytes=CACHE_MAX_BYTES, verbose=False):
+        _import_pyarrow()
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, key):
+        return os.path.exists(self._file(key))
+
+    @property
+    def size(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def key(self, name, df, fields, params):
+        """
+        :param name:            str, required           name of function computing result
+        :param df:              df, required            event log
+        :param fields:          list, required          columns the function reads
+        :param params:          dict, required          parameters affecting result; values must have a stable repr
+        :return:                str                     cache key
+        """
+
+        payload = json.dumps({
+            'version': CACHE_VERSION,
+            'name': name,
+            'params': {param: repr(value) for param, value in sorted(params.items())},
+            'fingerprint': fingerprint(df, fields),
+        }, sort_keys=True)
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        """
+        :param key:             str, required           cache key
+        :return:                df                      cached result, or None if not cached
+        """
+
+        file = self._file(key)
+        pa, pq = _import_pyarrow()
+
+        try:
+            table = pq.read_table(file)
+        except FileNotFoundError:
+            return
+        except (OSError, pa.ArrowException) as e:
+            print(f'Removing unreadable cached result {file}: {e}') if self.verbose else None
+            self._remove(file)
+            return
+
+        os.utime(file)                                                  # mark as recently used
+        dtypes = json.loads((table.schema.metadata or {}).get(b'chronumbo_dtypes', b'{}'))
+        return _restore_dtypes(table.to_pandas(), dtypes)
+
+    def put(self, key, df):
+        """
+        :param key:             str, required           cache key
+        :param df:              df, required            result to cache
+        :return:                None
+        """
+
+        pa, pq = _import_pyarrow()
+
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        dtypes = json.dumps({col: str(dtype) for col, dtype in df.dtypes.items()})
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'chronumbo_dtypes': dtypes.encode()})
+
+        file = self._file(key)
+        temp_file = f'{file}.{uuid.uuid4().hex}.tmp'
+        try:
+            pq.write_table(table, temp_file)
+            os.replace(temp_file, file)
+        finally:
+            self._remove(temp_file)
+        self.evict()
+
+    def memoize(self, name, df, fields, params, compute, columns=None):
+        """
+        Returns a cached result if there is one; otherwise, computes and caches it. If columns is given, the result is
+        df with columns added, and only those columns are cached; on a hit, they are added to df.
+
+        :param name:            str, required           name of function computing result
+        :param df:              df, required            event log
+        :param fields:          list, required          columns the function reads
+        :param params:          dict, required          parameters affecting result
+        :param compute:         function, required      computes result, without arguments
+        :param columns:         list, optional          columns added to df by compute
+        :return:                df                      result
+        """
+
+        with span('cache-lookup', rows=len(df)):
+            key = self.key(name, df, fields, params)
+            cached = self.get(key)
+
+        if cached is not None:
+            self.hits += 1
+            print(f'Cache hit for {name}; {len(cached)} rows read.') if self.verbose else None
+            if columns is None:
+                return cached
+            for col in columns:
+                df[col] = cached[col].set_axis(df.index)
+            return df
+
+        self.misses += 1
+        result = compute()
+        with span('cache-store', rows=len(result)):
+            self.put(key, result[columns] if columns else result)
+        print(f'Cache miss for {name}; result stored.') if self.verbose else None
+        return result
+
+    def evict(self):
+        """
+        Removes the least recently used results until the cache is within max_bytes.
+
+        :return:                int                     number of results removed
+        """
+
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        removed = 0
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            self._remove(entry.path)
+            removed += 1
+
+        print(f'Evicted {removed} cached results.') if self.verbose and removed else None
+        return removed
+
+    def clear(self):
+        """
+        Removes every cached result.
+        """
+
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    def _file(self, key):
+        return os.path.join(self.path, f'{key}.parquet')
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.path) if entry.name.endswith('.parquet') and entry.is_file()]
+
+    @staticmethod
+    def _remove(file):
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+
+def fingerprint(df, fields=None):
+    """
+    Fingerprints the columns of an event log a metric reads, cheaply enough to be checked on every call: row count,
+    column dtypes, the maximum of datetime columns, a checksum of the index, and a checksum of each column. Checksums
+    hash every value in order, so any changed, added, removed or reordered row changes the fingerprint; they are taken
+    over the column's memory (numpy arrays, Arrow buffers of str columns, and codes and categories of categoricals)
+    rather than value by value, so only object columns are hashed per value.
+
+    :param df:                  df, required            DataFrame containing event data
+    :param fields:              list, optional          columns to fingerprint; all columns if None
+    :return:                    dict                    fingerprint, JSON serializable
+    """
+
+    fields = list(dict.fromkeys(fields)) if fields is not None else list(df.columns)
+    return {
+        'rows': len(df),
+        'index': _checksum(df.index),
+        'columns': {
+            col: {
+                'dtype': str(df[col].dtype),
+                'max': str(df[col].max()) if pd.api.types.is_datetime64_any_dtype(df[col].dtype) else None,
+                'checksum': _checksum(df[col]),
+            } for col in fields
+        },
+    }
+
+
+def _checksum(values):
+    """
+    Helper function to checksum a column or index, in order.
+
+    :param values:              series, required        column, or index
+    :return:                    str                     hex digest
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    if isinstance(values, pd.RangeIndex):
+        digest.update(repr((values.start, values.stop, values.step)).encode())
+    elif isinstance(values.dtype, pd.CategoricalDtype):
+        digest.update(values.array.codes.tobytes())
+        digest.update(_checksum(values.array.categories).encode())
+    elif isinstance(values.dtype, np.dtype) and values.dtype != object:
+        digest.update(np.ascontiguousarray(values.to_numpy()).tobytes())
+    elif hasattr(values.array, '__arrow_array__'):
+        pa, _ = _import_pyarrow()
+        chunks = pa.chunked_array(values.array.__arrow_array__()).chunks
+        for chunk in chunks:
+            digest.update(repr((chunk.offset, len(chunk))).encode())
+            for buffer in chunk.buffers():
+                digest.update(b'-' if buffer is None else memoryview(buffer))
+    else:
+        digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+
+    return digest.hexdigest()
+
+
+def _restore_dtypes(df, dtypes):
+    """
+    Helper function to restore dtypes a result had before it was written to Parquet; object columns holding None,
+    such as the flag and delta columns added by the delta functions, are read back as str or float columns with NaN.
+
+    :param df:                  df, required            result read from Parquet
+    :param dtypes:              dict, required          column names and original dtypes, as str
+    :return:                    df                      result with original dtypes
+    """
+
+    for col, dtype in dtypes.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if dtype == 'object':
+            values = df[col].astype(object)
+            df[col] = values.where(df[col].notna(), None)
+        elif dtype != 'category':
+            df[col] = df[col].astype(dtype)
+
+    return df
+
+
+def _import_pyarrow():
+    """
+    Helper function to import pyarrow only when results are cached, as it is an optional dependency.
+
+    :return pa:                 module                  pyarrow
+            pq:                 module                  pyarrow.parquet
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('pyarrow must be installed to cache results as Parquet; pip install pyarrow')
+    return pa, pq
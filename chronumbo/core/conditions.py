@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+
+
+# operators accepted in a field's condition dict, e.g. {'event_description': {'startswith': 'Escalat'}}
+CONDITION_OPERATORS = (
+    'eq', 'ne', 'in', 'not_in', 'gt', 'ge', 'lt', 'le', 'between', 'isnull', 'notnull',
+    'startswith', 'endswith', 'contains', 'regex',
+)
+
+
+def compile_conditions(conditions):
+    """
+    Compiles a dict of conditions into a condition tree, which can be evaluated against whole columns at once with
+    evaluate_conditions().
+
+    Plain field-value pairs are exact equality, as before, and are combined with AND. A field's value can instead be a
+    dict of operators (combined with AND), and the keys '$and', '$or' and '$not' combine condition sets:
+
+        {'event_type': 'Status'}                                        # equality
+        {'event_description': {'in': ['Resolved', 'Closed']}}           # set membership; 'not_in' to exclude
+        {'event_description': {'ne': 'Created'}}                        # inequality
+        {'event_description': {'startswith': 'Escalat'}}                # also 'endswith', 'contains', 'regex'
+        {'event_description': {'contains': ['urgent', 'asap']}}         # any of several; also 'startswith', 'endswith'
+        {'event_date': {'between': ('2023-01-01', '2023-12-31')}}       # inclusive; also 'gt', 'ge', 'lt', 'le'
+        {'employee_alias': {'isnull': True}}                            # also 'notnull'
+        {'$or': [{'event_type': 'Status'}, {'is_employee': False}]}     # any condition set
+        {'$not': {'event_type': 'Assigned'}}                            # negates a condition set
+
+    Missing values never match an operator other than 'isnull'; note '$not' negates the result, so missing values
+    match {'$not': {'event_type': 'Assigned'}} but not {'event_type': {'ne': 'Assigned'}}.
+
+    The condition tree is built of tuples and is hashable; identical sub-expressions compile to equal tuples whatever
+    the order of keys, so they can share a cached mask in evaluate_conditions().
+
+    :param conditions:          dict, required          dict of column names and expected values or operator dicts
+    :return:                    tuple                   condition tree
+    """
+
+    if isinstance(conditions, (list, tuple)):
+        return _combine('or', [compile_conditions(c) for c in conditions])
+
+    nodes = []
+    for key, value in conditions.items():
+        if key == '$and':
+            nodes.append(_combine('and', [compile_conditions(c) for c in value]))
+        elif key == '$or':
+            nodes.append(_combine('or', [compile_conditions(c) for c in value]))
+        elif key == '$not':
+            nodes.append(('not', compile_conditions(value)))
+        elif isinstance(value, dict):
+            for op, operand in value.items():
+                nodes.append(_compile_operator(key, op, operand))
+        else:
+            nodes.append(('op', key, 'eq', _freeze(value)))
+
+    return _combine('and', nodes)
+
+
+def evaluate_conditions(node, df, cache=None):
+    """
+    Evaluates a condition tree from compile_conditions() against whole columns of a DataFrame.
+
+    If a cache dict is given, the mask for every sub-expression is stored in it, keyed by the sub-expression itself,
+    so that sub-expressions shared between conditions (e.g. start and end conditions both requiring
+    {'event_type': 'Correspondence'}) are only evaluated once.
+
+    :param node:                tuple, required         condition tree from compile_conditions()
+    :param df:                  df, required            DataFrame containing event data
+    :param cache:               dict, optional          dict of previously evaluated sub-expressions and masks
+    :return:                    ndarray                 boolean array, True where conditions are met
+    """
+
+    if cache is not None and node in cache:
+        return cache[node]
+
+    kind = node[0]
+    if kind == 'op':
+        mask = _evaluate_operator(df[node[1]], node[2], node[3])
+    elif kind == 'and':
+        mask = np.ones(len(df), dtype=bool)
+        for child in node[1]:
+            mask = mask & evaluate_conditions(child, df, cache)
+    elif kind == 'or':
+        mask = np.zeros(len(df), dtype=bool)
+        for child in node[1]:
+            mask = mask | evaluate_conditions(child, df, cache)
+    else:
+        mask = ~evaluate_conditions(node[1], df, cache)
+
+    if cache is not None:
+        cache[node] = mask
+    return mask
+
+
+def condition_fields(node):
+    """
+    Lists the columns a condition tree from compile_conditions() refers to.
+
+    :param node:                tuple, required         condition tree from compile_conditions()
+    :return:                    list                    column names, in order of first appearance
+    """
+
+    if node[0] == 'op':
+        return [node[1]]
+
+    children = node[1] if node[0] in ('and', 'or') else (node[1],)
+    fields = []
+    for child in children:
+        fields += [field for field in condition_fields(child) if field not in fields]
+    return fields
+
+
+def is_plain_conditions(conditions):
+    """
+    Checks whether conditions are a plain dict of field-value pairs, matched by exact equality.
+
+    :param conditions:          dict, required          dict of conditions
+    :return:                    bool                    True if all conditions are exact equality; else False
+    """
+
+    return isinstance(conditions, dict) and not any(
+        key in ('$and', '$or', '$not') or isinstance(value, dict) for key, value in conditions.items()
+    )
+
+
+def _compile_operator(field, op, operand):
+    """
+    Helper function to compile one operator of a field's condition dict into a leaf of the condition tree.
+
+    :param field:               str, required           column name
+    :param op:                  str, required           operator; see CONDITION_OPERATORS
+    :param operand:             any, required           value to compare against
+    :return:                    tuple                   leaf of condition tree
+    """
+
+    if op not in CONDITION_OPERATORS:
+        raise ValueError(f'condition operator {op} invalid for field {field}; must be one of {CONDITION_OPERATORS}')
+
+    if op in ('in', 'not_in'):
+        operand = tuple(sorted(set(operand), key=repr))
+    elif op == 'between':
+        low, high = operand
+        operand = (_freeze(low), _freeze(high))
+    elif op in ('isnull', 'notnull'):
+        operand = bool(operand)
+    elif op in ('startswith', 'endswith', 'contains') and isinstance(operand, (list, tuple, set)):
+        operand = tuple(sorted(operand))
+    elif op == 'regex' and isinstance(operand, (list, tuple, set)):
+        raise ValueError(f'regex operand for field {field} must be a single pattern; use | to match any of several')
+    else:
+        operand = _freeze(operand)
+
+    return 'op', field, op, operand
+
+
+def _combine(kind, nodes):
+    """
+    Helper function to combine nodes with 'and' or 'or'; children are ordered so equal sets of conditions produce
+    equal trees, and a single child is returned as-is.
+
+    :param kind:                str, required           'and' or 'or'
+    :param nodes:               list, required          condition tree nodes to combine
+    :return:                    tuple                   condition tree
+    """
+
+    unique = sorted(set(nodes), key=repr)
+    if len(unique) == 1:
+        return unique[0]
+    return kind, tuple(unique)
+
+
+def _freeze(value):
+    """
+    Helper function to make an operand hashable, so it can be part of a condition tree.
+
+    :param value:               any, required           value to compare against
+    :return:                    any                     hashable value
+    """
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return tuple(sorted(value, key=repr))
+    return value
+
+
+def _evaluate_operator(series, op, operand):
+    """
+    Helper function to evaluate one leaf of a condition tree against a column. Missing values never match, other than
+    with 'isnull'.
+
+    For categorical columns, operators are evaluated once per category rather than once per row, and rows are matched
+    by their integer category codes; comparisons such as 'gt' use the categories' values, whether or not the
+    categorical is ordered.
+
+    :param series:              series, required        column to evaluate
+    :param op:                  str, required           operator; see CONDITION_OPERATORS
+    :param operand:             any, required           value to compare against
+    :return:                    ndarray                 boolean array, True where condition is met
+    """
+
+    if op == 'isnull':
+        return series.isna().to_numpy() == operand
+    if op == 'notnull':
+        return series.notna().to_numpy() == operand
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = pd.Series(series.cat.categories)
+        matched = np.append(_evaluate_operator(categories, op, operand), False)
+        return matched[series.cat.codes.to_numpy()]                     # code -1 (missing) indexes the final False
+
+    if op == 'eq':
+        result = series == operand
+    elif op == 'ne':
+        result = (series != operand) & series.notna()
+    elif op == 'in':
+        result = series.isin(operand) & series.notna()
+    elif op == 'not_in':
+        result = ~series.isin(operand) & series.notna()
+    elif op == 'gt':
+        result = series > operand
+    elif op == 'ge':
+        result = series >= operand
+    elif op == 'lt':
+        result = series < operand
+    elif op == 'le':
+        result = series <= operand
+    elif op == 'between':
+        result = series.between(operand[0], operand[1], inclusive='both')
+    else:
+        if not pd.api.types.is_string_dtype(series.dtype):
+            series = series.astype(str).where(series.notna())
+        if op == 'startswith':
+            result = series.str.startswith(operand, na=False)
+        elif op == 'endswith':
+            result = series.str.endswith(operand, na=False)
+        elif op == 'contains':
+            patterns = operand if isinstance(operand, tuple) else (operand,)
+            result = pd.Series(False, index=series.index)
+            for pattern in patterns:
+                result |= series.str.contains(pattern, regex=False, na=False)
+        else:
+            result = series.str.contains(operand, regex=True, na=False)
+
+    return result.to_numpy(dtype=bool, na_value=False)
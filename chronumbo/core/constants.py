@@ -5,6 +5,10 @@ DTYPE_MAPPING = {
     'smallint': 'int64',
     'tinyint': 'int8',
     'mediumint': 'int32',
+    'int': 'int64',
+    'int2': 'int64',                                        # postgreSQL aliases
+    'int4': 'int64',
+    'int8': 'int64',
 
     # unsigned integer types, treated as signed in pandas
     'unsigned big int': 'uint64',
@@ -18,17 +22,28 @@ DTYPE_MAPPING = {
     'real': 'float64',
     'float': 'float64',
     'double precision': 'float64',
+    'double': 'float64',
+    'float4': 'float64',                                    # postgreSQL aliases
+    'float8': 'float64',
 
     # date and time types
     'date': 'datetime64[ns]',
     'datetime': 'datetime64[ns]',
     'timestamp': 'datetime64[ns]',
+    'timestamp without time zone': 'datetime64[ns]',        # postgreSQL
+    'datetime2': 'datetime64[ns]',                          # MSSQL
+    'smalldatetime': 'datetime64[ns]',
     'time': 'datetime64[ns]',                               # pandas lacks time-only dtype; can be stored as datetime
     'year': 'datetime64[ns]',                               # pandas lacks year dtype; can be stored as datetime
 
     # char types
     'char': 'object',
     'varchar': 'object',
+    'character': 'object',                                  # postgreSQL
+    'character varying': 'object',
+    'nchar': 'object',                                      # MSSQL
+    'nvarchar': 'object',
+    'ntext': 'object',
     'text': 'object',
     'mediumtext': 'object',
     'longtext': 'object',
@@ -62,6 +77,7 @@ DTYPE_MAPPING = {
 
     # UUID types
     'uuid': 'object',
+    'uniqueidentifier': 'object',                           # MSSQL
 
     # array types
     'array': 'object',
@@ -0,0 +1,88 @@
+import pandas as pd
+
+from chronumbo.core.constants import (
+    DTYPE_MAPPING
+)
+
+
+# columns with at most this share of distinct values are converted to categoricals by optimize_dtypes()
+CATEGORY_MAX_RATIO = 0.5
+
+
+def optimize_dtypes(df, date_field=None, id_field=None, sql_col_types=None, category_max_ratio=CATEGORY_MAX_RATIO,
+                    date_format=None, verbose=False):
+    """
+    Converts an event log to compact dtypes, so it takes less memory and conditions are matched faster:
+
+        - date_field is parsed to datetime64 once, if it is not already
+        - integer columns, including id_field, are downcast to the smallest integer dtype holding their values
+        - text columns with few distinct values (at most category_max_ratio of rows, e.g. event, description,
+          alias) become categoricals, which store each row as an integer code; conditions on them are evaluated
+          once per category rather than once per row; id_field is never made categorical
+
+    Where sql_col_types is given (e.g. from get_sql_col_types()), source column types are looked up in DTYPE_MAPPING
+    to restore what the driver lost: integer columns holding NULLs, which arrive as float64, become nullable integers
+    before downcasting; boolean columns returned as 0 and 1 become bool; and date columns returned as text (e.g. by
+    SQLite) are parsed to datetime64.
+
+        df = optimize_dtypes(df, date_field='event_date', id_field='project_id',
+                             sql_col_types=get_sql_col_types(engine=engine, tbl='project_audit_trail'))
+
+    :param df:                  df, required            DataFrame containing event data
+    :param date_field:          str, optional           column containing event date or timestamp
+    :param id_field:            str, optional           column name used to group data (e.g. 'project_no')
+    :param sql_col_types:       dict, optional          column names and SQL type names of source table
+    :param category_max_ratio:  float, optional         most distinct values per row for a column to be categorical
+    :param date_format:         str, optional           strftime format of date_field, if text; inferred if None
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    df                      DataFrame with compact dtypes
+    """
+
+    before = df.memory_usage(deep=True).sum() if verbose else 0
+    df = df.copy(deep=False)
+    sql_col_types = sql_col_types or {}
+
+    for col in df.columns:
+        series = df[col]
+        source_dtype = DTYPE_MAPPING.get(sql_col_types.get(col, ''), '')
+
+        if col == date_field or source_dtype.startswith('datetime64'):
+            if not pd.api.types.is_datetime64_any_dtype(series.dtype) and not series.empty:
+                df[col] = pd.to_datetime(series, format=date_format if col == date_field else None)
+
+        elif source_dtype == 'bool' and pd.api.types.is_numeric_dtype(series.dtype) \
+                and not pd.api.types.is_bool_dtype(series.dtype):
+            df[col] = series.astype('boolean' if series.hasnans else bool)
+
+        elif source_dtype.startswith(('int', 'uint')) and pd.api.types.is_float_dtype(series.dtype):
+            if ((series % 1 == 0) | series.isna()).all():
+                df[col] = pd.to_numeric(series.astype('Int64'), downcast='integer')
+
+        elif pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            df[col] = pd.to_numeric(series, downcast='integer')
+
+        elif col != id_field and _is_text(series) and len(series):
+            if series.nunique(dropna=True) <= category_max_ratio * len(series):
+                df[col] = series.astype('category')
+
+    if verbose:
+        after = df.memory_usage(deep=True).sum()
+        print(f'Optimized dtypes: {before / 1e6:,.1f} MB to {after / 1e6:,.1f} MB; {dict(df.dtypes.astype(str))}')
+
+    return df
+
+
+def _is_text(series):
+    """
+    Helper function to check whether a column holds text, as str dtype or as Python strings in an object column.
+
+    :param series:              series, required        column to check
+    :return:                    bool                    True if column holds text; else False
+    """
+
+    if pd.api.types.is_string_dtype(series.dtype) and not pd.api.types.is_object_dtype(series.dtype):
+        return True
+    if pd.api.types.is_object_dtype(series.dtype):
+        values = series.dropna()
+        return pd.api.types.infer_dtype(values, skipna=True) == 'string' if len(values) else False
+    return False
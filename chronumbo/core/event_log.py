@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+from chronumbo.core.conditions import (
+    compile_conditions,
+    evaluate_conditions
+)
+
+from chronumbo.core.toolkit import (
+    span
+)
+
+
+class PreparedEventLog:
+    """
+    An event log sorted, factorized and indexed once, so that many metrics can be run against it without paying for a
+    sort and a groupby on every call to add_event_delta_single() or add_event_delta_paired().
+
+    On creation, the event log is sorted by id_field and date_field (skipped if it is already in that order), id_field
+    is factorized to integer group codes, and the offset at which each group begins is stored. Condition masks are
+    cached as they are evaluated, per sub-expression, so conditions shared between metrics are only evaluated once.
+
+    Example usage is as follows:
+
+        log = PreparedEventLog(df, id_field='project_id', date_field='event_date')
+
+        add_event_delta_single(df=log, col_prefix='project_res_time', id_field='project_id', ...)
+        add_event_delta_paired(df=log, col_prefix='correspondence', id_field='project_id', ...)
+
+        log.df                              # sorted event log, with columns added by both metrics
+
+    Columns added by the delta functions are written to log.df; cached masks are not invalidated if the condition
+    columns of log.df are changed after creation, so call clear_cache() if doing so.
+
+    With sort=False, the event log is used in its current order and is not copied; group order matches df.groupby(),
+    as if the DataFrame had been passed to the delta functions directly.
+
+    :param df:                  df, required            DataFrame containing event data
+    :param id_field:            str, required           column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required           column containing datetime used to calculate time delta
+    :param sort:                bool, optional          if True, sorts by id_field and date_field if not already sorted
+    :param verbose:             bool, optional          if True, print status to terminal
+    """
+
+    def __init__(self, df, id_field, date_field, sort=True, verbose=False):
+        self.id_field = id_field
+        self.date_field = date_field
+
+        if sort and not _is_sorted(df, id_field, date_field):
+            print(f'Sorting event log by {id_field}, {date_field}.') if verbose else None
+            with span('sort', rows=len(df)):
+                df = df.sort_values(by=[id_field, date_field], kind='mergesort')
+        self.df = df
+
+        with span('factorize', rows=len(df)):
+            self.codes, self.ids = pd.factorize(df[id_field])          # -1 for null ids, which groupby drops
+            self.n_groups = len(self.ids)
+            self.dates = df[date_field].reset_index(drop=True)
+
+            # when sorted, each group is a contiguous block of rows; offsets[i] is the first row of group i
+            self.offsets = None
+            if sort:
+                valid = np.flatnonzero(self.codes >= 0)
+                n_valid = len(valid)
+                starts = np.flatnonzero(np.diff(self.codes[:n_valid], prepend=-1))
+                self.offsets = np.append(starts, n_valid)
+
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def is_contiguous(self):
+        return self.offsets is not None
+
+    def clear_cache(self):
+        """
+        Clears cached condition masks; required if condition columns of df are changed after creation.
+        """
+
+        self._masks.clear()
+
+    def mask(self, conditions):
+        """
+        Evaluates conditions against whole columns, caching the mask of every sub-expression; see compile_conditions()
+        for the conditions accepted. Returned masks are shared with the cache and must not be modified in place.
+
+        :param conditions:      dict, required          dict of column names and expected values or operator dicts
+        :return:                ndarray                 boolean array, True where all conditions are met
+        """
+
+        return evaluate_conditions(compile_conditions(conditions), self.df, self._masks)
+
+    def bounds(self, mask):
+        """
+        For each group, finds the position of the first and last row where mask is True.
+
+        Rows keep their order within each group (as with df.groupby()), so the first row is the minimum position and
+        the last row the maximum position. If the log is contiguous, these are found by binary search against group
+        offsets; otherwise with a groupby over row positions. Groups with no matching row are returned as -1.
+
+        :param mask:            ndarray, required       boolean array of rows to consider
+        :return first:          ndarray                 position of first matching row per group, or -1
+                last:           ndarray                 position of last matching row per group, or -1
+        """
+
+        first = np.full(self.n_groups, -1, dtype=np.int64)
+        last = np.full(self.n_groups, -1, dtype=np.int64)
+
+        positions = np.flatnonzero(mask & (self.codes >= 0))
+        if not len(positions):
+            return first, last
+
+        if self.is_contiguous:
+            lo = np.searchsorted(positions, self.offsets[:-1], side='left')
+            hi = np.searchsorted(positions, self.offsets[1:], side='left') - 1
+            found = lo <= hi
+            first[found] = positions[lo[found]]
+            last[found] = positions[hi[found]]
+        else:
+            grouped = pd.Series(positions).groupby(self.codes[positions]).agg(['min', 'max'])
+            first[grouped.index.to_numpy()] = grouped['min'].to_numpy()
+            last[grouped.index.to_numpy()] = grouped['max'].to_numpy()
+
+        return first, last
+
+    def extreme_positions(self, how):
+        """
+        For each group, finds the position of the row holding the earliest ('min') or latest ('max') date; as with
+        idxmin() and idxmax(), ties resolve to the first such row. Groups with no dates are returned as -1.
+
+        :param how:             str, required           'min' for earliest date, 'max' for latest date
+        :return:                ndarray                 position of earliest or latest row per group, or -1
+        """
+
+        valid = self.codes >= 0
+        dates = self.dates[valid]
+        extreme = dates.groupby(self.codes[valid]).agg(how).reindex(range(self.n_groups))
+        is_extreme = np.zeros(len(self.dates), dtype=bool)
+        is_extreme[valid] = dates.to_numpy() == extreme.to_numpy()[self.codes[valid]]
+        first, _ = self.bounds(is_extreme)
+        return first
+
+
+def iter_complete_groups(chunks, id_field, verbose=False):
+    """
+    Given chunks of an event log ordered by id_field, yields DataFrames which each contain only complete groups.
+
+    Rows belonging to the last id_field value of a chunk may continue into the next chunk, so they are held back and
+    carried forward into it. Memory is therefore bounded by chunk size plus the largest single group, rather than by
+    the size of the event log.
+
+    :param chunks:              iterable, required      DataFrames ordered by id_field, e.g. from db_to_df(chunksize=n)
+    :param id_field:            str, required           column name used to group data (e.g. 'project_no')
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    generator               DataFrames of complete groups
+    """
+
+    carry = None
+    last_id = None
+
+    for chunk in chunks:
+        # checked on the incoming chunk, before carried rows (which always end with last_id) are put in front of it
+        ordered = chunk[id_field].dropna()
+        if not ordered.is_monotonic_increasing:
+            raise ValueError(f'chunk is not ordered by {id_field}')
+        if last_id is not None and not ordered.empty and ordered.iloc[0] < last_id:
+            raise ValueError(f'chunks are not ordered by {id_field}; {ordered.iloc[0]} follows {last_id}')
+
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        if chunk.empty:
+            continue
+
+        ids = chunk[id_field]
+        tail_id = ids.iloc[-1]
+        last_id = tail_id if not pd.isna(tail_id) else last_id
+        held = (ids == tail_id).to_numpy()
+        carry = chunk[held]
+        complete = chunk[~held]
+
+        print(f'{len(complete)} rows of complete groups; {len(carry)} rows carried forward.') if verbose else None
+        if not complete.empty:
+            yield complete
+
+    if carry is not None and not carry.empty:
+        yield carry
+
+
+def _is_sorted(df, id_field, date_field):
+    """
+    Helper function to check whether an event log is already sorted by id_field, then date_field, without sorting it.
+
+    :param df:                  df, required            DataFrame containing event data
+    :param id_field:            str, required           column name used to group data
+    :param date_field:          str, required           column containing event date or timestamp
+    :return:                    bool                    True if sorted; else False
+    """
+
+    ids = df[id_field]
+    if not ids.is_monotonic_increasing or ids.hasnans or df[date_field].hasnans:
+        return False
+
+    dates = df[date_field].to_numpy()
+    same_id = ids.to_numpy()[1:] == ids.to_numpy()[:-1]
+    return bool(np.all(~same_id | (dates[1:] >= dates[:-1])))
+
@@ -0,0 +1,351 @@
+import pandas as pd
+# import pyarrow              # must be installed for Parquet and Arrow; used for multithreaded CSV if installed
+
+from chronumbo.core.conditions import (
+    compile_conditions,
+    condition_fields
+)
+
+from chronumbo.core.dtypes import (
+    optimize_dtypes
+)
+
+from chronumbo.core.toolkit import (
+    span
+)
+
+
+def metric_columns(id_field, date_field, conditions=None, columns=None):
+    """
+    Lists the columns a metric reads: id_field, date_field, columns used in conditions and any extra columns, in
+    order of first appearance. Used by the file loaders to read only these columns, and by the delta functions
+    to fingerprint cached results and to send workers only these columns.
+
+        metric_columns('project_id', 'event_date', [{'event': 'Status', 'description': 'Created'},
+                                                     {'event': 'Status', 'description': 'Resolved'}])
+        # ['project_id', 'event_date', 'description', 'event']
+
+    :param id_field:            str, required           column name used to group data
+    :param date_field:          str, required           column containing event date or timestamp
+    :param conditions:          list, optional          start and end conditions of the metrics to be run
+    :param columns:             list, optional          extra columns to keep, e.g. for reporting
+    :return:                    list                    column names
+    """
+
+    fields = [id_field, date_field]
+    for condition in conditions or []:
+        fields += condition_fields(compile_conditions(condition))
+    fields += list(columns or [])
+    return list(dict.fromkeys(fields))
+
+
+def parquet_to_df(path, id_field, date_field, conditions=None, columns=None, date_range=None, id_range=None,
+                  date_format=None, optimize=False, verbose=False):
+    """
+    Reads a Parquet file or dataset (a directory of files, optionally hive-partitioned, e.g. event_month=2023-09/)
+    and returns a DataFrame ready for the delta functions, with date_field parsed as datetime.
+
+    Only the columns the metric needs are read: id_field, date_field, the columns used in conditions and any extra
+    columns; if neither conditions nor columns are given, every column is read. date_range and id_range are pushed
+    down to the reader, so row groups and partitions outside of them are skipped using Parquet statistics, and are
+    then applied exactly once dates are parsed. Ranges include the lower bound and exclude the upper bound; either
+    bound can be None:
+
+        df = parquet_to_df('exports/event-log/', id_field='project_id', date_field='event_date',
+                           conditions=[start_conditions, end_conditions], date_range=('2023-09-01', '2023-10-01'))
+
+    If optimize is True, the result is converted to compact dtypes with optimize_dtypes(), e.g. categoricals for
+    condition columns such as event and description.
+
+    Requires pyarrow.
+
+    :param path:                str, required           Parquet file or dataset directory
+    :param id_field:            str, required           column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required           column containing event date or timestamp
+    :param conditions:          list, optional          start and end conditions of the metrics to be run
+    :param columns:             list, optional          extra columns to keep
+    :param date_range:          tuple, optional         (start, end) of date_field to read
+    :param id_range:            tuple, optional         (low, high) of id_field to read
+    :param date_format:         str, optional           strftime format of date_field, if stored as text
+    :param optimize:            bool, optional          if True, converts result to compact dtypes
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    df                      DataFrame containing event data
+    """
+
+    pa, ds = _import_pyarrow()
+
+    with span('read') as read_span:
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        df = _read_dataset(dataset=dataset, id_field=id_field, date_field=date_field, conditions=conditions,
+                           columns=columns, date_range=date_range, id_range=id_range, date_format=date_format)
+        read_span.add_rows(len(df))
+
+    if optimize:
+        with span('optimize', rows=len(df)):
+            df = optimize_dtypes(df, date_field=date_field, id_field=id_field, verbose=verbose)
+
+    print(f'Read {len(df)} rows of {list(df.columns)} from {path}.') if verbose else None
+    return df
+
+
+def arrow_to_df(path, id_field, date_field, conditions=None, columns=None, date_range=None, id_range=None,
+                date_format=None, memory_map=True, optimize=False, verbose=False):
+    """
+    Reads an Arrow IPC (Feather v2) file and returns a DataFrame ready for the delta functions, with date_field parsed
+    as datetime; see parquet_to_df() for column projection and ranges.
+
+    With memory_map, the file is memory-mapped rather than read, so only the pages of the projected columns are
+    loaded, and only rows within date_range and id_range are copied into the DataFrame. Requires pyarrow.
+
+    :param path:                str, required           Arrow IPC file
+    :param id_field:            str, required           column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required           column containing event date or timestamp
+    :param conditions:          list, optional          start and end conditions of the metrics to be run
+    :param columns:             list, optional          extra columns to keep
+    :param date_range:          tuple, optional         (start, end) of date_field to read
+    :param id_range:            tuple, optional         (low, high) of id_field to read
+    :param date_format:         str, optional           strftime format of date_field, if stored as text
+    :param memory_map:          bool, optional          if True, memory-maps file rather than reading it
+    :param optimize:            bool, optional          if True, converts result to compact dtypes
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    df                      DataFrame containing event data
+    """
+
+    pa, ds = _import_pyarrow()
+
+    with span('read') as read_span:
+        with (pa.memory_map(path) if memory_map else pa.OSFile(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+            df = _read_dataset(dataset=ds.dataset(table), id_field=id_field, date_field=date_field,
+                               conditions=conditions, columns=columns, date_range=date_range, id_range=id_range,
+                               date_format=date_format)
+        read_span.add_rows(len(df))
+
+    if optimize:
+        with span('optimize', rows=len(df)):
+            df = optimize_dtypes(df, date_field=date_field, id_field=id_field, verbose=verbose)
+
+    print(f'Read {len(df)} rows of {list(df.columns)} from {path}.') if verbose else None
+    return df
+
+
+def csv_to_df(path, id_field, date_field, conditions=None, columns=None, date_range=None, id_range=None,
+              date_format=None, engine=None, chunksize=1000000, optimize=False, verbose=False):
+    """
+    Reads a CSV file, e.g. an export such as project-event-log.csv, and returns a DataFrame ready for the delta
+    functions, with date_field parsed as datetime; see parquet_to_df() for column projection and ranges.
+
+    With engine='pyarrow', the file is parsed by pyarrow's multithreaded reader, converting only the projected
+    columns, and rows outside of date_range and id_range are dropped before the DataFrame is built. With engine='c',
+    the file is parsed by pandas in chunks of chunksize rows, and each chunk is filtered as it is read, so memory is
+    bounded by the rows kept rather than by the size of the file. By default, 'pyarrow' is used if installed.
+
+        df = csv_to_df('project-event-log.csv', id_field='project_id', date_field='event_date',
+                       conditions=[start_conditions, end_conditions], date_format='%m/%d/%Y %H:%M')
+
+    :param path:                str, required           CSV file
+    :param id_field:            str, required           column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required           column containing event date or timestamp
+    :param conditions:          list, optional          start and end conditions of the metrics to be run
+    :param columns:             list, optional          extra columns to keep
+    :param date_range:          tuple, optional         (start, end) of date_field to read
+    :param id_range:            tuple, optional         (low, high) of id_field to read
+    :param date_format:         str, optional           strftime format of date_field; inferred if None
+    :param engine:              str, optional           'pyarrow' or 'c'; if None, 'pyarrow' if installed
+    :param chunksize:           int, optional           rows per chunk with engine='c'
+    :param optimize:            bool, optional          if True, converts result to compact dtypes
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    df                      DataFrame containing event data
+    """
+
+    if engine is None:
+        try:
+            _import_pyarrow()
+            engine = 'pyarrow'
+        except ImportError:
+            engine = 'c'
+
+    usecols = metric_columns(id_field, date_field, conditions, columns) if conditions or columns else None
+
+    with span('read') as read_span:
+        if engine == 'pyarrow':
+            pa, ds = _import_pyarrow()
+            import pyarrow.csv
+
+            convert_options = pyarrow.csv.ConvertOptions(include_columns=usecols) if usecols else None
+            try:
+                table = pyarrow.csv.read_csv(path, convert_options=convert_options)
+            except pa.ArrowInvalid as e:
+                raise ValueError(f'Cannot read {path}: {e}')
+            df = _read_dataset(dataset=ds.dataset(table), id_field=id_field, date_field=date_field,
+                               conditions=conditions, columns=columns, date_range=date_range, id_range=id_range,
+                               date_format=date_format)
+
+        elif engine == 'c':
+            chunks = []
+            with pd.read_csv(path, usecols=usecols, chunksize=chunksize) as reader:
+                for chunk in reader:
+                    chunks.append(_finish_frame(chunk, date_field, id_field, date_range, id_range, date_format))
+                    print(f'Read chunk of {len(chunk)} rows; kept {len(chunks[-1])}.') if verbose else None
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.read_csv(path, usecols=usecols, nrows=0)
+            df = df[usecols] if usecols else df                         # in projection order, as with 'pyarrow'
+
+        else:
+            raise ValueError(f'engine {engine} invalid; must be \'pyarrow\' or \'c\'')
+
+        read_span.add_rows(len(df))
+
+    if optimize:
+        with span('optimize', rows=len(df)):
+            df = optimize_dtypes(df, date_field=date_field, id_field=id_field, verbose=verbose)
+
+    print(f'Read {len(df)} rows of {list(df.columns)} from {path}.') if verbose else None
+    return df
+
+
+def _import_pyarrow():
+    """
+    Helper function to import pyarrow only when a loader needs it, as it is an optional dependency.
+
+    :return pa:                 module                  pyarrow
+            ds:                 module                  pyarrow.dataset
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError('pyarrow must be installed to read Parquet and Arrow files; pip install pyarrow')
+    return pa, ds
+
+
+def _read_dataset(dataset, id_field, date_field, conditions, columns, date_range, id_range, date_format):
+    """
+    Helper function to read the projected columns of a pyarrow dataset, filtered by ranges where the column types
+    allow the filter to be pushed down, and convert the result to a DataFrame ready for the delta functions.
+
+    :param dataset:             object, required        pyarrow dataset
+    :param id_field:            str, required           column name used to group data
+    :param date_field:          str, required           column containing event date or timestamp
+    :param conditions:          list, optional          start and end conditions of the metrics to be run
+    :param columns:             list, optional          extra columns to keep
+    :param date_range:          tuple, optional         (start, end) of date_field to read
+    :param id_range:            tuple, optional         (low, high) of id_field to read
+    :param date_format:         str, optional           strftime format of date_field, if stored as text
+    :return:                    df                      DataFrame containing event data
+    """
+
+    pa, ds = _import_pyarrow()
+
+    names = dataset.schema.names
+    projection = metric_columns(id_field, date_field, conditions, columns) if conditions or columns else names
+    missing = [col for col in projection if col not in names]
+    if missing:
+        raise ValueError(f'columns {missing} not found; available columns are {names}')
+
+    expression = None
+    for field, bounds in ((date_field, date_range), (id_field, id_range)):
+        for predicate in _range_predicates(field, dataset.schema.field(field).type, bounds, pa, ds):
+            expression = predicate if expression is None else expression & predicate
+
+    table = dataset.to_table(columns=projection, filter=expression)
+    return _finish_frame(table.to_pandas(), date_field, id_field, date_range, id_range, date_format)
+
+
+def _range_predicates(field, arrow_type, bounds, pa, ds):
+    """
+    Helper function to build pyarrow filter expressions for a range, where the column type can be compared with the
+    bounds; otherwise the range is left for _finish_frame() to apply. Date columns are compared by day, which keeps
+    every row within range, as _finish_frame() applies the exact range.
+
+    :param field:               str, required           column name
+    :param arrow_type:          object, required        pyarrow type of column
+    :param bounds:              tuple, optional         (low, high), either of which can be None
+    :param pa:                  module, required        pyarrow
+    :param ds:                  module, required        pyarrow.dataset
+    :return:                    list                    pyarrow expressions
+    """
+
+    if bounds is None:
+        return []
+
+    predicates = []
+    for bound, is_low in zip(bounds, (True, False)):
+        if bound is None:
+            continue
+
+        if pa.types.is_timestamp(arrow_type):
+            bound = pd.Timestamp(bound)
+            if arrow_type.tz is not None and bound.tz is None:
+                bound = bound.tz_localize(arrow_type.tz)
+            value = pa.scalar(bound, type=arrow_type)
+        elif pa.types.is_date(arrow_type):
+            value = pa.scalar(pd.Timestamp(bound).date(), type=arrow_type)
+        elif pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+            if not isinstance(bound, (int, float)):
+                continue
+            value = pa.scalar(bound)
+        elif pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+            if not isinstance(bound, str):
+                continue
+            value = pa.scalar(bound)
+        else:
+            continue
+
+        field_expression = ds.field(field)
+        if pa.types.is_date(arrow_type):
+            predicates.append(field_expression >= value if is_low else field_expression <= value)
+        else:
+            predicates.append(field_expression >= value if is_low else field_expression < value)
+
+    return predicates
+
+
+def _finish_frame(df, date_field, id_field, date_range, id_range, date_format):
+    """
+    Helper function to parse date_field as datetime and apply date and id ranges exactly, including the lower bound
+    and excluding the upper bound.
+
+    :param df:                  df, required            DataFrame read from file
+    :param date_field:          str, required           column containing event date or timestamp
+    :param id_field:            str, required           column name used to group data
+    :param date_range:          tuple, optional         (start, end) of date_field to keep
+    :param id_range:            tuple, optional         (low, high) of id_field to keep
+    :param date_format:         str, optional           strftime format of date_field; inferred if None
+    :return:                    df                      DataFrame with parsed dates, within ranges
+    """
+
+    if not pd.api.types.is_datetime64_any_dtype(df[date_field]):
+        df[date_field] = pd.to_datetime(df[date_field], format=date_format)
+
+    keep = None
+    for field, bounds in ((date_field, date_range), (id_field, id_range)):
+        low, high = bounds if bounds is not None else (None, None)
+        if field == date_field:
+            tz = df[date_field].dt.tz
+            low, high = (None if bound is None else _as_timestamp(bound, tz) for bound in (low, high))
+        if low is not None:
+            keep = (df[field] >= low) if keep is None else keep & (df[field] >= low)
+        if high is not None:
+            keep = (df[field] < high) if keep is None else keep & (df[field] < high)
+
+    if keep is not None:
+        df = df[keep.fillna(False).to_numpy(dtype=bool)]
+    return df.reset_index(drop=True)
+
+
+def _as_timestamp(value, tz):
+    """
+    Helper function to convert a date bound to a Timestamp comparable with a column in timezone tz.
+
+    :param value:               str, required           date bound, as str, datetime or Timestamp
+    :param tz:                  object, optional        timezone of column, or None
+    :return:                    object                  Timestamp
+    """
+
+    value = pd.Timestamp(value)
+    if tz is not None and value.tz is None:
+        return value.tz_localize(tz)
+    if tz is None and value.tz is not None:
+        return value.tz_convert(None)
+    return value
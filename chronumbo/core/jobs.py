@@ -0,0 +1,327 @@
+import json
+import os
+import time
+
+import pandas as pd
+
+from chronumbo.core.business import (
+    BusinessCalendar
+)
+
+from chronumbo.core.event_log import (
+    PreparedEventLog,
+    iter_complete_groups
+)
+
+from chronumbo.core.files import (
+    arrow_to_df,
+    csv_to_df,
+    parquet_to_df
+)
+
+from chronumbo.core.sql import (
+    create_engine,
+    db_to_df,
+    df_to_db
+)
+
+from chronumbo.core.toolkit import (
+    span
+)
+
+from chronumbo.main import (
+    add_event_delta_paired,
+    add_event_delta_single
+)
+
+
+# delta function run for each kind of metric in a job
+METRIC_KINDS = {
+    'single': add_event_delta_single,
+    'paired': add_event_delta_paired,
+}
+
+# file loader used for each source format in a job
+SOURCE_LOADERS = {
+    'parquet': parquet_to_df,
+    'arrow': arrow_to_df,
+    'csv': csv_to_df,
+}
+
+
+def load_config(path):
+    """
+    Reads a job config from a JSON or TOML file (by extension; TOML requires Python 3.11+). See run_job() for keys.
+
+    :param path:                str, required           config file
+    :return:                    dict                    job config
+    """
+
+    if path.endswith('.toml'):
+        import tomllib
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def run_job(config, engine=None, target_engine=None, only=None, verbose=False):
+    """
+    Runs many metrics over one read of an event log, writing each metric's result to its own table; replaces one
+    script per metric, each reading the same audit table again.
+
+    A job config has a source, read once, and a list of metrics, each run with add_event_delta_single() ('single') or
+    add_event_delta_paired() ('paired') against the same PreparedEventLog, so conditions shared between metrics are
+    evaluated once:
+
+        {
+            "engine": {"db": "kpi", "dialect": "postgres", "user": "etl", "password": "${KPI_DB_PASSWORD}",
+                       "endpoint": "db.internal"},
+            "source": {"query": "SELECT ... ORDER BY project_id, event_date", "id_field": "project_id",
+                       "date_field": "event_date", "chunksize": 500000, "optimize": true},
+            "metrics": [
+                {"name": "project_res_time", "kind": "single", "output": "intervals",
+                 "start_conditions": {"event": "Status", "description": "Created"},
+                 "end_conditions": {"event": "Status", "description": "Resolved"},
+                 "use_earliest_if_no_start": true,
+                 "target": {"tbl": "kpi_project_res_time", "if_tbl_exists": "replace", "bulk": true}},
+                {"name": "correspondence", "kind": "paired", "typed_output": true, ...,
+                 "target": "kpi_event_log"}
+            ]
+        }
+
+    engine holds the create_engine() parameters; $VARIABLES in them are expanded from the environment, so passwords
+    need not be kept in the config. Targets are written with engine too, unless target_engine is given, e.g. to read
+    from a replica and write to a reporting database; a SQLite database read in chunks cannot also be written to.
+
+    The source is either a SQL query, read with db_to_df(), or a file, read with parquet_to_df(), arrow_to_df() or
+    csv_to_df() (by format, or by extension), with only the columns the metrics read plus any listed in columns. Other
+    source keys (e.g. optimize, source_tbl, date_range) are passed to the reader.
+
+    With chunksize, the query is read in chunks, which must be ordered by id_field and date_field; each chunk of
+    complete groups (see iter_complete_groups()) is run through every metric and written before the next is read, so
+    memory is bounded by chunk size rather than the size of the event log.
+
+    Each metric's name is its col_prefix, and its other keys are passed to the delta function (conditions, flags,
+    typed_output, output, method, n_jobs, ...); a business_calendar is given as BusinessCalendar parameters. target is
+    a table name, or df_to_db() parameters (tbl, if_tbl_exists, bulk, schema, ...); if_tbl_exists defaults to
+    'replace', and applies to the first write only. Metrics with output='intervals' write their table of intervals;
+    metrics with output='log' that share a target write one event log, with the source columns and the columns of
+    each of those metrics. Metrics without a target are run, but not written.
+
+    Returns the time spent per stage, summed over chunks, which is also printed if verbose:
+
+        stage   name                    rows     seconds
+        read    source                  2000000  6.81
+        metric  project_res_time        2000000  0.92
+        metric  correspondence          2000000  1.47
+        write   kpi_project_res_time    81412    0.66
+        write   kpi_event_log           2000000  9.12
+
+    :param config:              dict or str, required   job config, or JSON or TOML file to read it from
+    :param engine:              object, optional        SQLAlchemy engine; if None, created from config's engine
+    :param target_engine:       object, optional        SQLAlchemy engine to write targets with; if None, created
+                                                        from config's target_engine, or engine if neither is given
+    :param only:                list, optional          names of metrics to run; all if None
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    df                      rows and seconds per stage
+    """
+
+    config = load_config(config) if isinstance(config, str) else config
+    source = dict(config.get('source') or {})
+    metrics = _metric_specs(config.get('metrics') or [], only)
+    id_field, date_field = source.pop('id_field'), source.pop('date_field')
+
+    has_targets = any(metric['target'] for metric in metrics)
+    if engine is None and ('query' in source or has_targets and not (target_engine or config.get('target_engine'))):
+        engine = _engine(config.get('engine'), verbose=verbose)
+    if target_engine is None and has_targets:
+        target_engine = _engine(config['target_engine'], verbose=verbose) if config.get('target_engine') else engine
+
+    timings = {}
+    written = set()
+    chunks = iter(_read_source(source, engine, id_field, date_field, metrics, verbose))
+
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        if not pd.api.types.is_datetime64_any_dtype(chunk[date_field].dtype):    # e.g. SQLite text, without optimize
+            chunk[date_field] = pd.to_datetime(chunk[date_field])
+        _add_timing(timings, 'read', 'source', len(chunk), start)
+
+        log = PreparedEventLog(chunk, id_field, date_field, verbose=verbose)
+        source_columns = list(log.df.columns)
+        log_columns = {}
+
+        for metric in metrics:
+            start = time.perf_counter()
+            with span(metric['name'], rows=len(log.df)):
+                columns = set(log.df.columns)
+                result = metric['func'](df=log, col_prefix=metric['name'], id_field=id_field, date_field=date_field,
+                                        **metric['params'])
+            _add_timing(timings, 'metric', metric['name'], len(log.df), start)
+
+            target = metric['target']
+            if target and metric['params'].get('output', 'log') == 'intervals':
+                _write_target(target_engine, result, target, written, timings, verbose)
+            elif target:
+                added = [col for col in log.df.columns if col not in columns]
+                log_columns.setdefault(target['tbl'], (target, []))[1].extend(added)
+
+        for target, columns in log_columns.values():
+            _write_target(target_engine, log.df[source_columns + columns], target, written, timings, verbose)
+
+    report = pd.DataFrame(list(timings.values()), columns=['stage', 'name', 'rows', 'seconds'])
+    print(report.to_string(index=False)) if verbose else None
+    return report
+
+
+def _engine(params, verbose=False):
+    """
+    Helper function to create an engine from create_engine() parameters in a job config, expanding $VARIABLES in
+    them from the environment.
+
+    :param params:              dict, required          create_engine() parameters
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    object                  SQLAlchemy engine
+    """
+
+    params = {key: os.path.expandvars(value) if isinstance(value, str) else value
+              for key, value in (params or {}).items()}
+    engine = create_engine(**params, verbose=verbose)
+    if engine is None:
+        raise ValueError(f'engine {params.get("dialect")} invalid; cannot create connection engine')
+    return engine
+
+
+def _metric_specs(metrics, only=None):
+    """
+    Helper function to check metric definitions of a job config, and resolve their delta function, parameters and
+    target.
+
+    :param metrics:             list, required          metric definitions
+    :param only:                list, optional          names of metrics to keep; all if None
+    :return:                    list                    dicts of name, func, params and target per metric
+    """
+
+    names = [metric.get('name') for metric in metrics]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates or None in names:
+        raise ValueError(f'metric names {duplicates or names} invalid; every metric needs a unique name')
+    unknown = sorted(set(only or []) - set(names))
+    if unknown:
+        raise ValueError(f'metrics {unknown} not found; must be in {names}')
+
+    specs = []
+    for metric in metrics:
+        params = dict(metric)
+        name, kind, target = params.pop('name'), params.pop('kind', 'single'), params.pop('target', None)
+        if only and name not in only:
+            continue
+        if kind not in METRIC_KINDS:
+            raise ValueError(f'kind {kind} of metric {name} invalid; must be in {list(METRIC_KINDS)}')
+        if isinstance(params.get('business_calendar'), dict):
+            params['business_calendar'] = BusinessCalendar(**params['business_calendar'])
+        if isinstance(target, str):
+            target = {'tbl': target}
+        specs.append(dict(name=name, func=METRIC_KINDS[kind], params=params,
+                          target=dict({'if_tbl_exists': 'replace'}, **target) if target else None))
+
+    return specs
+
+
+def _read_source(source, engine, id_field, date_field, metrics, verbose=False):
+    """
+    Helper function to read the source of a job once, as one DataFrame or as chunks of complete groups.
+
+    :param source:              dict, required          source config, without id_field and date_field
+    :param engine:              object, required        SQLAlchemy engine, for query sources
+    :param id_field:            str, required           column name used to group data
+    :param date_field:          str, required           column containing event date or timestamp
+    :param metrics:             list, required          metric specs, whose conditions decide the columns read
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    generator               DataFrames of complete groups
+    """
+
+    source = dict(source)
+    if 'query' in source:
+        df = db_to_df(engine=engine, date_field=date_field, id_field=id_field, verbose=verbose, **source)
+        if df is None:
+            raise ValueError('source query failed; see error printed with verbose=True')
+        if source.get('chunksize'):
+            yield from iter_complete_groups(df, id_field, verbose=verbose)
+        elif not df.empty:
+            yield df
+        return
+
+    if 'path' not in source:
+        raise ValueError('source invalid; must have a query or a path')
+
+    path = source.pop('path')
+    file_format = source.pop('format', None) or _file_format(path)
+    if file_format not in SOURCE_LOADERS:
+        raise ValueError(f'format {file_format} invalid; must be in {list(SOURCE_LOADERS)}')
+
+    conditions = [metric['params'][key] for metric in metrics for key in ('start_conditions', 'end_conditions')]
+    df = SOURCE_LOADERS[file_format](path=path, id_field=id_field, date_field=date_field, conditions=conditions,
+                                     verbose=verbose, **source)
+    if not df.empty:
+        yield df
+
+
+def _file_format(path):
+    """
+    Helper function to infer the format of a source file from its extension; directories are Parquet datasets.
+
+    :param path:                str, required           file or directory
+    :return:                    str                     'parquet', 'arrow' or 'csv'
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.arrow', '.feather', '.ipc'):
+        return 'arrow'
+    if extension == '.csv':
+        return 'csv'
+    return 'parquet'
+
+
+def _write_target(engine, df, target, written, timings, verbose=False):
+    """
+    Helper function to write a result to its target table with df_to_db(); if_tbl_exists applies to the first write
+    to each table in a job, and later writes (e.g. of later chunks) are appended.
+
+    :param engine:              object, required        SQLAlchemy engine
+    :param df:                  df, required            result to write
+    :param target:              dict, required          df_to_db() parameters, with tbl and if_tbl_exists
+    :param written:             set, required           tables already written by this job; updated
+    :param timings:             dict, required          timings per stage; updated
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    start = time.perf_counter()
+    params = dict(target, if_tbl_exists=target['if_tbl_exists'] if target['tbl'] not in written else 'append')
+    df_to_db(engine=engine, df=df, verbose=verbose, **params)
+    if not df.empty:                                                # df_to_db() skips empty results
+        written.add(target['tbl'])
+    _add_timing(timings, 'write', target['tbl'], len(df), start)
+
+
+def _add_timing(timings, stage, name, rows, start):
+    """
+    Helper function to add rows and seconds since start to the timing of a stage of a job.
+
+    :param timings:             dict, required          timings per (stage, name); updated
+    :param stage:               str, required           'read', 'metric' or 'write'
+    :param name:                str, required           source, metric name or table name
+    :param rows:                int, required           rows processed
+    :param start:               float, required         time.perf_counter() at start of stage
+    :return:                    None
+    """
+
+    timing = timings.setdefault((stage, name), {'stage': stage, 'name': name, 'rows': 0, 'seconds': 0.0})
+    timing['rows'] += rows
+    timing['seconds'] += time.perf_counter() - start
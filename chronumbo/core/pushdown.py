@@ -0,0 +1,381 @@
+import sqlalchemy
+
+from sqlalchemy.dialects import (
+    mssql,
+    mysql,
+    postgresql,
+    sqlite
+)
+
+from chronumbo.core.conditions import (
+    compile_conditions
+)
+
+from chronumbo.core.sql import (
+    db_to_df
+)
+
+
+SQL_DIALECTS = {
+    'postgres': postgresql.dialect(),
+    'mysql': mysql.dialect(),
+    'mssql': mssql.dialect(),
+    'sqlite': sqlite.dialect(),
+}
+
+# seconds between two timestamps, per dialect; sqlite is intended as a local stand-in, and is accurate to ~1ms
+SQL_SECONDS_BETWEEN = {
+    'postgres': 'EXTRACT(EPOCH FROM ({end} - {start}))',
+    'mysql': 'TIMESTAMPDIFF(MICROSECOND, {start}, {end}) / 1000000.0',
+    'mssql': 'DATEDIFF_BIG(MICROSECOND, {start}, {end}) / 1000000.0',
+    'sqlite': '(julianday({end}) - julianday({start})) * 86400.0',
+}
+
+SQL_COMPARISONS = {'eq': '=', 'ne': '<>', 'gt': '>', 'ge': '>=', 'lt': '<', 'le': '<='}
+
+
+def build_delta_single_query(query, dialect, id_field, date_field, start_conditions, end_conditions,
+                             start_flag='start', end_flag='end', start_na_flag='start-na', end_na_flag='end-na',
+                             start_at_earliest=True, end_at_latest=True, use_earliest_if_no_start=False,
+                             use_latest_if_no_end=False):
+    """
+    Builds a SQL query which calculates, inside the database, the same delta as add_event_delta_single(), so that only
+    one row per id_field value is returned rather than the full event log.
+
+    The event log query is wrapped in a CTE; start and end conditions (see compile_conditions()) are translated to SQL
+    with bound parameters, and the start and end dates of each group are found with MIN/MAX aggregates. Returned rows
+    have the following columns:
+
+        id_field                    group identifier
+        start_ts, end_ts            dates used as start and end
+        start_kind, end_kind        start_flag or start_na_flag, end_flag or end_na_flag
+        delta_sec                   time delta in seconds
+
+    Within a group, "first" and "last" are by date; for an event log sorted by id_field and date_field, this matches
+    add_event_delta_single(). The event log query must not contain ORDER BY for MSSQL, as it is used as a CTE.
+
+    :param query:                       str, required       SQL query returning event log
+    :param dialect:                     str, required       'postgres', 'mysql', 'mssql', or 'sqlite'
+    :param id_field:                    str, required       column name used to group data (e.g. 'project_no')
+    :param date_field:                  str, required       column containing datetime used to calculate time delta
+    :param start_conditions:            dict, required      dict specifying conditions for identifying start event
+    :param end_conditions:              dict, required      dict specifying conditions for identifying end event
+    :param start_flag:                  str, optional       label for start_kind when start condition found
+    :param end_flag:                    str, optional       label for end_kind when end condition found
+    :param start_na_flag:               str, optional       label for start_kind if no matching start condition found
+    :param end_na_flag:                 str, optional       label for end_kind if no matching end condition found
+    :param start_at_earliest:           bool, optional      if True, uses first start event within each group
+    :param end_at_latest:               bool, optional      if True, uses last end event within each group
+    :param use_earliest_if_no_start:    bool, optional      if True, uses earliest date in group if no matching condition
+    :param use_latest_if_no_end:        bool, optional      if True, uses latest date in group if no matching condition
+    :return:                            object              SQLAlchemy text clause with bound parameters
+    """
+
+    quote = _quoter(dialect)
+    params = {}
+    id_col, date_col = quote(id_field), quote(date_field)
+    start_sql = conditions_to_sql(start_conditions, dialect, params)
+    end_sql = conditions_to_sql(end_conditions, dialect, params)
+    params.update(cb_start_flag=start_flag, cb_end_flag=end_flag, cb_start_na_flag=start_na_flag,
+                  cb_end_na_flag=end_na_flag)
+
+    start_agg = 'MIN' if start_at_earliest else 'MAX'
+    end_agg = 'MAX' if end_at_latest else 'MIN'
+    start_ts = 'COALESCE(start_ts, first_ts)' if use_earliest_if_no_start else 'start_ts'
+    end_ts = 'COALESCE(end_ts, last_ts)' if use_latest_if_no_end else 'end_ts'
+
+    sql = f"""
+        WITH cb_src AS (
+            {query}
+        ),
+        cb_flagged AS (
+            SELECT
+                {id_col} AS cb_id,
+                {date_col} AS cb_date,
+                CASE WHEN {start_sql} THEN 1 ELSE 0 END AS cb_is_start,
+                CASE WHEN {start_sql} THEN 0 WHEN {end_sql} THEN 1 ELSE 0 END AS cb_is_end
+            FROM cb_src
+            WHERE {id_col} IS NOT NULL
+        ),
+        cb_groups AS (
+            SELECT
+                cb_id,
+                {start_agg}(CASE WHEN cb_is_start = 1 THEN cb_date END) AS start_ts,
+                {end_agg}(CASE WHEN cb_is_end = 1 THEN cb_date END) AS end_ts,
+                MIN(cb_date) AS first_ts,
+                MAX(cb_date) AS last_ts
+            FROM cb_flagged
+            GROUP BY cb_id
+        ),
+        cb_resolved AS (
+            SELECT
+                cb_id,
+                {start_ts} AS start_ts,
+                {end_ts} AS end_ts,
+                CASE WHEN start_ts IS NOT NULL THEN :cb_start_flag ELSE :cb_start_na_flag END AS start_kind,
+                CASE WHEN end_ts IS NOT NULL THEN :cb_end_flag ELSE :cb_end_na_flag END AS end_kind
+            FROM cb_groups
+        )
+        SELECT
+            cb_id AS {id_col},
+            start_ts,
+            end_ts,
+            start_kind,
+            end_kind,
+            {SQL_SECONDS_BETWEEN[dialect].format(start='start_ts', end='end_ts')} AS delta_sec
+        FROM cb_resolved
+        WHERE start_ts IS NOT NULL AND end_ts IS NOT NULL
+    """
+
+    return sqlalchemy.text(sql).bindparams(**params)
+
+
+def build_delta_paired_query(query, dialect, id_field, date_field, start_conditions, end_conditions):
+    """
+    Builds a SQL query which pairs start and end events inside the database as add_event_delta_paired() does, so that
+    only one row per pair is returned rather than the full event log.
+
+    The pairing is the same as _pair_positions() in chronumbo.main, expressed with window functions: a row matching
+    only start conditions leaves a pair open, a row matching only end conditions leaves none open, and a row matching
+    both toggles. Runs of toggling rows are counted with windowed SUM, the state before each row is found with LAG,
+    and each accepted end is paired with the accepted start before it. Returned rows have the following columns:
+
+        id_field                    group identifier
+        start_ts, end_ts            dates of start and end events
+        delta_sec                   time delta in seconds
+
+    Rows are ordered by date within each group; rows with identical dates are ordered arbitrarily. The event log
+    query must not contain ORDER BY for MSSQL, as it is used as a CTE.
+
+    :param query:               str, required       SQL query returning event log
+    :param dialect:             str, required       'postgres', 'mysql', 'mssql', or 'sqlite'
+    :param id_field:            str, required       column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required       column containing datetime used to calculate time delta
+    :param start_conditions:    dict, required      dict specifying conditions for identifying start event
+    :param end_conditions:      dict, required      dict specifying conditions for identifying end event
+    :return:                    object              SQLAlchemy text clause with bound parameters
+    """
+
+    quote = _quoter(dialect)
+    params = {}
+    id_col, date_col = quote(id_field), quote(date_field)
+    start_sql = conditions_to_sql(start_conditions, dialect, params)
+    end_sql = conditions_to_sql(end_conditions, dialect, params)
+
+    sql = f"""
+        WITH cb_src AS (
+            {query}
+        ),
+        cb_flagged AS (
+            SELECT
+                {id_col} AS cb_id,
+                {date_col} AS cb_date,
+                CASE WHEN {start_sql} THEN 1 ELSE 0 END AS cb_s,
+                CASE WHEN {end_sql} THEN 1 ELSE 0 END AS cb_e
+            FROM cb_src
+            WHERE {id_col} IS NOT NULL
+        ),
+        cb_relevant AS (
+            SELECT
+                cb_id,
+                cb_date,
+                cb_s,
+                cb_e,
+                cb_s * cb_e AS cb_b,
+                ROW_NUMBER() OVER (PARTITION BY cb_id ORDER BY cb_date) AS cb_rn
+            FROM cb_flagged
+            WHERE cb_s = 1 OR cb_e = 1
+        ),
+        cb_runs AS (
+            SELECT
+                cb_relevant.*,
+                SUM(1 - cb_b) OVER (PARTITION BY cb_id ORDER BY cb_rn ROWS UNBOUNDED PRECEDING) AS cb_run
+            FROM cb_relevant
+        ),
+        cb_toggles AS (
+            SELECT
+                cb_runs.*,
+                COALESCE(MAX(CASE WHEN cb_b = 0 THEN cb_s END) OVER (PARTITION BY cb_id, cb_run), 0) AS cb_base,
+                SUM(cb_b) OVER (PARTITION BY cb_id, cb_run ORDER BY cb_rn ROWS UNBOUNDED PRECEDING) AS cb_k
+            FROM cb_runs
+        ),
+        cb_states AS (
+            SELECT
+                cb_toggles.*,
+                (cb_base + cb_k - 1) % 2 AS cb_b_open_before,
+                CASE WHEN cb_b = 1 THEN 1 - (cb_base + cb_k - 1) % 2 ELSE cb_s END AS cb_open_after
+            FROM cb_toggles
+        ),
+        cb_accepted AS (
+            SELECT
+                cb_id,
+                cb_date,
+                cb_rn,
+                cb_s,
+                cb_e,
+                CASE WHEN cb_b = 1 THEN cb_b_open_before
+                     ELSE LAG(cb_open_after, 1, 0) OVER (PARTITION BY cb_id ORDER BY cb_rn) END AS cb_open_before
+            FROM cb_states
+        ),
+        cb_pairs AS (
+            SELECT
+                cb_id,
+                cb_date AS end_ts,
+                cb_s * (1 - cb_open_before) AS cb_is_start,
+                LAG(cb_date) OVER (PARTITION BY cb_id ORDER BY cb_rn) AS start_ts
+            FROM cb_accepted
+            WHERE (cb_s = 1 AND cb_open_before = 0) OR (cb_e = 1 AND cb_open_before = 1)
+        )
+        SELECT
+            cb_id AS {id_col},
+            start_ts,
+            end_ts,
+            {SQL_SECONDS_BETWEEN[dialect].format(start='start_ts', end='end_ts')} AS delta_sec
+        FROM cb_pairs
+        WHERE cb_is_start = 0
+    """
+
+    return sqlalchemy.text(sql).bindparams(**params)
+
+
+def db_event_delta_single(query, engine, dialect, id_field, date_field, start_conditions, end_conditions,
+                          verbose=False, **kwargs):
+    """
+    Calculates add_event_delta_single() deltas inside the database with build_delta_single_query(), returning only
+    one row per id_field value; see build_delta_single_query() for parameters and returned columns.
+
+    :param query:               str, required       SQL query returning event log
+    :param engine:              object, required    SQLAlchemy engine object used to connect to database
+    :param dialect:             str, required       'postgres', 'mysql', 'mssql', or 'sqlite'
+    :param id_field:            str, required       column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required       column containing datetime used to calculate time delta
+    :param start_conditions:    dict, required      dict specifying conditions for identifying start event
+    :param end_conditions:      dict, required      dict specifying conditions for identifying end event
+    :param verbose:             bool, optional      if True, print status to terminal
+    :param kwargs:              any, optional       flags and earliest/latest options of build_delta_single_query()
+    :return:                    df                  one row per id_field value with a delta
+    """
+
+    delta_query = build_delta_single_query(query, dialect, id_field, date_field, start_conditions, end_conditions,
+                                           **kwargs)
+    print(delta_query) if verbose else None
+    return db_to_df(query=delta_query, engine=engine, verbose=verbose)
+
+
+def db_event_delta_paired(query, engine, dialect, id_field, date_field, start_conditions, end_conditions,
+                          verbose=False):
+    """
+    Calculates add_event_delta_paired() pairs inside the database with build_delta_paired_query(), returning only one
+    row per pair; see build_delta_paired_query() for parameters and returned columns.
+
+    :param query:               str, required       SQL query returning event log
+    :param engine:              object, required    SQLAlchemy engine object used to connect to database
+    :param dialect:             str, required       'postgres', 'mysql', 'mssql', or 'sqlite'
+    :param id_field:            str, required       column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required       column containing datetime used to calculate time delta
+    :param start_conditions:    dict, required      dict specifying conditions for identifying start event
+    :param end_conditions:      dict, required      dict specifying conditions for identifying end event
+    :param verbose:             bool, optional      if True, print status to terminal
+    :return:                    df                  one row per pair
+    """
+
+    delta_query = build_delta_paired_query(query, dialect, id_field, date_field, start_conditions, end_conditions)
+    print(delta_query) if verbose else None
+    return db_to_df(query=delta_query, engine=engine, verbose=verbose)
+
+
+def conditions_to_sql(conditions, dialect, params):
+    """
+    Translates conditions (see compile_conditions()) into a SQL boolean expression, adding values to params as bound
+    parameters rather than writing them into the SQL.
+
+    Each operator is wrapped to evaluate to true or false, never NULL, so that missing values never match and '$not'
+    behaves as it does in pandas.
+
+    :param conditions:          dict, required          dict of column names and expected values or operator dicts
+    :param dialect:             str, required           'postgres', 'mysql', 'mssql', or 'sqlite'
+    :param params:              dict, required          bound parameters; updated in place
+    :return:                    str                     SQL boolean expression
+    """
+
+    if dialect not in SQL_DIALECTS:
+        raise ValueError(f'dialect {dialect} invalid; must be one of {list(SQL_DIALECTS)}')
+
+    return _node_to_sql(compile_conditions(conditions), dialect, _quoter(dialect), params)
+
+
+def _quoter(dialect):
+    """
+    Helper function to return the identifier quoting function of a dialect; identifiers are quoted only if needed.
+
+    :param dialect:             str, required           'postgres', 'mysql', 'mssql', or 'sqlite'
+    :return:                    function                quotes a column name
+    """
+
+    if dialect not in SQL_DIALECTS:
+        raise ValueError(f'dialect {dialect} invalid; must be one of {list(SQL_DIALECTS)}')
+    return SQL_DIALECTS[dialect].identifier_preparer.quote
+
+
+def _node_to_sql(node, dialect, quote, params):
+    """
+    Helper function to translate a condition tree from compile_conditions() into SQL.
+
+    :param node:                tuple, required         condition tree
+    :param dialect:             str, required           'postgres', 'mysql', 'mssql', or 'sqlite'
+    :param quote:               function, required      identifier quoting function
+    :param params:              dict, required          bound parameters; updated in place
+    :return:                    str                     SQL boolean expression
+    """
+
+    kind = node[0]
+    if kind == 'and':
+        return '(' + ' AND '.join(_node_to_sql(child, dialect, quote, params) for child in node[1]) + ')' \
+            if node[1] else '(1 = 1)'
+    if kind == 'or':
+        return '(' + ' OR '.join(_node_to_sql(child, dialect, quote, params) for child in node[1]) + ')'
+    if kind == 'not':
+        return f'(NOT {_node_to_sql(node[1], dialect, quote, params)})'
+
+    _, field, op, operand = node
+    col = quote(field)
+
+    def bind(value):
+        name = f'cb_p{len(params)}'
+        params[name] = value
+        return f':{name}'
+
+    if op in SQL_COMPARISONS:
+        sql = f'{col} {SQL_COMPARISONS[op]} {bind(operand)}'
+    elif op in ('in', 'not_in') and not operand:
+        sql = '1 = 0' if op == 'in' else f'{col} IS NOT NULL'
+    elif op in ('in', 'not_in'):
+        values = ', '.join(bind(value) for value in operand)
+        sql = f'{col} {"IN" if op == "in" else "NOT IN"} ({values})'
+    elif op == 'between':
+        sql = f'{col} BETWEEN {bind(operand[0])} AND {bind(operand[1])}'
+    elif op == 'isnull':
+        sql = f'{col} IS NULL' if operand else f'{col} IS NOT NULL'
+    elif op == 'notnull':
+        sql = f'{col} IS NOT NULL' if operand else f'{col} IS NULL'
+    elif op in ('startswith', 'endswith', 'contains'):
+        patterns = operand if isinstance(operand, tuple) else (operand,)
+        likes = []
+        for pattern in patterns:
+            escaped = str(pattern).replace('!', '!!').replace('%', '!%').replace('_', '!_')
+            if op == 'startswith':
+                escaped = escaped + '%'
+            elif op == 'endswith':
+                escaped = '%' + escaped
+            else:
+                escaped = '%' + escaped + '%'
+            likes.append(f"{col} LIKE {bind(escaped)} ESCAPE '!'")
+        sql = ' OR '.join(likes)
+    elif dialect == 'postgres':
+        sql = f'{col} ~ {bind(operand)}'
+    elif dialect == 'mysql':
+        sql = f'{col} REGEXP {bind(operand)}'
+    else:
+        raise ValueError(f'regex conditions are not supported for dialect {dialect}')
+
+    return f'(CASE WHEN {sql} THEN 1 ELSE 0 END = 1)'
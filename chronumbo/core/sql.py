@@ -1,3 +1,11 @@
+import io
+import os
+import re
+import sqlite3
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
 # import pymsql               # must be installed for MySQL
 import sqlalchemy
@@ -6,8 +14,58 @@ from chronumbo.core.constants import (
     DTYPE_MAPPING
 )
 
+from chronumbo.core.dtypes import (
+    optimize_dtypes
+)
+
+from chronumbo.core.toolkit import (
+    span,
+    the_time_keeper
+)
+
+
+# most bound parameters allowed in one statement, which limits rows per multi-row INSERT
+BULK_MAX_PARAMS = {
+    'mysql': 65535,
+    'sqlite': 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999,
+}
+
+# seconds column types retrieved by get_sql_col_types() are reused before being retrieved again
+SCHEMA_CACHE_TTL = 300
+
+# column types and cast plans per (database URL, schema, table); see get_sql_col_types() and clear_schema_cache()
+_schema_cache = {}
+
+# engines created by create_engine(), keyed by connection and pool parameters; see pool_stats() and dispose_engines()
+_engine_registry = {}
+
+
+class _MeteredQueuePool(sqlalchemy.pool.QueuePool):
+    """
+    QueuePool which records, for pool_stats(), how long each checkout waited for a connection; waits are long when
+    pool_size and max_overflow are too small for the number of concurrent jobs.
+    """
+
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                wait = time.perf_counter() - start
+                self.metrics['wait_sec_total'] += wait
+                self.metrics['wait_sec_max'] = max(self.metrics['wait_sec_max'], wait)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
 
-def create_engine(db, dialect, user, password, endpoint, mssql_driver=17, fast_executemany=False, verbose=False):
+
+def create_engine(db, dialect, user, password, endpoint, mssql_driver=17, fast_executemany=False, verbose=False,
+                  pool_size=None, max_overflow=None, pool_pre_ping=False, pool_recycle=-1, reuse=True):
     """
     Creates a SQLAlchemy engine to connect to a specified database based on the provided dialect (Postgres, MySQL, or
     MSSQL).
@@ -16,6 +74,17 @@ def create_engine(db, dialect, user, password, endpoint, mssql_driver=17, fast_e
     allows selecting ODBC driver version, and fast_executemany can be used for faster bulk inserts; for PostgreSQL and
     MySQL, use chunksize in db_to_df().
 
+    SQLite is also supported as a local stand-in for testing and benchmarking; db is the path to the database file
+    (or ':memory:'), and user, password and endpoint are ignored.
+
+    Engines are kept in a process-wide registry keyed by connection and pool parameters, so repeated calls with the
+    same parameters (e.g. one per metric in a scheduled job) return the same engine and reuse its pooled connections.
+    pool_size, max_overflow, pool_pre_ping and pool_recycle are passed to SQLAlchemy's connection pool; pool_pre_ping
+    and pool_recycle guard against connections dropped by the server between runs. pool_stats() reports checkouts and
+    time spent waiting for a connection per engine. Pooled connections are not carried into forked child processes
+    (e.g. ProcessPoolExecutor workers); the child opens its own. In-memory SQLite databases are never shared, so are
+    not registered.
+
     For MySQL, the following library must be installed:
 
         pip install pymsql
@@ -23,60 +92,375 @@ def create_engine(db, dialect, user, password, endpoint, mssql_driver=17, fast_e
     The function returns a SQLAlchemy engine object for database interactions.
 
     :param db:                  str, required           database name
-    :param dialect:             str, required           database type; 'postgres', 'mysql', or 'mssql'
+    :param dialect:             str, required           database type; 'postgres', 'mysql', 'mssql', or 'sqlite'
     :param user:                str, required           database username
     :param password:            str, required           database password
     :param endpoint:            str, required           server hostname or IP address where database is hosted
     :param mssql_driver:        int, optional           driver version for connecting to Microsoft SQL Server
     :param fast_executemany:    bool, optional          if True, enables fast bulk inserts for MSSQL
     :param verbose:             bool, optional          if True, print status to terminal
+    :param pool_size:           int, optional           connections kept open in pool; SQLAlchemy default if None
+    :param max_overflow:        int, optional           connections allowed beyond pool_size; SQLAlchemy default if None
+    :param pool_pre_ping:       bool, optional          if True, tests connections for liveness on checkout
+    :param pool_recycle:        int, optional           seconds after which connections are replaced; -1 for never
+    :param reuse:               bool, optional          if True, returns registered engine for the same parameters
     :return:                    object                  SQLAlchemy engine object for specified database
     """
 
+    key = (dialect, db, user, password, endpoint, mssql_driver, fast_executemany, pool_size, max_overflow,
+           pool_pre_ping, pool_recycle)
+    if reuse and key in _engine_registry:
+        print(f'Reusing engine for database {db}.') if verbose else None
+        return _engine_registry[key]
+
+    options = {}
     if dialect == 'postgres':
-        engine = sqlalchemy.create_engine(
-            url=f'postgresql://{user}:{password}@{endpoint}/{db}',
-            echo=verbose
-        )
+        url = f'postgresql://{user}:{password}@{endpoint}/{db}'
     elif dialect == 'mysql':
-        engine = sqlalchemy.create_engine(
-            url=f'mysql+pymysql://{user}:{password}@{endpoint}/{db}',
-            echo=verbose
-        )
+        url = f'mysql+pymysql://{user}:{password}@{endpoint}/{db}'
     elif dialect == 'mssql':
-        engine = sqlalchemy.create_engine(
-            url=f'mssql://{user}:{password}@{endpoint}/{db}'
-            f'?driver=ODBC+Driver+{str(mssql_driver)}+for+SQL+Server',
-            fast_executemany=fast_executemany,
-            echo=verbose
-        )
+        url = f'mssql://{user}:{password}@{endpoint}/{db}?driver=ODBC+Driver+{str(mssql_driver)}+for+SQL+Server'
+        options['fast_executemany'] = fast_executemany
+    elif dialect == 'sqlite':
+        url = f'sqlite:///{db}'
     else:
         print(f'dialect {dialect} invalid type; cannot create connection engine')
         return None
 
+    in_memory = dialect == 'sqlite' and db in ('', ':memory:')
+    if not in_memory:
+        options['poolclass'] = _MeteredQueuePool
+        options.update({name: value for name, value in (('pool_size', pool_size), ('max_overflow', max_overflow))
+                        if value is not None})
+
+    engine = sqlalchemy.create_engine(
+        url=url,
+        pool_pre_ping=pool_pre_ping,
+        pool_recycle=pool_recycle,
+        echo=verbose,
+        **options
+    )
+
+    metrics = {'checkouts': 0, 'connects': 0, 'wait_sec_total': 0.0, 'wait_sec_max': 0.0}
+    engine.pool.metrics = metrics
+    sqlalchemy.event.listen(engine, 'checkout', lambda *args: metrics.update(checkouts=metrics['checkouts'] + 1))
+    sqlalchemy.event.listen(engine, 'connect', lambda *args: metrics.update(connects=metrics['connects'] + 1))
+
+    if reuse and not in_memory:
+        _engine_registry[key] = engine
+
     print('Success: create_engine() successful to database {}.'.format(db)) if verbose else None
 
     return engine
 
 
-def db_to_df(query, engine, verbose=False):
+def pool_stats(engine=None):
+    """
+    Reports connection pool use for an engine from create_engine(), or for every registered engine: checkouts made,
+    new connections opened, connections currently checked out, and total and longest time spent waiting for a
+    connection (recorded for pooled engines, not in-memory SQLite).
+
+    :param engine:              object, optional        SQLAlchemy engine from create_engine(); all registered if None
+    :return:                    df                      one row per engine
+    """
+
+    engines = [engine] if engine is not None else list(_engine_registry.values())
+    rows = []
+    for eng in engines:
+        pool = eng.pool
+        queued = isinstance(pool, sqlalchemy.pool.QueuePool)
+        metrics = getattr(pool, 'metrics', None) or {}
+        rows.append({
+            'url': eng.url.render_as_string(hide_password=True),
+            'pool': type(pool).__name__,
+            'size': pool.size() if queued else None,
+            'checked_out': pool.checkedout() if queued else None,
+            'checkouts': metrics.get('checkouts'),
+            'connects': metrics.get('connects'),
+            'wait_sec_total': metrics.get('wait_sec_total'),
+            'wait_sec_max': metrics.get('wait_sec_max'),
+        })
+
+    return pd.DataFrame(rows, columns=['url', 'pool', 'size', 'checked_out', 'checkouts', 'connects',
+                                       'wait_sec_total', 'wait_sec_max'])
+
+
+def dispose_engines(verbose=False):
+    """
+    Closes pooled connections of every engine registered by create_engine() and empties the registry; later calls to
+    create_engine() create new engines.
+
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    for engine in _engine_registry.values():
+        engine.dispose()
+    print(f'Disposed of {len(_engine_registry)} engines.') if verbose else None
+    _engine_registry.clear()
+
+
+def _dispose_after_fork():
+    """
+    Helper function run in a child process after fork; drops pooled connections inherited from the parent without
+    closing them, as they are still in use by the parent, so the child opens its own.
+    """
+
+    for engine in _engine_registry.values():
+        engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+def db_to_df(query, engine, verbose=False, chunksize=None, optimize=False, date_field=None, id_field=None,
+             source_tbl=None, schema=None):
     """
     Executes a SQL query and returns result as a pandas DataFrame.
 
+    If chunksize is given, the query is read through a server-side cursor (where the driver supports one) and a
+    generator of DataFrames of up to chunksize rows is returned instead, so the full result never has to fit in
+    memory at once. To compute deltas chunk by chunk, order the query by id and date and pass the chunks to
+    stream_event_delta():
+
+        chunks = db_to_df(query=audit_query + ' ORDER BY project_id, event_date', engine=engine, chunksize=500000)
+
+    If optimize is True, the result is converted to compact dtypes with optimize_dtypes(): date_field is parsed to
+    datetime64, integer columns and id_field are downcast, and low-cardinality text columns (e.g. event, description,
+    alias) become categoricals. If source_tbl is given, its column types (see get_sql_col_types()) are used to restore
+    integer, boolean and date columns the driver returned as float, integer or text. With chunksize, each chunk is
+    optimized separately, so categories can differ between chunks.
+
     :param query:               str, required       SQL query to execute and convert to pandas DataFrame
     :param engine:              object, required    SQLAlchemy engine object used to connect to database
     :param verbose:             bool, optional      if True, print status to terminal
-    :return:                    df                  DataFrame from SQL query
+    :param chunksize:           int, optional       if given, rows per chunk; returns a generator of DataFrames
+    :param optimize:            bool, optional      if True, converts result to compact dtypes
+    :param date_field:          str, optional       column containing event date, parsed to datetime64 if optimize
+    :param id_field:            str, optional       column name used to group data, downcast if optimize
+    :param source_tbl:          str, optional       table queried, whose column types guide optimize
+    :param schema:              str, optional       database schema of source_tbl, if not the default
+    :return:                    df                  DataFrame from SQL query, or generator of DataFrames if chunksize
     """
 
+    optimize_kwargs = None
+    if optimize:
+        sql_col_types = get_sql_col_types(engine=engine, tbl=source_tbl, schema=schema, verbose=verbose) \
+            if source_tbl else None
+        optimize_kwargs = dict(date_field=date_field, id_field=id_field, sql_col_types=sql_col_types, verbose=verbose)
+
+    if chunksize:
+        return _read_sql_chunks(query=query, engine=engine, chunksize=chunksize, optimize_kwargs=optimize_kwargs,
+                                verbose=verbose)
+
     try:
-        return pd.read_sql(query, engine)
+        with span('read') as read_span:
+            df = pd.read_sql(query, engine)
+            read_span.add_rows(len(df))
 
     except Exception as e:
         print(f'Error executing query: {e}') if verbose else None
+        return
+
+    if optimize_kwargs is not None:
+        with span('optimize', rows=len(df)):
+            df = optimize_dtypes(df, **optimize_kwargs)
+    return df
+
 
+def _read_sql_chunks(query, engine, chunksize, optimize_kwargs=None, verbose=False):
+    """
+    Helper function to read a SQL query in chunks over a single streaming connection.
+
+    Unlike db_to_df(), errors are raised rather than returned as None, so a failure part way through the query is
+    not mistaken for the end of the result.
+
+    :param query:               str, required       SQL query to execute
+    :param engine:              object, required    SQLAlchemy engine object used to connect to database
+    :param chunksize:           int, required       rows per chunk
+    :param optimize_kwargs:     dict, optional      if given, arguments to optimize_dtypes() applied to each chunk
+    :param verbose:             bool, optional      if True, print status to terminal
+    :return:                    generator           DataFrames of up to chunksize rows
+    """
+
+    rows = 0
+    try:
+        with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as conn:
+            reader = iter(pd.read_sql(query, conn, chunksize=chunksize))
+            while True:
+                # spans cover each fetch only, not the caller's work between chunks
+                with span('read') as read_span:
+                    chunk = next(reader, None)
+                    read_span.add_rows(len(chunk) if chunk is not None else 0)
+                if chunk is None:
+                    break
+                rows += len(chunk)
+                print(f'Read chunk of {len(chunk)} rows; {rows} rows total.') if verbose else None
+                if optimize_kwargs is not None:
+                    with span('optimize', rows=len(chunk)):
+                        chunk = optimize_dtypes(chunk, **optimize_kwargs)
+                yield chunk
+
+    except Exception as e:
+        print(f'Error executing query after {rows} rows: {e}') if verbose else None
+        raise
+
+
+def db_to_df_partitioned(query, engine, id_field, n_partitions, partition_by='modulo', bounds=None, stream=False,
+                         verbose=False):
+    """
+    Executes a SQL query as n_partitions queries on id_field, read at the same time over pooled connections, and
+    returns the combined result as a pandas DataFrame, or as a generator of one DataFrame per partition.
+
+    A single read is usually bound by network round-trips over one connection; reading partitions concurrently cuts
+    wall time by up to the number of partitions, within the engine's pool_size and max_overflow (see
+    create_engine()). The query is wrapped as a derived table and filtered per partition:
+
+        modulo                      id_field mod n_partitions = i, non-negative for negative ids; id_field must be an
+                                    integer
+        range                       bounds[i] <= id_field < bounds[i + 1], with the first and last partitions
+                                    open-ended; if bounds is None, the range between the minimum and maximum of
+                                    id_field is split evenly, so id_field must be numeric
+
+    With n_partitions=1, the query is read once, unfiltered.
+
+    Rows with a null id_field are read in the first partition. Every id_field value is read by exactly one partition,
+    so each partition holds complete groups, and with stream=True each DataFrame can be passed to the delta functions
+    as it arrives. Partitions are yielded as they complete; the combined DataFrame is in partition order, not query
+    order. The query must not contain ORDER BY for MSSQL, as it is used as a derived table.
+
+    :param query:               str, required       SQL query to execute and convert to pandas DataFrame
+    :param engine:              object, required    SQLAlchemy engine object used to connect to database
+    :param id_field:            str, required       column name used to partition data (e.g. 'project_no')
+    :param n_partitions:        int, required       number of partitions, each read over its own connection
+    :param partition_by:        str, optional       'modulo' or 'range'
+    :param bounds:              list, optional      n_partitions + 1 ascending boundaries; first and last are unused,
+                                                    as outer partitions are open-ended; 'range' only
+    :param stream:              bool, optional      if True, returns a generator of DataFrames, one per partition
+    :param verbose:             bool, optional      if True, print status to terminal
+    :return:                    df                  DataFrame from SQL query, or generator of DataFrames if stream
+    """
+
+    col = engine.dialect.identifier_preparer.quote(id_field)
+    query = str(query).strip().rstrip(';')
+
+    if partition_by not in ('modulo', 'range'):
+        raise ValueError(f'partition_by {partition_by} invalid; must be \'modulo\' or \'range\'')
+    if n_partitions < 1:
+        raise ValueError(f'n_partitions {n_partitions} invalid; must be at least 1')
+
+    if n_partitions == 1:
+        predicates = [('1 = 1', {})]
+    elif partition_by == 'modulo':
+        # % takes the sign of the dividend in every supported dialect, so is shifted to be non-negative for negative ids
+        predicates = [(f'(({col} % :cb_n) + :cb_n) % :cb_n = :cb_i', {'cb_n': n_partitions, 'cb_i': i})
+                      for i in range(n_partitions)]
+    else:
+        if bounds is None:
+            bounds = _partition_bounds(query=query, engine=engine, col=col, n_partitions=n_partitions)
+        elif len(bounds) != n_partitions + 1:
+            raise ValueError(f'bounds of length {len(bounds)} invalid; must be n_partitions + 1')
+        predicates = _range_predicates(col, bounds[1:-1])
+
+    statements = []
+    for i, (predicate, params) in enumerate(predicates):
+        predicate = f'({predicate}) OR {col} IS NULL' if i == 0 else predicate
+        statement = sqlalchemy.text(f'SELECT * FROM ({query}) cb_partition WHERE {predicate}')
+        statements.append(statement.bindparams(**params))
+
+    partitions = _read_partitions(statements=statements, engine=engine, verbose=verbose)
+    if stream:
+        return (df for i, df in partitions)
+
+    frames = dict(partitions)
+    return pd.concat([frames[i] for i in range(len(statements))], ignore_index=True)
+
+
+def _range_predicates(col, cuts):
+    """
+    Helper function to build range partition predicates from ascending cut points between partitions, so that
+    partitions never overlap: id_field < cuts[0], cuts[i - 1] <= id_field < cuts[i], ..., id_field >= cuts[-1]. The
+    first and last partitions are open-ended, so values outside of the cut points are still read.
+
+    :param col:                 str, required       quoted column name
+    :param cuts:                list, required      ascending cut points; one fewer than the number of partitions
+    :return:                    list                tuples of predicate and bound parameters, one per partition
+    """
+
+    edges = [None] + list(cuts) + [None]
+    predicates = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        clauses, params = [], {}
+        if lo is not None:
+            clauses.append(f'{col} >= :cb_lo')
+            params['cb_lo'] = lo
+        if hi is not None:
+            clauses.append(f'{col} < :cb_hi')
+            params['cb_hi'] = hi
+        predicates.append((' AND '.join(clauses), params))
+    return predicates
+
+
+def _partition_bounds(query, engine, col, n_partitions):
+    """
+    Helper function to split the range of a numeric column returned by a query into n_partitions even ranges.
+
+    :param query:               str, required       SQL query
+    :param engine:              object, required    SQLAlchemy engine object used to connect to database
+    :param col:                 str, required       quoted column name
+    :param n_partitions:        int, required       number of partitions
+    :return:                    list                n_partitions + 1 ascending boundaries
+    """
+
+    with engine.connect() as conn:
+        low, high = conn.execute(sqlalchemy.text(f'SELECT MIN({col}), MAX({col}) FROM ({query}) cb_partition')).one()
+
+    if low is None:
+        return [0] * (n_partitions + 1)
+    step = (high - low) / n_partitions
+    return [low + step * i for i in range(n_partitions)] + [high]
+
+
+def _read_partitions(statements, engine, verbose=False):
+    """
+    Helper function to read partition queries concurrently in threads, each over its own pooled connection, yielding
+    DataFrames as they complete. As with _read_sql_chunks(), errors are raised rather than returned as None, so a
+    failed partition is not mistaken for an empty one.
+
+    :param statements:          list, required      SQLAlchemy text clauses, one per partition
+    :param engine:              object, required    SQLAlchemy engine object used to connect to database
+    :param verbose:             bool, optional      if True, print status to terminal
+    :return:                    generator           tuples of partition number and DataFrame
+    """
 
-def df_to_db(engine, df, tbl, if_tbl_exists, retrieve_dtype_from_db=False, dtype_override=None, chunksize=10000, verbose=False):
+    def read(statement):
+        with span('read') as read_span, engine.connect() as conn:
+            df = pd.read_sql(statement, conn)
+            read_span.add_rows(len(df))
+            return df
+
+    start_time = the_time_keeper()
+    rows = 0
+    with ThreadPoolExecutor(max_workers=len(statements)) as pool:
+        futures = {pool.submit(read, statement): i for i, statement in enumerate(statements)}
+        try:
+            for future in as_completed(futures):
+                df = future.result()
+                rows += len(df)
+                print(f'Read partition {futures[future]} of {len(df)} rows; {rows} rows total, '
+                      f'{the_time_keeper(start_time)}') if verbose else None
+                yield futures[future], df
+
+        except Exception as e:
+            print(f'Error reading partition: {e}') if verbose else None
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def df_to_db(engine, df, tbl, if_tbl_exists, retrieve_dtype_from_db=False, dtype_override=None, chunksize=10000,
+             verbose=False, bulk=False, schema=None):
     """
     Connects to database and attempts to push a pandas DataFrame to a specified SQL table. Optionally checks or
     overrides column data types based on provided mappings or existing database table schema.
@@ -87,11 +471,24 @@ def df_to_db(engine, df, tbl, if_tbl_exists, retrieve_dtype_from_db=False, dtype
         {'col1': sqlalchemy.types.Integer(), 'col2': sqlalchemy.types.String()}
 
     If retrieve_dtype_from_db is True, function will fetch column types of existing SQL table and match DataFrame's
-    dtypes to existing table schema.
+    dtypes to existing table schema. Column types are cached per table (see get_sql_col_types()), and the columns to
+    cast are worked out once per table and set of DataFrame dtypes, so repeated writes and chunks of the same shape
+    skip both the metadata round-trip and the comparison; with if_tbl_exists='replace', the cache for the table is
+    cleared after writing.
 
     The function will check whether DataFrame's column types match SQL table's column types. If a mismatch occurs and
     can be cast, the function will attempt to convert columns. If conversion is not possible, it will fail.
 
+    If bulk is True, rows are written with the fastest path for the engine's dialect rather than one INSERT per row:
+
+        postgres                    COPY ... FROM STDIN, streaming each chunk as CSV from an in-memory buffer
+        mysql, sqlite               one multi-row INSERT ... VALUES per chunk, with rows capped by BULK_MAX_PARAMS
+        mssql                       executemany with pyodbc fast_executemany, whether or not the engine was created
+                                    with it
+
+    With COPY, empty strings are loaded as NULL. To write chunks as they are produced (e.g. from stream_event_delta())
+    without holding them all in memory, see chunks_to_db().
+
     :param engine:                  object, required    SQLAlchemy engine object used to connect to database
     :param df:                      df, required        pandas DataFrame to upload to SQL
     :param tbl:                     str, required       name of table to push data to
@@ -100,6 +497,8 @@ def df_to_db(engine, df, tbl, if_tbl_exists, retrieve_dtype_from_db=False, dtype
     :param dtype_override:          dict, optional      a dict to define column names and their SQL types
     :param chunksize:               int, optional       rows to be inserted at a time during bulk insert operations
     :param verbose:                 bool, optional      if True, print status to terminal
+    :param bulk:                    bool, optional      if True, uses COPY, multi-row INSERT or fast_executemany
+    :param schema:                  str, optional       database schema of table, if not the default
     :return:                        None
     """
 
@@ -107,53 +506,340 @@ def df_to_db(engine, df, tbl, if_tbl_exists, retrieve_dtype_from_db=False, dtype
         print('DataFrame is empty. Skipping SQL upload.') if verbose else None
         return
 
-    # if needed, get column types from database
-    db_col_types = get_sql_col_types(engine=engine, tbl=tbl) if retrieve_dtype_from_db else {}
-    print(db_col_types) if verbose else None
-
     # if provided, apply dtype overrides
     if dtype_override:
         print(f'Using provided dtype_override: {dtype_override}') if verbose else None
         df = df.astype(dtype_override)
 
     # compare and cast DataFrame column types to match SQL table schema
-    for col in df.columns:
-        if col in db_col_types:
-            expected_dtype = DTYPE_MAPPING.get(db_col_types[col].lower())
-            if expected_dtype and str(df[col].dtype) != expected_dtype:
+    cast_plan = _cast_plan(engine=engine, tbl=tbl, schema=schema, df=df, verbose=verbose) \
+        if retrieve_dtype_from_db else {}
+    if cast_plan:
+        print(f'Casting columns {cast_plan}') if verbose else None
+        try:
+            df = df.astype(cast_plan)
+        except Exception:
+            for col, expected_dtype in cast_plan.items():
                 try:
-                    print(f'Casting column {col} from {df[col].dtype} to {expected_dtype}') if verbose else None
-                    df[col] = df[col].astype(expected_dtype)
+                    df[col].astype(expected_dtype)
                 except Exception as e:
                     raise TypeError(f'Cannot cast column \'{col}\' to {expected_dtype}: {e}')
+            raise
 
+    method = None
+    if bulk:
+        method, chunksize = _bulk_method(engine=engine, n_cols=len(df.columns), chunksize=chunksize)
+
+    start_time = the_time_keeper()
     try:
-        df.to_sql(name=tbl, con=engine, index=False, if_exists=if_tbl_exists, dtype=dtype_override, chunksize=chunksize)
-        print(f'Successfully pushed data to {tbl}.') if verbose else None
+        with span('write', rows=len(df)):
+            df.to_sql(name=tbl, con=engine, schema=schema, index=False, if_exists=if_tbl_exists, dtype=dtype_override,
+                      chunksize=chunksize, method=method)
+        if if_tbl_exists == 'replace':
+            clear_schema_cache(engine=engine, tbl=tbl, schema=schema)
+        seconds = max(the_time_keeper(start_time, float_out=True), 0.01)
+        print(f'Successfully pushed {len(df)} rows to {tbl}; {len(df) / seconds:,.0f} rows/sec.') if verbose else None
 
     except Exception as e:
         print(f'Error during upload to SQL: {e}') if verbose else None
         raise
 
 
-def get_sql_col_types(engine, tbl, verbose=False):
+def chunks_to_db(engine, chunks, tbl, if_tbl_exists, retrieve_dtype_from_db=False, dtype_override=None,
+                 chunksize=10000, bulk=True, schema=None, verbose=False):
+    """
+    Pushes DataFrames to a SQL table as they are produced, e.g. from db_to_df() with chunksize or stream_event_delta(),
+    so the full result never has to be held in memory; see df_to_db() for parameters. if_tbl_exists applies to the
+    first chunk, and later chunks are appended.
+
+    Example usage is as follows:
+
+        results = stream_event_delta(chunks, add_event_delta_single, id_field='project_id', ...)
+        rows, rows_per_sec = chunks_to_db(engine=engine, chunks=results, tbl='event_log_with_time',
+                                          if_tbl_exists='replace')
+
+    :param engine:                  object, required    SQLAlchemy engine object used to connect to database
+    :param chunks:                  iterable, required  DataFrames to upload to SQL
+    :param tbl:                     str, required       name of table to push data to
+    :param if_tbl_exists:           str, required       'fail', 'replace', or 'append'; applies to first chunk only
+    :param retrieve_dtype_from_db:  bool, optional      if True, retrieves column data types from existing SQL table
+    :param dtype_override:          dict, optional      a dict to define column names and their SQL types
+    :param chunksize:               int, optional       rows to be inserted at a time during bulk insert operations
+    :param bulk:                    bool, optional      if True, uses COPY, multi-row INSERT or fast_executemany
+    :param schema:                  str, optional       database schema of table, if not the default
+    :param verbose:                 bool, optional      if True, print status to terminal
+    :return rows:                   int                 rows pushed
+            rows_per_sec:           float               rows pushed per second, including time to produce chunks
+    """
+
+    rows = 0
+    start_time = the_time_keeper()
+
+    for chunk in chunks:
+        df_to_db(engine=engine, df=chunk, tbl=tbl, if_tbl_exists=if_tbl_exists if not rows else 'append',
+                 retrieve_dtype_from_db=retrieve_dtype_from_db, dtype_override=dtype_override, chunksize=chunksize,
+                 bulk=bulk, schema=schema, verbose=verbose)
+        rows += len(chunk)
+
+    seconds = max(the_time_keeper(start_time, float_out=True), 0.01)
+    print(f'Pushed {rows} rows to {tbl} in {seconds} seconds; {rows / seconds:,.0f} rows/sec.') if verbose else None
+
+    return rows, rows / seconds
+
+
+def _bulk_method(engine, n_cols, chunksize):
+    """
+    Helper function to choose the DataFrame.to_sql() insertion method for bulk writes to the engine's dialect, and the
+    chunksize to use with it.
+
+    :param engine:              object, required        SQLAlchemy engine object used to connect to database
+    :param n_cols:              int, required           number of columns to be written
+    :param chunksize:           int, required           requested rows per chunk
+    :return method:             str or function         insertion method for DataFrame.to_sql()
+            chunksize:          int                     rows per chunk, within the dialect's bound parameter limit
+    """
+
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        return _copy_from_stdin, chunksize
+    if dialect == 'mssql':
+        if not sqlalchemy.event.contains(engine, 'before_cursor_execute', _set_fast_executemany):
+            sqlalchemy.event.listen(engine, 'before_cursor_execute', _set_fast_executemany)
+        return None, chunksize
+    if dialect in BULK_MAX_PARAMS and engine.dialect.paramstyle in ('qmark', 'format', 'pyformat'):
+        return _insert_multi_values, max(1, min(chunksize, BULK_MAX_PARAMS[dialect] // max(n_cols, 1)))
+    return None, chunksize
+
+
+def _copy_from_stdin(table, conn, keys, data_iter):
+    """
+    Helper function passed to DataFrame.to_sql() as method, loading each chunk into PostgreSQL with COPY FROM STDIN
+    from an in-memory CSV buffer; supports psycopg2 (copy_expert) and psycopg 3 (copy).
+
+    :param table:               object, required        pandas SQLTable being written to
+    :param conn:                object, required        SQLAlchemy connection
+    :param keys:                list, required          column names
+    :param data_iter:           iterable, required      rows of the chunk
+    :return:                    int                     rows written
+    """
+
+    buffer, n_rows = _copy_csv(data_iter)
+
+    quote = conn.dialect.identifier_preparer.quote
+    name = f'{quote(table.schema)}.{quote(table.name)}' if table.schema else quote(table.name)
+    copy_sql = f'COPY {name} ({", ".join(quote(key) for key in keys)}) FROM STDIN WITH (FORMAT csv)'
+
+    with conn.connection.cursor() as cursor:
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(sql=copy_sql, file=buffer)
+        else:
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+
+    return n_rows
+
+
+def _copy_csv(data_iter):
+    """
+    Helper function to write rows as CSV for COPY FROM STDIN. PostgreSQL reads an unquoted empty field as NULL, so
+    None is written as an unquoted empty field and every other value is quoted; empty strings stay empty strings.
+
+    :param data_iter:           iterable, required      rows of the chunk
+    :return buffer:             object                  in-memory CSV buffer, at its start
+            n_rows:             int                     rows written
+    """
+
+    buffer = io.StringIO()
+    n_rows = 0
+    for row in data_iter:
+        buffer.write(','.join('' if value is None else '"' + str(value).replace('"', '""') + '"' for value in row))
+        buffer.write('\n')
+        n_rows += 1
+    buffer.seek(0)
+
+    return buffer, n_rows
+
+
+def _insert_multi_values(table, conn, keys, data_iter):
+    """
+    Helper function passed to DataFrame.to_sql() as method, writing each chunk as a single multi-row INSERT ... VALUES
+    statement through the DBAPI cursor.
+
+    Unlike to_sql(method='multi'), the statement is built as text with one placeholder per value, so SQLAlchemy does
+    not compile an expression per value; values are still passed through the column types' bind processors, so they
+    are stored as with the default insertion method.
+
+    :param table:               object, required        pandas SQLTable being written to
+    :param conn:                object, required        SQLAlchemy connection
+    :param keys:                list, required          column names
+    :param data_iter:           iterable, required      rows of the chunk
+    :return:                    int                     rows written
+    """
+
+    processors = [table.table.c[key].type.dialect_impl(conn.dialect).bind_processor(conn.dialect) for key in keys]
+    values = []
+    n_rows = 0
+    for row in data_iter:
+        values.extend(value if process is None or value is None else process(value)
+                      for process, value in zip(processors, row))
+        n_rows += 1
+    if not n_rows:
+        return 0
+
+    quote = conn.dialect.identifier_preparer.quote
+    name = f'{quote(table.schema)}.{quote(table.name)}' if table.schema else quote(table.name)
+    marker = '?' if conn.dialect.paramstyle == 'qmark' else '%s'
+    row_sql = f'({", ".join([marker] * len(keys))})'
+    insert_sql = f'INSERT INTO {name} ({", ".join(quote(key) for key in keys)}) VALUES {", ".join([row_sql] * n_rows)}'
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(insert_sql, values)
+    finally:
+        cursor.close()
+
+    return n_rows
+
+
+def _set_fast_executemany(conn, cursor, statement, parameters, context, executemany):
+    """
+    Helper function listening for before_cursor_execute on MSSQL engines, so executemany() uses pyodbc's
+    fast_executemany even if the engine was not created with it.
+    """
+
+    if executemany and hasattr(cursor, 'fast_executemany'):
+        cursor.fast_executemany = True
+
+
+def get_sql_col_types(engine, tbl, verbose=False, schema=None, ttl=SCHEMA_CACHE_TTL):
     """
     Given a table, retrieve column types from the database.
 
+    Column types are read with SQLAlchemy's inspector, so any supported dialect works, and are returned as lowercase
+    type names without length or precision, e.g. 'varchar', 'timestamp without time zone', matching the keys of
+    DTYPE_MAPPING. Results are cached per database, schema and table for ttl seconds; call clear_schema_cache() if a
+    table is altered outside of df_to_db(). A table which does not exist returns an empty dict, and is not cached.
+
     :param engine:              object, required        SQLAlchemy engine object used to connect to database
     :param tbl:                 str, required           name of table to push data to
     :param verbose:             bool, optional          if True, print status to terminal
-    :return:
+    :param schema:              str, optional           database schema of table, if not the default
+    :param ttl:                 int, optional           seconds to reuse cached column types; 0 to always retrieve
+    :return:                    dict                    column names and type names
     """
 
-    # todo: this requires handling based on SQL dialect; below is postgres
-    existing_table_query = f'SELECT column_name, data_type FROM information_schema.columns WHERE table_name = \'{tbl}\''
-    print(existing_table_query) if verbose else None
+    return _schema_entry(engine=engine, tbl=tbl, schema=schema, ttl=ttl, verbose=verbose)['col_types']
 
-    with engine.connect() as conn:
-        existing_columns = pd.read_sql(existing_table_query, conn)
-        db_col_types = dict(zip(existing_columns['column_name'], existing_columns['data_type']))
 
-    print(f'Retrieved column types from {tbl}: {db_col_types}') if verbose else None
+def clear_schema_cache(engine=None, tbl=None, schema=None):
+    """
+    Clears column types and cast plans cached by get_sql_col_types() and df_to_db(): for one table if engine and tbl
+    are given, for every table of the engine's database if only engine is given, or entirely if neither is given.
+
+    :param engine:              object, optional        SQLAlchemy engine object used to connect to database
+    :param tbl:                 str, optional           name of table
+    :param schema:              str, optional           database schema of table, if not the default
+    :return:                    None
+    """
+
+    if engine is None:
+        _schema_cache.clear()
+        return
+
+    url = _cache_url(engine)
+    for key in [key for key in _schema_cache if key[0] == url and (tbl is None or key[1:] == (schema, tbl))]:
+        del _schema_cache[key]
+
+
+def _cache_url(engine):
+    """
+    Helper function to identify an engine's database in the schema cache, without its password.
+
+    :param engine:              object, required        SQLAlchemy engine object used to connect to database
+    :return:                    str                     database URL
+    """
+
+    return engine.url.render_as_string(hide_password=True)
+
+
+def _schema_entry(engine, tbl, schema=None, ttl=SCHEMA_CACHE_TTL, verbose=False):
+    """
+    Helper function to return the schema cache entry for a table, retrieving column types if not cached or expired.
+
+    :param engine:              object, required        SQLAlchemy engine object used to connect to database
+    :param tbl:                 str, required           name of table
+    :param schema:              str, optional           database schema of table, if not the default
+    :param ttl:                 int, optional           seconds to reuse cached column types; 0 to always retrieve
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    dict                    'retrieved' time, 'col_types' and 'cast_plans'
+    """
+
+    key = (_cache_url(engine), schema, tbl)
+    entry = _schema_cache.get(key)
+    if entry is not None and ttl and time.monotonic() - entry['retrieved'] < ttl:
+        return entry
+
+    try:
+        columns = sqlalchemy.inspect(engine).get_columns(tbl, schema=schema)
+    except sqlalchemy.exc.NoSuchTableError:
+        print(f'Table {tbl} does not exist; no column types retrieved.') if verbose else None
+        return {'retrieved': time.monotonic(), 'col_types': {}, 'cast_plans': {}}
+
+    entry = {
+        'retrieved': time.monotonic(),
+        'col_types': {col['name']: _type_name(col['type'], engine.dialect) for col in columns},
+        'cast_plans': {},
+    }
+    _schema_cache[key] = entry
+    print(f'Retrieved column types from {tbl}: {entry["col_types"]}') if verbose else None
+
+    return entry
+
+
+def _type_name(col_type, dialect):
+    """
+    Helper function to normalise a SQLAlchemy column type to a lowercase type name without length, precision or
+    collation, e.g. VARCHAR(50) COLLATE "C" to 'varchar', for lookup in DTYPE_MAPPING.
+
+    :param col_type:            object, required        SQLAlchemy type, as returned by the inspector
+    :param dialect:             object, required        SQLAlchemy dialect of the engine
+    :return:                    str                     type name
+    """
+
+    try:
+        name = col_type.compile(dialect=dialect)
+    except Exception:
+        name = getattr(col_type, '__visit_name__', str(col_type))
+
+    name = re.sub(r'\(.*?\)', '', name.lower())
+    name = re.sub(r'\s+collate\s+.*$', '', name)
+    return ' '.join(name.split())
+
+
+def _cast_plan(engine, tbl, df, schema=None, verbose=False):
+    """
+    Helper function to work out which DataFrame columns must be cast to match a SQL table's column types, and to what
+    dtype. Plans are cached with the table's column types, keyed by the DataFrame's columns and dtypes, so repeated
+    writes of the same shape reuse them.
+
+    :param engine:              object, required        SQLAlchemy engine object used to connect to database
+    :param tbl:                 str, required           name of table
+    :param df:                  df, required            pandas DataFrame to upload to SQL
+    :param schema:              str, optional           database schema of table, if not the default
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    dict                    column names and pandas dtypes to cast to
+    """
+
+    entry = _schema_entry(engine=engine, tbl=tbl, schema=schema, verbose=verbose)
+    signature = tuple((col, str(dtype)) for col, dtype in df.dtypes.items())
+    if signature in entry['cast_plans']:
+        return entry['cast_plans'][signature]
+
+    plan = {}
+    for col, dtype in signature:
+        expected_dtype = DTYPE_MAPPING.get(entry['col_types'].get(col, ''))
+        if expected_dtype and dtype != expected_dtype:
+            plan[col] = expected_dtype
 
-    return db_col_types
+    entry['cast_plans'][signature] = plan
+    return plan
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+
+# events, and the descriptions of 'Status' events, as in chronumbo/test/project-event-log.csv
+SYNTHETIC_EVENTS = ('Correspondence', 'Status', 'Assigned')
+SYNTHETIC_EVENT_WEIGHTS = (0.5, 0.35, 0.15)
+SYNTHETIC_STATUSES = ('In Progress', 'Pending Order', 'On Hold', 'Ordered', 'Cancelled')
+
+
+def generate_event_log(n_rows, events_per_project=8, start_match_rate=0.9, end_match_rate=0.8, n_aliases=200,
+                       employee_rate=0.75, start_date='2023-01-01', mean_gap_hours=24.0, categorical=False, seed=0):
+    """
+    Generates a synthetic event log shaped like chronumbo/test/project-event-log.csv, for benchmarks and tests, with
+    columns project_id, event_date, event, description, alias and is_employee. Rows are ordered by project_id, then
+    event_date, as from a query with ORDER BY.
+
+    Each project has a random number of events, averaging events_per_project. Its first event is 'Status' 'Created'
+    with probability start_match_rate, and its last event is 'Status' 'Resolved' with probability end_match_rate; no
+    other events are 'Created' or 'Resolved', so with these as start and end conditions, the share of projects with a
+    start and an end is controlled exactly:
+
+        start_conditions={'event': 'Status', 'description': 'Created'}
+        end_conditions={'event': 'Status', 'description': 'Resolved'}
+
+    Other events are 'Correspondence' ('Updated'), 'Status' (e.g. 'On Hold') or 'Assigned' (to an alias), and
+    is_employee is True for employee_rate of events, for paired metrics on correspondence. The same seed always
+    produces the same event log.
+
+    :param n_rows:              int, required       number of rows to generate
+    :param events_per_project:  float, optional     mean number of events per project
+    :param start_match_rate:    float, optional     share of projects beginning with 'Created'
+    :param end_match_rate:      float, optional     share of projects ending with 'Resolved'
+    :param n_aliases:           int, optional       number of distinct aliases
+    :param employee_rate:       float, optional     share of events by employees
+    :param start_date:          str, optional       earliest project start date
+    :param mean_gap_hours:      float, optional     mean time between events of a project, in hours
+    :param categorical:         bool, optional      if True, string columns are categorical rather than str
+    :param seed:                int, optional       random seed
+    :return:                    df                  synthetic event log
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # project sizes: 1 + Poisson, until n_rows is reached; the last project is cut short
+    n_projects = max(1, int(np.ceil(n_rows / max(events_per_project, 1)) * 1.1) + 1)
+    sizes = 1 + rng.poisson(max(events_per_project - 1, 0), n_projects)
+    while sizes.sum() < n_rows:
+        sizes = np.concatenate([sizes, 1 + rng.poisson(max(events_per_project - 1, 0), n_projects)])
+    ends = np.cumsum(sizes)
+    n_projects = int(np.searchsorted(ends, n_rows) + 1)
+    sizes = sizes[:n_projects]
+    sizes[-1] -= ends[n_projects - 1] - n_rows
+
+    project = np.repeat(np.arange(n_projects), sizes)
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    is_first = np.zeros(n_rows, dtype=bool)
+    is_first[offsets] = True
+    is_last = np.zeros(n_rows, dtype=bool)
+    is_last[offsets + sizes - 1] = True
+
+    # event dates: each project starts within a year, with exponential gaps between events
+    project_start = rng.integers(0, 365 * 24 * 3600, n_projects)
+    gaps = rng.exponential(mean_gap_hours * 3600, n_rows).astype(np.int64)
+    gaps[is_first] = 0
+    elapsed = np.cumsum(gaps)
+    elapsed -= np.repeat(elapsed[offsets], sizes)
+    seconds = np.repeat(project_start, sizes) + elapsed
+    event_date = pd.Timestamp(start_date) + pd.to_timedelta(seconds, unit='s')
+
+    # events and descriptions; codes index into the categories below
+    events = list(SYNTHETIC_EVENTS)
+    aliases = [f'user{i:04d}' for i in range(n_aliases)]
+    descriptions = ['Updated', 'Created', 'Resolved'] + list(SYNTHETIC_STATUSES) + aliases
+
+    event = rng.choice(len(events), n_rows, p=SYNTHETIC_EVENT_WEIGHTS)
+    alias = rng.integers(0, n_aliases, n_rows)
+    description = np.select(
+        [event == 0, event == 1],
+        [0, 3 + rng.integers(0, len(SYNTHETIC_STATUSES), n_rows)],
+        default=3 + len(SYNTHETIC_STATUSES) + alias
+    )
+
+    ends_resolved = is_last & (rng.random(n_rows) < end_match_rate)
+    event[ends_resolved] = 1
+    description[ends_resolved] = 2
+    starts_created = is_first & (rng.random(n_rows) < start_match_rate)
+    event[starts_created] = 1
+    description[starts_created] = 1
+
+    df = pd.DataFrame({
+        'project_id': 100000 + project,
+        'event_date': event_date,
+        'event': pd.Categorical.from_codes(event, categories=events),
+        'description': pd.Categorical.from_codes(description, categories=descriptions),
+        'alias': pd.Categorical.from_codes(alias, categories=aliases),
+        'is_employee': rng.random(n_rows) < employee_rate,
+    })
+
+    if not categorical:
+        df = df.astype({'event': str, 'description': str, 'alias': str})
+
+    return df
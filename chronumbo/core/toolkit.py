@@ -1,4 +1,10 @@
+import functools
+import json
+import threading
 import time
+import tracemalloc
+
+import pandas as pd
 
 
 def the_time_keeper(t=0.0, float_out=False):
@@ -37,3 +43,243 @@ def the_time_keeper(t=0.0, float_out=False):
             else:
                 tk = 'Duration: ' + str(round(tk / 60 / 60, 2)) + ' hours.'
             return tk
+
+
+class Profiler:
+    """
+    Records named spans of work (e.g. read, sort, mask-build, pairing, write, aggregate) while active, to see where a
+    slow run spends its time. The delta functions, PreparedEventLog, SQL helpers, DeltaSummary and rolling_summary()
+    record spans of their own stages; span() and timed() record spans around any other code.
+
+    Example usage is as follows:
+
+        profiler = Profiler()
+
+        with profiler:                                  # spans are recorded only while a profiler is active
+            df = db_to_df(query=audit_query, engine=engine)
+            with span('custom-step', rows=len(df)):
+                ...
+
+        profiler.to_frame()                             # one row per span
+        profiler.to_json('profile.json')                # spans as JSON
+        profiler.to_prometheus('profile.prom')          # totals per span name, in Prometheus text format
+
+    Each span records wall time, CPU time of the process (including other threads), rows processed where known, and
+    its path of enclosing spans, e.g. 'add_event_delta_single/mask-build'. If trace_memory is True, tracemalloc is
+    started while the profiler is active and each span also records the change in traced memory, at some cost in
+    speed; otherwise memory is not recorded.
+
+    :param trace_memory:        bool, optional          if True, records memory delta of each span with tracemalloc
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.spans = []
+        self._lock = threading.Lock()
+        self._previous = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        global _active_profiler
+        self._previous = _active_profiler
+        _active_profiler = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active_profiler
+        _active_profiler = self._previous
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    def record(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def to_frame(self):
+        """
+        :return:                df                      one row per span, in order of completion
+        """
+
+        return pd.DataFrame(self.spans, columns=SPAN_FIELDS)
+
+    def summary(self):
+        """
+        :return:                df                      count, wall and CPU time, rows and rows/sec per span path
+        """
+
+        spans = self.to_frame()
+        summary = spans.groupby('path', sort=False).agg(
+            count=('name', 'size'), wall_sec=('wall_sec', 'sum'), cpu_sec=('cpu_sec', 'sum'),
+            rows=('rows', 'sum'), mem_delta_mb=('mem_delta_mb', 'sum')
+        )
+        summary['rows_per_sec'] = summary['rows'] / summary['wall_sec'].where(summary['wall_sec'] > 0)
+        return summary.reset_index()
+
+    def to_json(self, path=None):
+        """
+        :param path:            str, optional           file to write to; if None, JSON is returned as str
+        :return:                str or None             spans as a JSON list
+        """
+
+        text = json.dumps(self.spans, indent=2, default=str)
+        if path is None:
+            return text
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def to_prometheus(self, path=None, prefix='chronumbo'):
+        """
+        Formats totals per span path in Prometheus text exposition format, e.g. for the node exporter's textfile
+        collector; counters are wall seconds, CPU seconds, rows and span count, labelled by span name and path.
+
+        :param path:            str, optional           file to write to; if None, text is returned as str
+        :param prefix:          str, optional           metric name prefix
+        :return:                str or None             metrics as Prometheus text
+        """
+
+        totals = {}
+        for record in self.spans:
+            total = totals.setdefault((record['name'], record['path']),
+                                      {'wall_sec': 0.0, 'cpu_sec': 0.0, 'rows': 0, 'count': 0})
+            total['wall_sec'] += record['wall_sec']
+            total['cpu_sec'] += record['cpu_sec']
+            total['rows'] += record['rows'] or 0
+            total['count'] += 1
+
+        lines = []
+        for field, metric, description in (('wall_sec', 'span_wall_seconds_total', 'Wall time spent in span'),
+                                           ('cpu_sec', 'span_cpu_seconds_total', 'Process CPU time spent in span'),
+                                           ('rows', 'span_rows_total', 'Rows processed in span'),
+                                           ('count', 'span_count_total', 'Times span was run')):
+            lines += [f'# HELP {prefix}_{metric} {description}', f'# TYPE {prefix}_{metric} counter']
+            for (name, span_path), total in totals.items():
+                labels = f'span="{_label(name)}",path="{_label(span_path)}"'
+                lines.append(f'{prefix}_{metric}{{{labels}}} {total[field]}')
+
+        text = '\n'.join(lines) + '\n'
+        if path is None:
+            return text
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+class _Span:
+    """
+    A span being recorded by span(); rows can be set or added to once known, e.g. after a read.
+    """
+
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+
+    def add_rows(self, rows):
+        self.rows = (self.rows or 0) + rows
+
+    def __enter__(self):
+        stack = _span_stack()
+        stack.append(self.name)
+        self.path = '/'.join(stack)
+        self.mem_start = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.started_at = time.time()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        mem_delta = None
+        if self.mem_start is not None and tracemalloc.is_tracing():
+            mem_delta = (tracemalloc.get_traced_memory()[0] - self.mem_start) / 1e6
+        _span_stack().pop()
+
+        self.profiler.record({
+            'name': self.name,
+            'path': self.path,
+            'started_at': self.started_at,
+            'wall_sec': wall,
+            'cpu_sec': cpu,
+            'rows': self.rows,
+            'mem_delta_mb': mem_delta,
+            'error': exc_type.__name__ if exc_type else None,
+        })
+        return False
+
+
+class _NoSpan:
+    """
+    Stand-in returned by span() when no profiler is active, so instrumented code costs next to nothing.
+    """
+
+    rows = None
+
+    def add_rows(self, rows):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+SPAN_FIELDS = ['name', 'path', 'started_at', 'wall_sec', 'cpu_sec', 'rows', 'mem_delta_mb', 'error']
+
+_active_profiler = None
+_no_span = _NoSpan()
+_local = threading.local()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _span_stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def span(name, rows=None):
+    """
+    Context manager recording a named span to the active Profiler, if any; see Profiler.
+
+        with span('sort', rows=len(df)) as s:
+            df = df.sort_values(...)
+
+    :param name:                str, required           name of span, e.g. 'read'
+    :param rows:                int, optional           rows processed; can also be set later with s.add_rows()
+    :return:                    object                  span, with add_rows()
+    """
+
+    if _active_profiler is None:
+        return _no_span
+    return _Span(_active_profiler, name, rows)
+
+
+def timed(name=None):
+    """
+    Decorator recording each call of a function as a span, named after the function unless name is given.
+
+        @timed('load-projects')
+        def load_projects(engine):
+            ...
+
+    :param name:                str, optional           name of span
+    :return:                    function                decorator
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
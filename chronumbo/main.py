@@ -1,3 +1,40 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+
+from chronumbo.core.backends import (
+    frame_backend,
+    polars_event_delta_paired,
+    polars_event_delta_single
+)
+
+from chronumbo.core.conditions import (
+    compile_conditions,
+    evaluate_conditions,
+    is_plain_conditions
+)
+
+from chronumbo.core.event_log import (
+    PreparedEventLog,
+    iter_complete_groups
+)
+
+from chronumbo.core.files import (
+    metric_columns
+)
+
+from chronumbo.core.toolkit import (
+    span
+)
+
+
+# policies add_event_delta_paired() can pair start and end rows by; see _pair_positions() and _pair_positions_asof()
+PAIRING_STRATEGIES = ('first_start', 'each_start', 'latest_start')
+
+
 def _check_conditions(row, conditions):
     """
     Helper function to check if all specified conditions are met for a given row.
@@ -15,12 +52,16 @@ def _check_conditions(row, conditions):
         conditions = {'event': 'Correspondence', 'description': 'Updated'}
         _check_conditions(row, conditions)                                      # conditions not met, returns False
 
+    Conditions using operators (see compile_conditions()) are evaluated against the row as a one-row DataFrame.
+
     :param row:                 series, required        pandas Series, each element corresponding to field in DataFrame
-    :param conditions:          dict, required          dict of column names and expected values
+    :param conditions:          dict, required          dict of column names and expected values or operator dicts
     :return:                    bool                    True if all conditions are met; else False
     """
 
-    return all(row[field] == value for field, value in conditions.items())
+    if is_plain_conditions(conditions):
+        return all(row[field] == value for field, value in conditions.items())
+    return bool(evaluate_conditions(compile_conditions(conditions), row.to_frame().T.infer_objects())[0])
 
 
 def _update_start(df, idx, row, start_col, start_flag, date_field, start_at_earliest, start_time):
@@ -135,10 +176,593 @@ def _handle_no_end(df, group, date_field, end_col, end_na_flag, use_latest_if_no
     return None, None
 
 
+def _prepare_event_log(df, id_field, date_field):
+    """
+    Helper function to accept either a DataFrame or a PreparedEventLog in the delta functions. DataFrames are wrapped
+    without sorting or copying, so rows are grouped exactly as df.groupby() would.
+
+    :param df:                  df or object, required  DataFrame or PreparedEventLog containing event data
+    :param id_field:            str, required           column name used to group data
+    :param date_field:          str, required           column containing event date or timestamp
+    :return:                    object                  PreparedEventLog
+    """
+
+    if isinstance(df, PreparedEventLog):
+        if (df.id_field, df.date_field) != (id_field, date_field):
+            raise ValueError(f'PreparedEventLog was prepared on {df.id_field}, {df.date_field}; '
+                             f'cannot be used with {id_field}, {date_field}')
+        return df
+    return PreparedEventLog(df, id_field, date_field, sort=False)
+
+
+def _object_column(df, values):
+    """
+    Helper function to wrap an array as an object column aligned to df, matching the columns created by the per-row
+    implementation (which initialises new columns with None).
+
+    :param df:                  df, required            DataFrame the column will be added to
+    :param values:              ndarray, required       object array of column values
+    :return:                    series                  object dtype series with the index of df
+    """
+
+    return pd.Series(values, index=df.index, dtype=object)
+
+
+def _flag_column(df, codes, flags, typed_output):
+    """
+    Helper function to build a flag column from integer codes, where code i is flags[i] and -1 is no flag.
+
+    With typed_output, the column is categorical with flags as its fixed categories, so it is stored as int8 codes and
+    chunks or partitions of the same metric concatenate without widening to object; otherwise it is an object column
+    of flag strings and None, as created by the per-row implementation.
+
+    :param df:                  df, required            DataFrame the column will be added to
+    :param codes:               ndarray, required       integer code per row; -1 for no flag
+    :param flags:               tuple, required         flag labels, indexed by code
+    :param typed_output:        bool, required          if True, returns categorical; else object
+    :return:                    series                  flag column with the index of df
+    """
+
+    if typed_output:
+        categories = list(dict.fromkeys(flags))
+        lookup = np.array([categories.index(flag) for flag in flags] + [-1], dtype=np.int8)
+        return pd.Series(pd.Categorical.from_codes(lookup[codes], categories=categories), index=df.index)
+
+    return _object_column(df, np.array(list(flags) + [None], dtype=object)[codes])
+
+
+def _delta_column(df, positions, deltas, typed_output):
+    """
+    Helper function to build a time delta column, with values only at the given positions.
+
+    With typed_output, the column is native timedelta64, NaT elsewhere; otherwise it is an object column of
+    str(delta), None elsewhere, as created by the per-row implementation.
+
+    :param df:                  df, required            DataFrame the column will be added to
+    :param positions:           ndarray, required       row positions to write deltas at
+    :param deltas:              series, required        timedelta64 series, aligned to positions
+    :param typed_output:        bool, required          if True, returns timedelta64; else object
+    :return:                    series                  time delta column with the index of df
+    """
+
+    if typed_output:
+        values = np.full(len(df), np.timedelta64('NaT'), dtype=deltas.dtype)
+        values[positions] = deltas.to_numpy()
+        return pd.Series(values, index=df.index)
+
+    values = np.full(len(df), None, dtype=object)
+    values[positions] = [str(delta) for delta in deltas]
+    return _object_column(df, values)
+
+
+def _delta_sec_column(df, positions, deltas, typed_output):
+    """
+    Helper function to build a delta seconds column, with values only at the given positions.
+
+    With typed_output, the column is float64, NaN elsewhere; otherwise it is an object column of floats, None
+    elsewhere, as created by the per-row implementation.
+
+    :param df:                  df, required            DataFrame the column will be added to
+    :param positions:           ndarray, required       row positions to write seconds at
+    :param deltas:              series, required        timedelta64 series, aligned to positions
+    :param typed_output:        bool, required          if True, returns float64; else object
+    :return:                    series                  delta seconds column with the index of df
+    """
+
+    return _seconds_column(df, positions, _total_seconds(deltas), typed_output)
+
+
+def _seconds_column(df, positions, seconds, typed_output):
+    """
+    Helper function to build a column of seconds, e.g. delta_sec or delta_business_sec, with values only at the given
+    positions; float64 with NaN elsewhere if typed_output, else an object column of floats with None elsewhere.
+
+    :param df:                  df, required            DataFrame the column will be added to
+    :param positions:           ndarray, required       row positions to write seconds at
+    :param seconds:             ndarray, required       float seconds, aligned to positions
+    :param typed_output:        bool, required          if True, returns float64; else object
+    :return:                    series                  seconds column with the index of df
+    """
+
+    seconds = np.asarray(seconds, dtype=float)
+    if typed_output:
+        values = np.full(len(df), np.nan)
+        values[positions] = seconds
+        return pd.Series(values, index=df.index)
+
+    values = np.full(len(df), None, dtype=object)
+    values[positions] = seconds.tolist()
+    return _object_column(df, values)
+
+
+def _interval_frame(log, groups, start_pos, end_pos, business_calendar=None):
+    """
+    Helper function to build the compact result of output='intervals': one row per measured interval, rather than
+    columns on every row of the event log.
+
+    :param log:                 object, required        PreparedEventLog
+    :param groups:              ndarray, required       group code per interval
+    :param start_pos:           ndarray, required       position of start row per interval
+    :param end_pos:             ndarray, required       position of end row per interval
+    :param business_calendar:   object, optional        BusinessCalendar; if given, delta_business_sec is added
+    :return:                    df                      id_field, start_ts, end_ts, start_row, end_row and delta_sec
+    """
+
+    labels = log.df.index
+    intervals = pd.DataFrame({
+        log.id_field: log.ids[groups],
+        'start_ts': log.dates.iloc[start_pos].reset_index(drop=True),
+        'end_ts': log.dates.iloc[end_pos].reset_index(drop=True),
+        'start_row': labels[start_pos],
+        'end_row': labels[end_pos],
+    })
+    intervals['delta_sec'] = _total_seconds(intervals['end_ts'] - intervals['start_ts'])
+    if business_calendar is not None:
+        intervals['delta_business_sec'] = business_calendar.seconds(intervals['start_ts'], intervals['end_ts'])
+    return intervals
+
+
+def format_delta(deltas):
+    """
+    Formats time deltas as strings, e.g. '14 days 02:54:27', as written to the delta column of add_event_delta_single()
+    when typed_output is False; for use with typed output, where only the native timedelta64 column is created.
+
+    :param deltas:              series, required        timedelta64 series, e.g. df['project_res_time_delta']
+    :return:                    series                  object series of strings, or None where delta is missing
+    """
+
+    return pd.Series([None if pd.isna(delta) else str(delta) for delta in deltas], index=deltas.index, dtype=object)
+
+
+def _time_deltas(dates, start_pos, end_pos):
+    """
+    Helper function to subtract event dates at two sets of row positions.
+
+    :param dates:               series, required        event dates, indexed by position
+    :param start_pos:           ndarray, required       positions of start rows
+    :param end_pos:             ndarray, required       positions of end rows, aligned to start_pos
+    :return:                    series                  time delta per start, end pair
+    """
+
+    return dates.iloc[end_pos].reset_index(drop=True) - dates.iloc[start_pos].reset_index(drop=True)
+
+
+def _total_seconds(deltas):
+    """
+    Helper function to convert a series of time deltas to seconds, as Timedelta.total_seconds() does for each value.
+
+    Timedelta.total_seconds() adds whole seconds to the microsecond remainder rather than dividing once, so the same
+    steps are taken here over whole arrays to return bit-identical floats. Missing deltas are returned as NaN.
+
+    :param deltas:              series, required        timedelta64 series
+    :return:                    ndarray                 float seconds per delta
+    """
+
+    nanoseconds = deltas.astype('timedelta64[ns]').to_numpy().view('int64')
+    microseconds = nanoseconds // 1000
+    seconds = microseconds // 10 ** 6
+    total = seconds.astype('float64') + (microseconds - seconds * 10 ** 6) / 1e6
+    total[deltas.isna().to_numpy()] = np.nan
+    return total
+
+
+def _pair_positions(codes, start_mask, end_mask, contiguous=False):
+    """
+    Helper function to pair start and end rows within each group, without walking rows one by one.
+
+    Within a group, a start row opens a pair only if no pair is open, and an end row closes a pair only if one is
+    open. Looking only at rows matching start or end conditions, in group order:
+
+        - a row matching only the start conditions always leaves a pair open
+        - a row matching only the end conditions always leaves no pair open
+        - a row matching both opens a pair if none is open, or closes the open one; i.e. it toggles
+
+    The state before each row is therefore the state left by the nearest preceding start-only or end-only row,
+    toggled once per preceding row matching both since then; this is computed with cumulative sums over runs. As
+    accepted rows alternate start, end, start, end within a group, each accepted end closes the accepted start
+    immediately before it.
+
+    :param codes:               ndarray, required       group code per row, as returned by pd.factorize(); -1 if null
+    :param start_mask:          ndarray, required       boolean array of rows matching start conditions
+    :param end_mask:            ndarray, required       boolean array of rows matching end conditions
+    :param contiguous:          bool, optional          if True, rows are already grouped; skips ordering by group
+    :return starts:             ndarray                 positions of every accepted start row
+            pair_starts:        ndarray                 positions of start rows closed by an end row
+            pair_ends:          ndarray                 positions of end rows, aligned to pair_starts
+    """
+
+    positions = np.flatnonzero((start_mask | end_mask) & (codes >= 0))
+    if not contiguous:
+        positions = positions[np.argsort(codes[positions], kind='stable')]
+
+    group = codes[positions]
+    is_start = start_mask[positions]
+    is_both = is_start & end_mask[positions]
+    is_pure = ~is_both
+
+    new_group = np.ones(len(positions), dtype=bool)
+    new_group[1:] = group[1:] != group[:-1]
+
+    # each run begins at a start-only or end-only row, or at the first row of a group, followed by rows matching both
+    run = np.cumsum(is_pure | new_group) - 1
+    run_head = np.flatnonzero(is_pure | new_group)
+    run_base = is_pure[run_head] & is_start[run_head]             # open after the head row; closed at a group start
+    both_seen = np.cumsum(is_both)
+    both_before_run = both_seen[run_head] - is_both[run_head]
+    toggles = both_seen - both_before_run[run] - 1                # rows matching both before this one in its run
+
+    open_before = np.where(is_both, run_base[run] ^ (toggles % 2 == 1), False)
+    open_after = np.where(is_both, ~open_before, is_start)
+    open_before[1:] = np.where(is_pure[1:], open_after[:-1], open_before[1:])
+    open_before[new_group & is_pure] = False
+
+    accepted_start = is_start & ~open_before
+    accepted_end = end_mask[positions] & open_before
+    accepted = accepted_start | accepted_end
+
+    accepted_pos = positions[accepted]
+    closes = accepted_end[accepted]
+    starts = positions[accepted_start]
+    pair_ends = accepted_pos[closes]
+    pair_starts = accepted_pos[np.flatnonzero(closes) - 1]
+
+    return starts, pair_starts, pair_ends
+
+
+def _pair_positions_asof(codes, start_mask, end_mask, pairing, contiguous=False):
+    """
+    Helper function to pair start and end rows within each group as an as-of join, for pairings other than
+    'first_start'; rows need not alternate, so pairs may share a start or end row:
+
+        - 'each_start' pairs every start row with the next end row after it; several starts may share an end
+        - 'latest_start' pairs every end row with the latest start row before it; several ends may share a start
+
+    Rows matching start or end conditions are ordered by group, then row, as in _pair_positions(). In that order,
+    each start (or end) is matched to the first end after it (or the last start before it) with one
+    numpy.searchsorted() over the ordered ends (or starts), and kept if the match is in the same group; this is
+    O(n log n), with no per-group loop. A row matching both conditions is never paired with itself.
+
+    :param codes:               ndarray, required       group code per row, as returned by pd.factorize(); -1 if null
+    :param start_mask:          ndarray, required       boolean array of rows matching start conditions
+    :param end_mask:            ndarray, required       boolean array of rows matching end conditions
+    :param pairing:             str, required           'each_start' or 'latest_start'
+    :param contiguous:          bool, optional          if True, rows are already grouped; skips ordering by group
+    :return starts:             ndarray                 positions of start rows in a pair, once each
+            pair_starts:        ndarray                 positions of start rows per pair
+            pair_ends:          ndarray                 positions of end rows, aligned to pair_starts
+    """
+
+    positions = np.flatnonzero((start_mask | end_mask) & (codes >= 0))
+    if not contiguous:
+        positions = positions[np.argsort(codes[positions], kind='stable')]
+
+    # ranks in group, row order; ranks of starts and of ends are each sorted, so can be searched
+    group = codes[positions]
+    start_rank = np.flatnonzero(start_mask[positions])
+    end_rank = np.flatnonzero(end_mask[positions])
+
+    if pairing == 'each_start':
+        match = np.searchsorted(end_rank, start_rank, side='right')
+        found = match < len(end_rank)
+        start_rank, end_rank = start_rank[found], end_rank[match[found]]
+    else:
+        match = np.searchsorted(start_rank, end_rank, side='left') - 1
+        found = match >= 0
+        start_rank, end_rank = start_rank[match[found]], end_rank[found]
+
+    same_group = group[start_rank] == group[end_rank]
+    pair_starts = positions[start_rank[same_group]]
+    pair_ends = positions[end_rank[same_group]]
+
+    return np.unique(pair_starts), pair_starts, pair_ends
+
+
+def _partition_positions(log, n_parts):
+    """
+    Helper function to split the rows of an event log into partitions on id_field, keeping each group whole.
+
+    If the log is contiguous (sorted), it is range-partitioned at group boundaries into blocks of roughly equal row
+    counts; otherwise groups are hash-partitioned on their group code. Rows with a null id_field are left out, as
+    groupby drops them.
+
+    :param log:                 object, required        PreparedEventLog
+    :param n_parts:             int, required           number of partitions
+    :return:                    list                    arrays of row positions, one per non-empty partition
+    """
+
+    if log.is_contiguous:
+        offsets = log.offsets
+        targets = np.linspace(0, offsets[-1], n_parts + 1)[1:-1]
+        cuts = offsets[np.searchsorted(offsets, targets)]
+        bounds = np.unique(np.concatenate([[0], cuts, [offsets[-1]]]))
+        return [np.arange(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+    valid = np.flatnonzero(log.codes >= 0)
+    part = log.codes[valid] % n_parts
+    return [valid[part == i] for i in range(n_parts) if (part == i).any()]
+
+
+def _run_partition(delta_func, df, kwargs):
+    """
+    Helper function run in each worker process by _run_partitioned(); returns only the columns added by delta_func,
+    so that as little as possible is sent back to the parent process.
+
+    :param delta_func:          function, required      add_event_delta_single or add_event_delta_paired
+    :param df:                  df, required            partition of event log
+    :param kwargs:              dict, required          parameters passed to delta_func
+    :return:                    df                      columns added by delta_func
+    """
+
+    input_cols = set(df.columns)
+    result = delta_func(df=df, **kwargs)
+    if kwargs.get('output') == 'intervals':
+        return result
+    return result[[col for col in result.columns if col not in input_cols]]
+
+
+def _check_polars_options(method, n_jobs, cache, business_calendar):
+    """
+    Helper function to reject options the Polars backend does not support, for Polars and pyarrow frames.
+
+    :param method:              str, required       method requested
+    :param n_jobs:              int, required       worker processes requested
+    :param cache:               object, required    ResultCache requested, or None
+    :param business_calendar:   object, required    BusinessCalendar requested, or None
+    :return:                    None
+    """
+
+    if method != 'vectorized' or n_jobs != 1 or cache is not None or business_calendar is not None:
+        raise ValueError('method, n_jobs, cache and business_calendar are only supported for pandas DataFrames; '
+                         'Polars and pyarrow frames run vectorized, on all cores, on the Polars engine')
+
+
+def _run_partitioned(delta_func, log, fields, n_jobs, executor, kwargs):
+    """
+    Helper function to run a delta function over partitions of an event log in worker processes, and merge the
+    resulting columns back into the event log in its original row order.
+
+    Each group's calculation is independent of every other group, so the log is partitioned on id_field (see
+    _partition_positions()). To keep serialisation to and from workers low, each worker is sent only the columns the
+    metric needs (id_field, date_field and condition columns), and sends back only the columns it adds.
+
+    :param delta_func:          function, required      add_event_delta_single or add_event_delta_paired
+    :param log:                 object, required        PreparedEventLog
+    :param fields:              list, required          columns used by the metric
+    :param n_jobs:              int, required           number of worker processes; -1 for one per CPU
+    :param executor:            object, required        concurrent.futures executor to use, or None to create one
+    :param kwargs:              dict, required          parameters passed to delta_func
+    :return:                    df                      event log with new columns
+    """
+
+    n_jobs = n_jobs if n_jobs > 0 else os.cpu_count() + 1 + n_jobs
+    partitions = _partition_positions(log, n_jobs)
+    if len(partitions) <= 1:
+        return delta_func(df=log, **kwargs)
+
+    columns = list(dict.fromkeys(fields))
+    frames = [log.df[columns].iloc[positions].reset_index(drop=True) for positions in partitions]
+
+    pool = executor or ProcessPoolExecutor(max_workers=n_jobs)
+    try:
+        results = list(pool.map(_run_partition, [delta_func] * len(frames), frames, [kwargs] * len(frames)))
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    if kwargs.get('output') == 'intervals':
+        return _merge_partitioned_intervals(log, partitions, results)
+
+    df = log.df
+    for col in results[0].columns:
+        if results[0][col].dtype == object:
+            values = np.full(len(df), None, dtype=object)
+            for positions, result in zip(partitions, results):
+                values[positions] = result[col].to_numpy(dtype=object)
+            df[col] = _object_column(df, values)
+        else:
+            # typed columns keep their dtype; rows left out of every partition are filled with NaN, NaT or no category
+            merged = pd.concat([result[col].set_axis(positions) for positions, result in zip(partitions, results)])
+            df[col] = merged.reindex(range(len(df))).set_axis(df.index)
+
+    return df
+
+
+def _merge_partitioned_intervals(log, partitions, results):
+    """
+    Helper function to merge interval tables from _run_partitioned() workers, mapping start_row and end_row from row
+    positions within each partition back to index labels of the event log, and ordering intervals by group as a
+    single run would.
+
+    :param log:                 object, required        PreparedEventLog
+    :param partitions:          list, required          arrays of row positions, one per partition
+    :param results:             list, required          interval tables, one per partition
+    :return:                    df                      merged interval table
+    """
+
+    labels = log.df.index
+    for positions, result in zip(partitions, results):
+        result['start_row'] = labels[positions[result['start_row'].to_numpy(dtype=np.int64)]]
+        result['end_row'] = labels[positions[result['end_row'].to_numpy(dtype=np.int64)]]
+
+    intervals = pd.concat(results, ignore_index=True)
+    order = np.argsort(log.ids.get_indexer(intervals[log.id_field]), kind='stable')
+    return intervals.iloc[order].reset_index(drop=True)
+
+
+def _add_event_delta_single_iterrows(df, start_col, end_col, delta_col, delta_sec_col, id_field, date_field,
+                                     start_conditions, end_conditions, start_flag, end_flag, start_na_flag,
+                                     end_na_flag, start_at_earliest, end_at_latest, use_earliest_if_no_start,
+                                     use_latest_if_no_end):
+    """
+    Per-row implementation of add_event_delta_single(); walks each group with iterrows() and writes back with df.at.
+
+    Kept as a reference to check the vectorized implementation against; see add_event_delta_single() for parameters.
+
+    :return:                            df                  input DataFrame with new flag and delta columns
+    """
+
+    df[[start_col, end_col, delta_col, delta_sec_col]] = None
+
+    # group by id_field to handle each group separately
+    for project_id, group in df.groupby(id_field):
+        start_time, end_time = None, None
+        start_row_idx, end_row_idx = None, None
+        latest_idx = None
+
+        # iterate through each row in group
+        for idx, row in group.iterrows():
+
+            # check for start conditions
+            if _check_conditions(row, start_conditions):
+                start_time = _update_start(df, idx, row, start_col, start_flag, date_field, start_at_earliest, start_time)
+
+            # check for end conditions
+            elif _check_conditions(row, end_conditions):
+                end_time = _update_end(df, idx, row, end_col, end_flag, date_field, end_at_latest, end_time)
+                end_row_idx = idx
+
+        # handle case when no start condition is found
+        if start_time is None:
+            start_time = _handle_no_start(df, group, date_field, start_col, start_na_flag, use_earliest_if_no_start)
+
+        # handle case when no end condition is found
+        if end_time is None:
+            end_time, latest_idx = _handle_no_end(df, group, date_field, end_col, end_na_flag, use_latest_if_no_end)
+
+        # calculate delta and delta_sec only at point where 'end' or 'end-na' is marked
+        if start_time and end_time:
+
+            # if valid end condition
+            if end_row_idx is not None:
+                delta = end_time - start_time
+                df.at[end_row_idx, delta_col] = str(delta)
+                df.at[end_row_idx, delta_sec_col] = delta.total_seconds()
+
+            # if 'end-na' is marked
+            elif latest_idx is not None:
+                delta = end_time - start_time
+                df.at[latest_idx, delta_col] = str(delta)
+                df.at[latest_idx, delta_sec_col] = delta.total_seconds()
+
+    return df
+
+
+def _add_event_delta_single_vectorized(log, start_col, end_col, delta_col, delta_sec_col, start_conditions,
+                                       end_conditions, start_flag, end_flag, start_na_flag, end_na_flag,
+                                       start_at_earliest, end_at_latest, use_earliest_if_no_start,
+                                       use_latest_if_no_end, typed_output=False, output='log',
+                                       business_calendar=None, delta_business_sec_col=None):
+    """
+    Columnar implementation of add_event_delta_single(), run against a PreparedEventLog; see add_event_delta_single()
+    for parameters.
+
+    Rather than walking each group row by row, start and end conditions are evaluated as boolean masks over whole
+    columns, and the rows to flag are found with groupby reductions over row positions:
+
+        - start_at_earliest=True flags the first start row per group; otherwise every start row is flagged and the
+          last one is used as the start time
+        - end_at_latest=True flags every end row and uses the last one as the end time; otherwise only the first end
+          row is flagged and used
+        - as with the per-row implementation, rows matching both conditions count as start rows only, and the delta
+          is written on the last end row of the group
+
+    :return:                            df                  input DataFrame with new flag and delta columns
+    """
+
+    df = log.df
+    n = len(df)
+
+    with span('mask-build', rows=n):
+        start_mask = log.mask(start_conditions) & (log.codes >= 0)
+        end_mask = log.mask(end_conditions) & (log.codes >= 0) & ~start_mask
+
+    with span('pairing', rows=n):
+        start_first, start_last = log.bounds(start_mask)
+        end_first, end_last = log.bounds(end_mask)
+
+        start_codes = np.full(n, -1, dtype=np.int8)                  # 0 for start_flag, 1 for start_na_flag
+        end_codes = np.full(n, -1, dtype=np.int8)                    # 0 for end_flag, 1 for end_na_flag
+
+        if start_at_earliest:
+            start_codes[start_first[start_first >= 0]] = 0
+            start_pos = start_first
+        else:
+            start_codes[start_mask] = 0
+            start_pos = start_last
+
+        if end_at_latest:
+            end_codes[end_mask] = 0
+            end_pos = end_last
+        else:
+            end_codes[end_first[end_first >= 0]] = 0
+            end_pos = end_first
+        delta_pos = end_last.copy()
+
+        # handle groups where no start condition is found
+        if use_earliest_if_no_start and (start_pos < 0).any():
+            earliest = log.extreme_positions('min')
+            no_start = (start_pos < 0) & (earliest >= 0)
+            start_codes[earliest[no_start]] = 1
+            start_pos[no_start] = earliest[no_start]
+
+        # handle groups where no end condition is found
+        if use_latest_if_no_end and (end_pos < 0).any():
+            latest = log.extreme_positions('max')
+            no_end = (end_pos < 0) & (latest >= 0)
+            end_codes[latest[no_end]] = 1
+            end_pos[no_end] = latest[no_end]
+            delta_pos[no_end] = latest[no_end]
+
+        # calculate delta and delta_sec only at point where 'end' or 'end-na' is marked
+        measured = np.flatnonzero((start_pos >= 0) & (end_pos >= 0))
+
+    with span('write', rows=len(measured) if output == 'intervals' else n):
+        if output == 'intervals':
+            intervals = _interval_frame(log, measured, start_pos[measured], end_pos[measured], business_calendar)
+            intervals.insert(5, 'start_kind', _flag_column(intervals, start_codes[start_pos[measured]],
+                                                           (start_flag, start_na_flag), typed_output))
+            intervals.insert(6, 'end_kind', _flag_column(intervals, end_codes[end_pos[measured]],
+                                                         (end_flag, end_na_flag), typed_output))
+            return intervals
+
+        deltas = _time_deltas(log.dates, start_pos[measured], end_pos[measured])
+
+        df[start_col] = _flag_column(df, start_codes, (start_flag, start_na_flag), typed_output)
+        df[end_col] = _flag_column(df, end_codes, (end_flag, end_na_flag), typed_output)
+        df[delta_col] = _delta_column(df, delta_pos[measured], deltas, typed_output)
+        df[delta_sec_col] = _delta_sec_column(df, delta_pos[measured], deltas, typed_output)
+        if business_calendar is not None:
+            business = business_calendar.seconds(log.dates.iloc[start_pos[measured]], log.dates.iloc[end_pos[measured]])
+            df[delta_business_sec_col] = _seconds_column(df, delta_pos[measured], business, typed_output)
+
+    return df
+
+
 def add_event_delta_single(df, col_prefix, id_field, date_field, start_conditions, end_conditions,
                            start_flag='start', end_flag='end', start_na_flag='start-na', end_na_flag='end-na',
                            start_at_earliest=True, end_at_latest=True, use_earliest_if_no_start=False,
-                           use_latest_if_no_end=False):
+                           use_latest_if_no_end=False, method='vectorized', n_jobs=1, executor=None,
+                           typed_output=False, output='log', cache=None, business_calendar=None):
     """
     Given an event log DataFrame (see below for example "event log" structure), adds columns to DataFrame to calculate
     time delta between specific start and end events for each group, defined by an identifier field (e.g. project_no).
@@ -182,11 +806,36 @@ def add_event_delta_single(df, col_prefix, id_field, date_field, start_condition
     end event (or based on user-defined criteria). Optionally, if no matching conditions are found, the earliest date
     for start and latest date for end can be used, with 'start-na' and 'end-na' flags.
 
-    :param df:                          df, required        DataFrame containing event data
+    By default, new columns are object columns holding flag strings, str(delta) and float seconds, with None elsewhere.
+    With typed_output=True, flag columns are categorical (stored as int8 codes), the delta column is timedelta64 with
+    NaT elsewhere, and the delta_sec column is float64 with NaN elsewhere; this is far smaller on large event logs,
+    and the string form can be generated on request with format_delta().
+
+    With output='intervals', the event log is neither copied nor modified; instead, a compact table is returned with
+    one row per id_field value with a delta, and the following columns:
+
+        id_field                    group identifier
+        start_ts, end_ts            dates used as start and end
+        start_row, end_row          index labels of the rows used as start and end
+        start_kind, end_kind        start_flag or start_na_flag, end_flag or end_na_flag; categorical if typed_output
+        delta_sec                   time delta in seconds, float64
+        delta_business_sec          time delta in business seconds, float64; only if business_calendar is given
+
+    With business_calendar, a BusinessCalendar of working hours, working days, holidays and timezone, a
+    {col_prefix}_delta_business_sec column is also added, with the delta counted in business time only (see
+    BusinessCalendar); it is float64 if typed_output, otherwise an object column like delta_sec.
+
+    Polars DataFrames and LazyFrames, and pyarrow Tables, are computed on the Polars engine rather than pandas (see
+    polars_event_delta_single()), and returned as the same type, with columns typed as with typed_output=True; polars
+    must be installed. method, n_jobs, cache and business_calendar are not supported for them.
+
+    :param df:                          df, required        DataFrame, PreparedEventLog, Polars DataFrame or LazyFrame,
+                                                            or pyarrow Table containing event data
     :param col_prefix:                  str, required       prefix for new column names that will be added to DataFrame
     :param id_field:                    str, required       column name used to group data (e.g. 'project_no')
     :param date_field:                  str, required       column containing datetime used to calculate time delta
-    :param start_conditions:            dict, required      dict specifying conditions for identifying start event
+    :param start_conditions:            dict, required      dict specifying conditions for identifying start event; see
+                                                            compile_conditions() for operators beyond equality
     :param end_conditions:              dict, required      dict specifying conditions for identifying end event
     :param start_flag:                  str, optional       label to mark start event in new start column
     :param end_flag:                    str, optional       label to mark end event in new end column
@@ -196,62 +845,195 @@ def add_event_delta_single(df, col_prefix, id_field, date_field, start_condition
     :param end_at_latest:               bool, optional      if True, marks last end event within each group
     :param use_earliest_if_no_start:    bool, optional      if True, uses earliest date in group if no matching condition
     :param use_latest_if_no_end:        bool, optional      if True, uses latest date in group if no matching condition
-    :return:                            df                  input DataFrame with new flag and delta columns
+    :param method:                      str, optional       'vectorized' (columnar masks and groupby reductions) or
+                                                            'iterrows' (per-row reference implementation)
+    :param n_jobs:                      int, optional       if not 1, partitions on id_field and runs in n_jobs worker
+                                                            processes; -1 for one per CPU
+    :param executor:                    object, optional    concurrent.futures executor to run partitions in, if n_jobs
+                                                            is not 1; by default a ProcessPoolExecutor is created
+    :param typed_output:                bool, optional      if True, adds categorical, timedelta64 and float64 columns
+                                                            rather than object columns; 'vectorized' method only
+    :param output:                      str, optional       'log' (adds columns to event log) or 'intervals' (returns
+                                                            one row per delta); 'intervals' is 'vectorized' method only
+    :param cache:                       object, optional    ResultCache to reuse results of identical runs from; see
+                                                            ResultCache; DataFrames only, not PreparedEventLog
+    :param business_calendar:           object, optional    BusinessCalendar to also measure deltas in business time
+                                                            with; 'vectorized' method only
+    :return:                            df                  input DataFrame (or PreparedEventLog.df) with new flag and
+                                                            delta columns, or table of intervals
     """
 
     start_col = f'{col_prefix}_start'
     end_col = f'{col_prefix}_end'
     delta_col = f'{col_prefix}_delta'
     delta_sec_col = f'{col_prefix}_delta_sec'
+    delta_business_sec_col = f'{col_prefix}_delta_business_sec'
+
+    if output not in ('log', 'intervals'):
+        raise ValueError(f'output {output} invalid; must be \'log\' or \'intervals\'')
+
+    if frame_backend(df) == 'polars':
+        _check_polars_options(method, n_jobs, cache, business_calendar)
+        with span('add_event_delta_single'):
+            return polars_event_delta_single(df, col_prefix, id_field, date_field, start_conditions, end_conditions,
+                                             start_flag, end_flag, start_na_flag, end_na_flag, start_at_earliest,
+                                             end_at_latest, use_earliest_if_no_start, use_latest_if_no_end, output)
+
+    if cache is not None and isinstance(df, pd.DataFrame):
+        params = dict(
+            col_prefix=col_prefix, id_field=id_field, date_field=date_field, start_conditions=start_conditions,
+            end_conditions=end_conditions, start_flag=start_flag, end_flag=end_flag, start_na_flag=start_na_flag,
+            end_na_flag=end_na_flag, start_at_earliest=start_at_earliest, end_at_latest=end_at_latest,
+            use_earliest_if_no_start=use_earliest_if_no_start, use_latest_if_no_end=use_latest_if_no_end,
+            typed_output=typed_output, output=output, business_calendar=business_calendar
+        )
+        return cache.memoize(
+            'add_event_delta_single', df, metric_columns(id_field, date_field, [start_conditions, end_conditions]),
+            dict(params, start_conditions=compile_conditions(start_conditions),
+                 end_conditions=compile_conditions(end_conditions)),
+            lambda: add_event_delta_single(df=df, method=method, n_jobs=n_jobs, executor=executor, **params),
+            columns=[start_col, end_col, delta_col, delta_sec_col]
+            + ([delta_business_sec_col] if business_calendar is not None else []) if output == 'log' else None
+        )
+
+    with span('add_event_delta_single', rows=len(df)):
+        log = _prepare_event_log(df, id_field, date_field)
+
+        if n_jobs != 1:
+            fields = metric_columns(id_field, date_field, [start_conditions, end_conditions])
+            return _run_partitioned(add_event_delta_single, log, fields, n_jobs, executor, dict(
+                col_prefix=col_prefix, id_field=id_field, date_field=date_field, start_conditions=start_conditions,
+                end_conditions=end_conditions, start_flag=start_flag, end_flag=end_flag, start_na_flag=start_na_flag,
+                end_na_flag=end_na_flag, start_at_earliest=start_at_earliest, end_at_latest=end_at_latest,
+                use_earliest_if_no_start=use_earliest_if_no_start, use_latest_if_no_end=use_latest_if_no_end,
+                method=method, typed_output=typed_output, output=output, business_calendar=business_calendar
+            ))
+
+        if method == 'vectorized':
+            return _add_event_delta_single_vectorized(log, start_col, end_col, delta_col, delta_sec_col,
+                                                      start_conditions, end_conditions, start_flag, end_flag,
+                                                      start_na_flag, end_na_flag, start_at_earliest, end_at_latest,
+                                                      use_earliest_if_no_start, use_latest_if_no_end, typed_output,
+                                                      output, business_calendar, delta_business_sec_col)
+        elif method == 'iterrows' and (typed_output or output != 'log' or business_calendar is not None):
+            raise ValueError('typed_output, output and business_calendar are only supported with method '
+                             '\'vectorized\'')
+        elif method == 'iterrows':
+            return _add_event_delta_single_iterrows(log.df, start_col, end_col, delta_col, delta_sec_col, id_field,
+                                                    date_field, start_conditions, end_conditions, start_flag, end_flag,
+                                                    start_na_flag, end_na_flag, start_at_earliest, end_at_latest,
+                                                    use_earliest_if_no_start, use_latest_if_no_end)
+        else:
+            raise ValueError(f'method {method} invalid; must be \'vectorized\' or \'iterrows\'')
+
+
+def _add_event_delta_paired_iterrows(df, delta_col, delta_sec_col, id_field, date_field, start_conditions,
+                                     end_conditions, start_flag, end_flag):
+    """
+    Per-row implementation of add_event_delta_paired(); walks each group with iterrows() and a small state machine.
 
-    df[[start_col, end_col, delta_col, delta_sec_col]] = None
+    Kept as a reference to check the vectorized implementation against; see add_event_delta_paired() for parameters.
+
+    :return:                    df                  input DataFrame with new flag and delta columns
+    """
+
+    # initialize new columns with None
+    df[[delta_col, delta_sec_col]] = None
 
     # group by id_field to handle each group separately
     for project_id, group in df.groupby(id_field):
-        start_time, end_time = None, None
-        start_row_idx, end_row_idx = None, None
-        latest_idx = None
+        start_time = None
+        start_idx = None
 
-        # iterate through each row in group
+        # iterate through each row in the group
         for idx, row in group.iterrows():
+            # check for start condition
+            if start_time is None and _check_conditions(row, start_conditions):
+                start_time = row[date_field]
+                start_idx = idx
 
-            # check for start conditions
-            if _check_conditions(row, start_conditions):
-                start_time = _update_start(df, idx, row, start_col, start_flag, date_field, start_at_earliest, start_time)
+                # mark start event
+                df.at[start_idx, delta_col] = start_flag
 
-            # check for end conditions
-            elif _check_conditions(row, end_conditions):
-                end_time = _update_end(df, idx, row, end_col, end_flag, date_field, end_at_latest, end_time)
-                end_row_idx = idx
+            # check for end condition after start is found
+            elif start_time is not None and _check_conditions(row, end_conditions):
+                end_time = row[date_field]
+                delta = end_time - start_time
+                delta_seconds = delta.total_seconds()
 
-        # handle case when no start condition is found
-        if start_time is None:
-            start_time = _handle_no_start(df, group, date_field, start_col, start_na_flag, use_earliest_if_no_start)
+                # mark end event and calculate delta
+                df.at[idx, delta_col] = end_flag
+                df.at[idx, delta_sec_col] = delta_seconds
 
-        # handle case when no end condition is found
-        if end_time is None:
-            end_time, latest_idx = _handle_no_end(df, group, date_field, end_col, end_na_flag, use_latest_if_no_end)
+                # reset for next start-end pair
+                start_time = None
+                start_idx = None
 
-        # calculate delta and delta_sec only at point where 'end' or 'end-na' is marked
-        if start_time and end_time:
+    return df
 
-            # if valid end condition
-            if end_row_idx is not None:
-                delta = end_time - start_time
-                df.at[end_row_idx, delta_col] = str(delta)
-                df.at[end_row_idx, delta_sec_col] = delta.total_seconds()
 
-            # if 'end-na' is marked
-            elif latest_idx is not None:
-                delta = end_time - start_time
-                df.at[latest_idx, delta_col] = str(delta)
-                df.at[latest_idx, delta_sec_col] = delta.total_seconds()
+def _add_event_delta_paired_vectorized(log, delta_col, delta_sec_col, delta_td_col, start_conditions, end_conditions,
+                                       start_flag, end_flag, typed_output=False, output='log',
+                                       business_calendar=None, delta_business_sec_col=None, pairing='first_start',
+                                       max_gap=None):
+    """
+    Columnar implementation of add_event_delta_paired(), run against a PreparedEventLog; see add_event_delta_paired()
+    for parameters, and _pair_positions() and _pair_positions_asof() for how pairs are found without a per-row loop.
+    With the default pairing, output is identical to the per-row implementation.
+
+    With typed_output, a timedelta64 column delta_td_col is also added; without it, no time delta column is added, as
+    in the per-row implementation.
+
+    With business_calendar, business seconds between each pair are written to delta_business_sec_col at its end row.
+
+    :return:                    df                  input DataFrame with new flag and delta columns
+    """
+
+    df = log.df
+    with span('mask-build', rows=len(df)):
+        start_mask = log.mask(start_conditions)
+        end_mask = log.mask(end_conditions)
+
+    with span('pairing', rows=len(df)):
+        if pairing == 'first_start':
+            starts, pair_starts, pair_ends = _pair_positions(log.codes, start_mask, end_mask, log.is_contiguous)
+        else:
+            starts, pair_starts, pair_ends = _pair_positions_asof(log.codes, start_mask, end_mask, pairing,
+                                                                  log.is_contiguous)
+        deltas = _time_deltas(log.dates, pair_starts, pair_ends)
+
+        # pairs further apart than max_gap are dropped; a 'first_start' start stays flagged, as if never closed
+        if max_gap is not None:
+            kept = ~(deltas > max_gap).to_numpy()
+            pair_starts, pair_ends, deltas = pair_starts[kept], pair_ends[kept], deltas[kept].reset_index(drop=True)
+            starts = starts if pairing == 'first_start' else np.unique(pair_starts)
+
+    with span('write', rows=len(pair_ends) if output == 'intervals' else len(df)):
+        if output == 'intervals':
+            intervals = _interval_frame(log, log.codes[pair_ends], pair_starts, pair_ends, business_calendar)
+            kinds = np.zeros(len(intervals), dtype=np.int8)
+            intervals.insert(5, 'start_kind', _flag_column(intervals, kinds, (start_flag,), typed_output))
+            intervals.insert(6, 'end_kind', _flag_column(intervals, kinds, (end_flag,), typed_output))
+            return intervals
+
+        flag_codes = np.full(len(df), -1, dtype=np.int8)
+        flag_codes[starts] = 0
+        flag_codes[pair_ends] = 1
+
+        df[delta_col] = _flag_column(df, flag_codes, (start_flag, end_flag), typed_output)
+        df[delta_sec_col] = _delta_sec_column(df, pair_ends, deltas, typed_output)
+        if typed_output:
+            df[delta_td_col] = _delta_column(df, pair_ends, deltas, typed_output)
+        if business_calendar is not None:
+            business = business_calendar.seconds(log.dates.iloc[pair_starts], log.dates.iloc[pair_ends])
+            df[delta_business_sec_col] = _seconds_column(df, pair_ends, business, typed_output)
 
     return df
 
 
 def add_event_delta_paired(df, col_prefix, id_field, date_field, start_conditions, end_conditions, start_flag='start',
-                          end_flag='end'):
+                          end_flag='end', method='vectorized', n_jobs=1, executor=None, typed_output=False,
+                          output='log', cache=None, business_calendar=None, pairing='first_start', max_gap=None):
     """
     Calculates deltas for every start-end point pair within a given id_field based on specified conditions.
 
@@ -277,50 +1059,392 @@ def add_event_delta_paired(df, col_prefix, id_field, date_field, start_condition
         100043       2023-10-24 19:23:44   Correspondence  True
         100043       2023-12-03 23:28:19   Correspondence  False                   end     <-- end condition
 
-    :param df:                  df, required        DataFrame containing event data
+    By default, new columns are object columns holding flag strings and float seconds, with None elsewhere. With
+    typed_output=True, the flag column is categorical (stored as int8 codes), the delta_sec column is float64 with NaN
+    elsewhere, and a timedelta64 column, {col_prefix}_delta_td, is added with the time delta at each end row.
+
+    With output='intervals', the event log is neither copied nor modified; instead, a compact table is returned with
+    one row per pair, and the following columns:
+
+        id_field                    group identifier
+        start_ts, end_ts            dates of start and end events
+        start_row, end_row          index labels of start and end events
+        start_kind, end_kind        start_flag and end_flag, as with add_event_delta_single(); categorical if
+                                    typed_output
+        delta_sec                   time delta in seconds, float64
+        delta_business_sec          time delta in business seconds, float64; only if business_calendar is given
+
+    With business_calendar, a {col_prefix}_delta_business_sec column is also added at each end row, with the delta
+    counted in business time only; see BusinessCalendar.
+
+    By default (pairing='first_start'), a start waits for the next end, and further starts or ends in between are
+    ignored, as above. Other pairings are found as an as-of join within each id_field group, and may share rows
+    between pairs:
+
+        pairing='each_start'        every start paired with the next end after it, so pairs may overlap; e.g. the
+                                    time to answer each customer message; 'intervals' output only, as several
+                                    pairs may end on one row
+        pairing='latest_start'      every end paired with the latest start before it; e.g. the time from the last
+                                    customer message to each reply
+
+    With max_gap, e.g. '14D' or a timedelta, pairs more than max_gap apart are discarded; with the default pairing,
+    the start is then flagged as if no end had been found.
+
+    Polars DataFrames and LazyFrames, and pyarrow Tables, are computed on the Polars engine rather than pandas (see
+    polars_event_delta_paired()), and returned as the same type, with columns typed as with typed_output=True; polars
+    must be installed. method, n_jobs, cache and business_calendar are not supported for them.
+
+    :param df:                  df, required        DataFrame, PreparedEventLog, Polars DataFrame or LazyFrame, or
+                                                    pyarrow Table containing event data
     :param col_prefix:          str, required       prefix for new column names that will be added to DataFrame
     :param id_field:            str, required       column name used to group data (e.g. 'project_no')
     :param date_field:          str, required       column containing datetime used to calculate time delta
-    :param start_conditions:    dict, required      dict specifying conditions for identifying start event
+    :param start_conditions:    dict, required      dict specifying conditions for identifying start event; see
+                                                    compile_conditions() for operators beyond equality
     :param end_conditions:      dict, required      dict specifying conditions for identifying end event
     :param start_flag:          str, optional       label to mark start event in new start column
     :param end_flag:            str, optional       label to mark end event in new end column
-    :return:                    df                  input DataFrame with new flag and delta columns
+    :param method:              str, optional       'vectorized' (cumulative sums over start and end masks) or
+                                                    'iterrows' (per-row reference implementation)
+    :param n_jobs:              int, optional       if not 1, partitions on id_field and runs in n_jobs worker
+                                                    processes; -1 for one per CPU
+    :param executor:            object, optional    concurrent.futures executor to run partitions in, if n_jobs is
+                                                    not 1; by default a ProcessPoolExecutor is created
+    :param typed_output:        bool, optional      if True, adds categorical, float64 and timedelta64 columns rather
+                                                    than object columns; 'vectorized' method only
+    :param output:              str, optional       'log' (adds columns to event log) or 'intervals' (returns one row
+                                                    per pair); 'intervals' is 'vectorized' method only
+    :param cache:               object, optional    ResultCache to reuse results of identical runs from; see
+                                                    ResultCache; DataFrames only, not PreparedEventLog
+    :param business_calendar:   object, optional    BusinessCalendar to also measure deltas in business time with;
+                                                    'vectorized' method only
+    :param pairing:             str, optional       'first_start', 'each_start' or 'latest_start'; how start and end
+                                                    rows are paired; other than 'first_start', 'vectorized' only
+    :param max_gap:             object, optional    timedelta or str, e.g. '8h'; pairs further apart are discarded;
+                                                    'vectorized' method only
+    :return:                    df                  input DataFrame (or PreparedEventLog.df) with new flag and delta
+                                                    columns, or table of pairs
     """
 
     delta_col = f'{col_prefix}_delta'
     delta_sec_col = f'{col_prefix}_delta_sec'
+    delta_td_col = f'{col_prefix}_delta_td'
+    delta_business_sec_col = f'{col_prefix}_delta_business_sec'
+
+    if output not in ('log', 'intervals'):
+        raise ValueError(f'output {output} invalid; must be \'log\' or \'intervals\'')
+    if pairing not in PAIRING_STRATEGIES:
+        raise ValueError(f'pairing {pairing} invalid; must be one of {PAIRING_STRATEGIES}')
+    if pairing == 'each_start' and output == 'log':
+        raise ValueError('pairing \'each_start\' is only supported with output \'intervals\', as pairs may share '
+                         'an end row')
+    max_gap = pd.Timedelta(max_gap) if max_gap is not None else None
+
+    if frame_backend(df) == 'polars':
+        _check_polars_options(method, n_jobs, cache, business_calendar)
+        with span('add_event_delta_paired'):
+            return polars_event_delta_paired(df, col_prefix, id_field, date_field, start_conditions, end_conditions,
+                                             start_flag, end_flag, output, pairing, max_gap)
+
+    if cache is not None and isinstance(df, pd.DataFrame):
+        params = dict(
+            col_prefix=col_prefix, id_field=id_field, date_field=date_field, start_conditions=start_conditions,
+            end_conditions=end_conditions, start_flag=start_flag, end_flag=end_flag, typed_output=typed_output,
+            output=output, business_calendar=business_calendar, pairing=pairing, max_gap=max_gap
+        )
+        return cache.memoize(
+            'add_event_delta_paired', df, metric_columns(id_field, date_field, [start_conditions, end_conditions]),
+            dict(params, start_conditions=compile_conditions(start_conditions),
+                 end_conditions=compile_conditions(end_conditions)),
+            lambda: add_event_delta_paired(df=df, method=method, n_jobs=n_jobs, executor=executor, **params),
+            columns=[delta_col, delta_sec_col] + ([delta_td_col] if typed_output else [])
+            + ([delta_business_sec_col] if business_calendar is not None else []) if output == 'log' else None
+        )
+
+    with span('add_event_delta_paired', rows=len(df)):
+        log = _prepare_event_log(df, id_field, date_field)
+
+        if n_jobs != 1:
+            fields = metric_columns(id_field, date_field, [start_conditions, end_conditions])
+            return _run_partitioned(add_event_delta_paired, log, fields, n_jobs, executor, dict(
+                col_prefix=col_prefix, id_field=id_field, date_field=date_field, start_conditions=start_conditions,
+                end_conditions=end_conditions, start_flag=start_flag, end_flag=end_flag, method=method,
+                typed_output=typed_output, output=output, business_calendar=business_calendar, pairing=pairing,
+                max_gap=max_gap
+            ))
+
+        if method == 'vectorized':
+            return _add_event_delta_paired_vectorized(log, delta_col, delta_sec_col, delta_td_col, start_conditions,
+                                                      end_conditions, start_flag, end_flag, typed_output, output,
+                                                      business_calendar, delta_business_sec_col, pairing, max_gap)
+        elif method == 'iterrows' and (typed_output or output != 'log' or business_calendar is not None
+                                       or pairing != 'first_start' or max_gap is not None):
+            raise ValueError('typed_output, output, business_calendar, pairing and max_gap are only supported with '
+                             'method \'vectorized\'')
+        elif method == 'iterrows':
+            return _add_event_delta_paired_iterrows(log.df, delta_col, delta_sec_col, id_field, date_field,
+                                                    start_conditions, end_conditions, start_flag, end_flag)
+        else:
+            raise ValueError(f'method {method} invalid; must be \'vectorized\' or \'iterrows\'')
+
+
+def incremental_watermark(state, verbose=False):
+    """
+    Given state returned by add_event_delta_single_incremental() or add_event_delta_paired_incremental(), returns the
+    latest event date processed so far. Only events strictly later than this are processed by the next call; it can
+    be used to limit the query fed to db_to_df(), e.g. WHERE event_date > '{watermark}'.
 
-    # initialize new columns with None
-    df[[delta_col, delta_sec_col]] = None
+    :param state:               df, required            state returned by a previous incremental call, or None
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    datetime or None        latest event date processed, or None if no state
+    """
 
-    # group by id_field to handle each group separately
-    for project_id, group in df.groupby(id_field):
-        start_time = None
-        start_idx = None
+    if state is None or state.empty:
+        return None
 
-        # iterate through each row in the group
-        for idx, row in group.iterrows():
-            # check for start condition
-            if start_time is None and _check_conditions(row, start_conditions):
-                start_time = row[date_field]
-                start_idx = idx
+    watermark = state['last_ts'].max()
+    print(f'Incremental watermark: {watermark}') if verbose else None
+    return watermark
 
-                # mark start event
-                df.at[start_idx, delta_col] = start_flag
 
-            # check for end condition after start is found
-            elif start_time is not None and _check_conditions(row, end_conditions):
-                end_time = row[date_field]
-                delta = end_time - start_time
-                delta_seconds = delta.total_seconds()
-
-                # mark end event and calculate delta
-                df.at[idx, delta_col] = end_flag
-                df.at[idx, delta_sec_col] = delta_seconds
+def _new_events(df, state, date_field, verbose=False):
+    """
+    Helper function to keep only events later than the watermark of a previous incremental call.
 
-                # reset for next start-end pair
-                start_time = None
-                start_idx = None
+    :param df:                  df, required            DataFrame containing event data
+    :param state:               df, required            state returned by a previous incremental call, or None
+    :param date_field:          str, required           column containing event date or timestamp
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    df                      events later than watermark
+    """
 
+    watermark = incremental_watermark(state)
+    if watermark is not None and not pd.isna(watermark):
+        df = df[df[date_field] > watermark]
+    print(f'Processing {len(df)} new events.') if verbose else None
     return df
+
+
+def _dates_at(dates, positions):
+    """
+    Helper function to take event dates at row positions, returning NaT where position is -1.
+
+    :param dates:               series, required        event dates, indexed by position
+    :param positions:           ndarray, required       row positions, or -1
+    :return:                    series                  event date per position, indexed from 0
+    """
+
+    return dates.iloc[np.maximum(positions, 0)].reset_index(drop=True).where(positions >= 0)
+
+
+def add_event_delta_single_incremental(df, state, id_field, date_field, start_conditions, end_conditions,
+                                       start_flag='start', end_flag='end', start_na_flag='start-na',
+                                       end_na_flag='end-na', start_at_earliest=True, end_at_latest=True,
+                                       use_earliest_if_no_start=False, use_latest_if_no_end=False, verbose=False):
+    """
+    Incremental form of add_event_delta_single(), for event logs that only grow. Rather than recalculating the full
+    history, a compact state is kept per id_field: the tracked start and end dates, and the earliest and latest event
+    dates (for start-na and end-na). Each call processes only events later than the watermark of the state, merges
+    them into it, and returns the deltas that are new or have changed, with the updated state:
+
+        state = None
+        deltas, state = add_event_delta_single_incremental(df=day_1_df, state=state, ...)
+        deltas, state = add_event_delta_single_incremental(df=day_2_df, state=state, ...)
+
+    Events are expected to arrive in date order, as appended to the log; an event dated at or before the watermark is
+    skipped. The state is a plain DataFrame, one row per id_field value, and can be persisted with df_to_db() and read
+    back with db_to_df() between runs; incremental_watermark() returns the date to filter the next query on.
+
+    Returned deltas have one row per id_field value with the following columns:
+
+        start_ts, end_ts            dates used as start and end
+        start_kind, end_kind        start_flag or start_na_flag, end_flag or end_na_flag
+        delta_sec                   time delta in seconds
+
+    :param df:                          df, required        DataFrame containing new event data
+    :param state:                       df, required        state returned by a previous call, or None on first run
+    :param id_field:                    str, required       column name used to group data (e.g. 'project_no')
+    :param date_field:                  str, required       column containing datetime used to calculate time delta
+    :param start_conditions:            dict, required      dict specifying conditions for identifying start event
+    :param end_conditions:              dict, required      dict specifying conditions for identifying end event
+    :param start_flag:                  str, optional       label for start_kind when start condition found
+    :param end_flag:                    str, optional       label for end_kind when end condition found
+    :param start_na_flag:               str, optional       label for start_kind if no matching start condition found
+    :param end_na_flag:                 str, optional       label for end_kind if no matching end condition found
+    :param start_at_earliest:           bool, optional      if True, uses first start event within each group
+    :param end_at_latest:               bool, optional      if True, uses last end event within each group
+    :param use_earliest_if_no_start:    bool, optional      if True, uses earliest date in group if no matching condition
+    :param use_latest_if_no_end:        bool, optional      if True, uses latest date in group if no matching condition
+    :param verbose:                     bool, optional      if True, print status to terminal
+    :return deltas:                     df                  new or changed deltas
+            state:                      df                  updated state, to pass to the next call
+    """
+
+    state_cols = ['start_ts', 'end_ts', 'first_ts', 'last_ts']
+    log = PreparedEventLog(_new_events(df, state, date_field, verbose), id_field, date_field)
+    valid = log.codes >= 0
+
+    start_mask = log.mask(start_conditions) & valid
+    end_mask = log.mask(end_conditions) & valid & ~start_mask
+    start_first, start_last = log.bounds(start_mask)
+    end_first, end_last = log.bounds(end_mask)
+    extremes = log.dates[valid].groupby(log.codes[valid]).agg(['min', 'max']).reindex(range(log.n_groups))
+
+    batch = pd.DataFrame({
+        'start_ts': _dates_at(log.dates, start_first if start_at_earliest else start_last),
+        'end_ts': _dates_at(log.dates, end_last if end_at_latest else end_first),
+        'first_ts': extremes['min'].reset_index(drop=True),
+        'last_ts': extremes['max'].reset_index(drop=True),
+    })
+    batch.index = pd.Index(log.ids, name=id_field)
+
+    if state is None:
+        state = pd.DataFrame({id_field: log.ids[:0]}).assign(**{col: batch[col].iloc[:0] for col in state_cols})
+    previous = state.set_index(id_field)[state_cols].reindex(batch.index)
+
+    # earlier events are already in the state; keep its value unless tracking the latest occurrence
+    merged = pd.DataFrame({
+        'start_ts': previous['start_ts'].combine_first(batch['start_ts']) if start_at_earliest
+        else batch['start_ts'].combine_first(previous['start_ts']),
+        'end_ts': batch['end_ts'].combine_first(previous['end_ts']) if end_at_latest
+        else previous['end_ts'].combine_first(batch['end_ts']),
+        'first_ts': previous['first_ts'].combine_first(batch['first_ts']),
+        'last_ts': batch['last_ts'].combine_first(previous['last_ts']),
+    })
+
+    def resolve(tracked):
+        start_ts = tracked['start_ts']
+        end_ts = tracked['end_ts']
+        start_kind = pd.Series(np.where(start_ts.notna(), start_flag, None), index=tracked.index, dtype=object)
+        end_kind = pd.Series(np.where(end_ts.notna(), end_flag, None), index=tracked.index, dtype=object)
+        if use_earliest_if_no_start:
+            start_kind = start_kind.where(start_ts.notna(), np.where(tracked['first_ts'].notna(), start_na_flag, None))
+            start_ts = start_ts.combine_first(tracked['first_ts'])
+        if use_latest_if_no_end:
+            end_kind = end_kind.where(end_ts.notna(), np.where(tracked['last_ts'].notna(), end_na_flag, None))
+            end_ts = end_ts.combine_first(tracked['last_ts'])
+        return pd.DataFrame({'start_ts': start_ts, 'end_ts': end_ts, 'start_kind': start_kind, 'end_kind': end_kind})
+
+    before = resolve(previous)
+    after = resolve(merged)
+    measured = after['start_ts'].notna() & after['end_ts'].notna()
+    changed = (after['start_ts'].ne(before['start_ts']) | after['end_ts'].ne(before['end_ts'])
+               | after['start_kind'].ne(before['start_kind']) | after['end_kind'].ne(before['end_kind']))
+
+    deltas = after[measured & changed].copy()
+    deltas['delta_sec'] = _total_seconds(deltas['end_ts'] - deltas['start_ts'])
+    deltas = deltas.reset_index()
+
+    state = pd.concat([state[~state[id_field].isin(batch.index)], merged.reset_index()], ignore_index=True)
+    print(f'{len(deltas)} new or changed deltas; state holds {len(state)} ids.') if verbose else None
+
+    return deltas, state
+
+
+def add_event_delta_paired_incremental(df, state, id_field, date_field, start_conditions, end_conditions,
+                                       verbose=False):
+    """
+    Incremental form of add_event_delta_paired(), for event logs that only grow. Rather than recalculating the full
+    history, the state kept per id_field is the date of any start still waiting for an end (the pending pair) and the
+    latest event date. Each call processes only events later than the watermark of the state, carrying pending pairs
+    into them, and returns the newly closed pairs with the updated state:
+
+        state = None
+        pairs, state = add_event_delta_paired_incremental(df=day_1_df, state=state, ...)
+        pairs, state = add_event_delta_paired_incremental(df=day_2_df, state=state, ...)
+
+    Pairing follows add_event_delta_paired(). Events are expected to arrive in date order, as appended to the log; an
+    event dated at or before the watermark is skipped. The state is a plain DataFrame, one row per id_field value, and
+    can be persisted with df_to_db() and read back with db_to_df() between runs.
+
+    Returned pairs have one row per closed pair with the following columns:
+
+        start_ts, end_ts            dates of start and end events
+        start_row, end_row          index labels of start and end events in df; start_row is None if the start was
+                                    processed by a previous call
+        delta_sec                   time delta in seconds
+
+    :param df:                  df, required        DataFrame containing new event data
+    :param state:               df, required        state returned by a previous call, or None on first run
+    :param id_field:            str, required       column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required       column containing datetime used to calculate time delta
+    :param start_conditions:    dict, required      dict specifying conditions for identifying start event
+    :param end_conditions:      dict, required      dict specifying conditions for identifying end event
+    :param verbose:             bool, optional      if True, print status to terminal
+    :return pairs:              df                  newly closed pairs
+            state:              df                  updated state, to pass to the next call
+    """
+
+    log = PreparedEventLog(_new_events(df, state, date_field, verbose), id_field, date_field)
+    valid = log.codes >= 0
+
+    if state is None:
+        empty_dates = log.dates.iloc[:0]
+        state = pd.DataFrame({id_field: log.ids[:0], 'open_start_ts': empty_dates, 'last_ts': empty_dates})
+
+    # pending starts are carried in as start rows placed ahead of each group's new events
+    pending = state[state['open_start_ts'].notna() & state[id_field].isin(log.ids)]
+    n_pending = len(pending)
+    codes = np.concatenate([log.ids.get_indexer(pending[id_field]), log.codes])
+    start_mask = np.concatenate([np.ones(n_pending, dtype=bool), log.mask(start_conditions)])
+    end_mask = np.concatenate([np.zeros(n_pending, dtype=bool), log.mask(end_conditions)])
+    dates = pd.concat([pending['open_start_ts'], log.dates], ignore_index=True)
+
+    starts, pair_starts, pair_ends = _pair_positions(codes, start_mask, end_mask)
+
+    labels = log.df.index.to_numpy()
+    pairs = pd.DataFrame({
+        id_field: log.ids[codes[pair_ends]] if len(pair_ends) else log.ids[:0],
+        'start_ts': dates.iloc[pair_starts].reset_index(drop=True),
+        'end_ts': dates.iloc[pair_ends].reset_index(drop=True),
+        'start_row': pd.Series([labels[p - n_pending] if p >= n_pending else None for p in pair_starts], dtype=object),
+        'end_row': labels[pair_ends - n_pending],
+    })
+    pairs['delta_sec'] = _total_seconds(pairs['end_ts'] - pairs['start_ts'])
+
+    open_starts = np.setdiff1d(starts, pair_starts)
+    open_start_pos = np.full(log.n_groups, -1, dtype=np.int64)
+    open_start_pos[codes[open_starts]] = open_starts
+
+    touched = pd.DataFrame({
+        id_field: log.ids,
+        'open_start_ts': _dates_at(dates, open_start_pos),
+        'last_ts': log.dates[valid].groupby(log.codes[valid]).max().reindex(range(log.n_groups)).reset_index(drop=True),
+    })
+
+    state = pd.concat([state[~state[id_field].isin(log.ids)], touched], ignore_index=True)
+    print(f'{len(pairs)} new pairs; {touched["open_start_ts"].notna().sum()} pending.') if verbose else None
+
+    return pairs, state
+
+
+def stream_event_delta(chunks, delta_func, id_field, date_field, verbose=False, **kwargs):
+    """
+    Runs add_event_delta_single() or add_event_delta_paired() over an event log read in chunks, yielding results
+    chunk by chunk, so that the full event log never has to be held in memory.
+
+    Chunks must be ordered by id_field, then date_field (e.g. from db_to_df() with chunksize, and ORDER BY in the
+    query); groups which cross a chunk boundary are carried forward by iter_complete_groups(), so every group is
+    calculated whole. Peak memory is bounded by chunk size plus the largest single group.
+
+    Example usage is as follows:
+
+        chunks = db_to_df(query=audit_query + ' ORDER BY project_id, event_date', engine=engine, chunksize=500000)
+
+        for result_df in stream_event_delta(chunks, add_event_delta_single, id_field='project_id',
+                                            date_field='event_date', col_prefix='project_res_time',
+                                            start_conditions={...}, end_conditions={...}):
+            df_to_db(engine=engine, df=result_df, tbl='event_log_with_time', if_tbl_exists='append')
+
+    :param chunks:              iterable, required      DataFrames ordered by id_field and date_field
+    :param delta_func:          function, required      add_event_delta_single or add_event_delta_paired
+    :param id_field:            str, required           column name used to group data (e.g. 'project_no')
+    :param date_field:          str, required           column containing datetime used to calculate time delta
+    :param verbose:             bool, optional          if True, print status to terminal
+    :param kwargs:              any, required           remaining parameters passed to delta_func
+    :return:                    generator               input chunks of complete groups, with new flag and delta columns
+    """
+
+    for complete in iter_complete_groups(chunks, id_field, verbose=verbose):
+        log = PreparedEventLog(complete, id_field, date_field, verbose=verbose)
+        yield delta_func(df=log, id_field=id_field, date_field=date_field, **kwargs)
@@ -0,0 +1,145 @@
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from chronumbo.core.sql import (
+    create_engine,
+    db_to_df,
+    df_to_db
+)
+
+from chronumbo.core.synthetic import (
+    generate_event_log
+)
+
+from chronumbo.main import (
+    add_event_delta_paired,
+    add_event_delta_single
+)
+
+
+# ===== benchmark variables ==========================================================================================
+
+verbose = True
+
+sizes = [10_000, 100_000, 1_000_000]                            # rows; up to 50_000_000 given enough memory
+methods = ['vectorized']                                        # add 'iterrows' to compare, on small sizes only
+events_per_project = 8
+start_match_rate = 0.9
+end_match_rate = 0.8
+seed = 0
+
+results_path = 'benchmark-results.csv'                          # appended to on every run
+
+single_start_conditions = {'event': 'Status', 'description': 'Created'}
+single_end_conditions = {'event': 'Status', 'description': 'Resolved'}
+paired_start_conditions = {'event': 'Correspondence', 'is_employee': False}
+paired_end_conditions = {'event': 'Correspondence', 'is_employee': True}
+
+
+# ===== benchmark harness ============================================================================================
+
+RESULT_COLUMNS = ['run_at', 'python', 'pandas', 'benchmark', 'method', 'n_rows', 'seconds', 'rows_per_sec',
+                  'peak_mb']
+
+
+def measure(func):
+    """
+    Runs func once, measuring wall time and peak memory allocated while it runs (traced by tracemalloc, which numpy
+    and pandas allocations are reported to).
+
+    :param func:                function, required      function to run, without arguments
+    :return result:             any                     value returned by func
+            seconds:            float                   wall time in seconds
+            peak_mb:            float                   peak traced memory in MB
+    """
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, seconds, peak / 1e6
+
+
+def run_benchmarks(sizes, methods=('vectorized',), results_path=None, verbose=False):
+    """
+    Times add_event_delta_single(), add_event_delta_paired(), df_to_db() and db_to_df() (against a temporary SQLite
+    database) on synthetic event logs of each size, recording wall time, rows per second and peak memory. Results are
+    appended to results_path, if given, so runs can be compared over time, e.g. before and after a change.
+
+    :param sizes:               list, required          event log sizes, in rows
+    :param methods:             list, optional          delta function methods to compare
+    :param results_path:        str, optional           CSV file to append results to
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    df                      one row per benchmark
+    """
+
+    results = []
+
+    def record(benchmark, method, n_rows, seconds, peak_mb):
+        results.append({
+            'run_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'benchmark': benchmark,
+            'method': method,
+            'n_rows': n_rows,
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(n_rows / max(seconds, 1e-9)),
+            'peak_mb': round(peak_mb, 1),
+        })
+        print(f'{benchmark:<24} {method:<12} {n_rows:>12,} rows  {seconds:>9.3f} s  '
+              f'{n_rows / max(seconds, 1e-9):>14,.0f} rows/s  {peak_mb:>9.1f} MB') if verbose else None
+
+    for n_rows in sizes:
+        df = generate_event_log(n_rows, events_per_project=events_per_project, start_match_rate=start_match_rate,
+                                end_match_rate=end_match_rate, seed=seed)
+
+        for method in methods:
+            _, seconds, peak_mb = measure(lambda: add_event_delta_single(
+                df=df.copy(), col_prefix='res_time', id_field='project_id', date_field='event_date',
+                start_conditions=single_start_conditions, end_conditions=single_end_conditions, method=method
+            ))
+            record('add_event_delta_single', method, n_rows, seconds, peak_mb)
+
+            _, seconds, peak_mb = measure(lambda: add_event_delta_paired(
+                df=df.copy(), col_prefix='correspondence', id_field='project_id', date_field='event_date',
+                start_conditions=paired_start_conditions, end_conditions=paired_end_conditions, method=method
+            ))
+            record('add_event_delta_paired', method, n_rows, seconds, peak_mb)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(db=os.path.join(tmp, 'benchmark.db'), dialect='sqlite', user='', password='',
+                                   endpoint='', reuse=False)
+
+            for bulk in (False, True):
+                _, seconds, peak_mb = measure(lambda: df_to_db(engine=engine, df=df, tbl='event_log',
+                                                               if_tbl_exists='replace', bulk=bulk))
+                record('df_to_db', 'bulk' if bulk else 'to_sql', n_rows, seconds, peak_mb)
+
+            _, seconds, peak_mb = measure(lambda: db_to_df(query='SELECT * FROM event_log', engine=engine))
+            record('db_to_df', 'read_sql', n_rows, seconds, peak_mb)
+
+            engine.dispose()
+
+    results_df = pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+    if results_path:
+        is_new = not os.path.exists(results_path)
+        results_df.to_csv(results_path, mode='a', header=is_new, index=False)
+        print(f'Appended {len(results_df)} results to {results_path}.') if verbose else None
+
+    return results_df
+
+
+if __name__ == '__main__':
+    run_benchmarks(sizes=sizes, methods=methods, results_path=results_path, verbose=verbose)
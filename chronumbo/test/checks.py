@@ -0,0 +1,271 @@
+import itertools
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from chronumbo.core.aggregate import (
+    DeltaSummary
+)
+
+from chronumbo.core.event_log import (
+    iter_complete_groups
+)
+
+from chronumbo.core.pushdown import (
+    db_event_delta_paired,
+    db_event_delta_single
+)
+
+from chronumbo.core.sql import (
+    _copy_csv,
+    create_engine,
+    db_to_df,
+    db_to_df_partitioned,
+    df_to_db
+)
+
+from chronumbo.core.synthetic import (
+    generate_event_log
+)
+
+from chronumbo.main import (
+    add_event_delta_paired,
+    add_event_delta_single
+)
+
+
+# ===== check variables ==============================================================================================
+
+verbose = True
+
+
+# ===== checks =======================================================================================================
+
+def check_partitioned_reads(verbose=False):
+    """
+    Checks that db_to_df_partitioned() reads every row exactly once, against a temporary SQLite database, for each
+    partitioning and number of partitions, including null ids and ids outside of given bounds.
+
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    df = pd.DataFrame({'project_id': [-7, -3, -1, 0, 1, 2, 5, 8, 13, 21, None],
+                       'event_seq': range(11)})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(db=os.path.join(tmp, 'checks.db'), dialect='sqlite', user='', password='', endpoint='',
+                               reuse=False)
+        df_to_db(engine=engine, df=df, tbl='event_log', if_tbl_exists='replace')
+
+        cases = [(partition_by, n, None) for partition_by in ('modulo', 'range') for n in (1, 2, 3, 5)]
+        cases += [('range', 3, [0, 2, 10, 15])]                         # ids below and above bounds
+        for partition_by, n_partitions, bounds in cases:
+            result = db_to_df_partitioned(query='SELECT * FROM event_log', engine=engine, id_field='project_id',
+                                          n_partitions=n_partitions, partition_by=partition_by, bounds=bounds)
+            seqs = sorted(result['event_seq'])
+            assert seqs == list(range(len(df))), \
+                f'{partition_by} with {n_partitions} partitions read rows {seqs}; expected each row exactly once'
+
+        engine.dispose()
+
+    print('db_to_df_partitioned() reads each row exactly once.') if verbose else None
+
+
+def check_complete_groups(verbose=False):
+    """
+    Checks that iter_complete_groups() yields each group whole and once, with groups split across chunks, and raises
+    for chunks that are not ordered by id_field, rather than yielding a group twice.
+
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    def chunks(*ids):
+        return [pd.DataFrame({'project_id': chunk_ids}) for chunk_ids in ids]
+
+    groups = [df['project_id'].tolist() for df in iter_complete_groups(chunks([1, 1, 2], [2, 2, 3], [3, 4]),
+                                                                          'project_id')]
+    assert groups == [[1, 1], [2, 2, 2], [3, 3], [4]], f'groups {groups} split or repeated'
+
+    for unordered in (chunks([1, 2], [1, 3]), chunks([1, 3, 2])):
+        try:
+            list(iter_complete_groups(unordered, 'project_id'))
+        except ValueError:
+            continue
+        raise AssertionError(f'unordered chunks {[df["project_id"].tolist() for df in unordered]} did not raise')
+
+    print('iter_complete_groups() yields whole groups, and rejects unordered chunks.') if verbose else None
+
+
+def check_percentile_accuracy(verbose=False):
+    """
+    Checks DeltaSummary percentiles against exact quantiles from numpy.quantile(), on 200,000 log-normal durations fed
+    in chunks to summaries of 8 partitions, which are then merged; within 2% of the exact value up to p99.9.
+
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    deltas = np.random.default_rng(0).lognormal(mean=8, sigma=1.5, size=200_000)
+
+    summaries = []
+    for partition in np.array_split(deltas, 8):
+        summary = DeltaSummary()
+        for chunk in np.array_split(partition, 10):
+            summary.update(pd.DataFrame({'delta_sec': chunk}))
+        summaries.append(summary)
+    for summary in summaries[1:]:
+        summaries[0].merge(summary)
+
+    percentiles = (0.5, 0.9, 0.99, 0.999)
+    estimates = summaries[0].to_frame(percentiles=percentiles).iloc[0]
+    for q in percentiles:
+        exact = np.quantile(deltas, q)
+        error = abs(estimates[f'p{q * 100:g}'] - exact) / exact
+        assert error <= 0.02, f'p{q * 100:g} is {error:.2%} from the exact quantile; expected within 2%'
+        print(f'p{q * 100:g} within {error:.2%} of the exact quantile.') if verbose else None
+
+
+def check_bulk_round_trip(verbose=False):
+    """
+    Checks that empty strings and nulls are told apart by df_to_db(bulk=True): on a temporary SQLite database, with
+    and without bulk, and in the CSV sent by COPY FROM STDIN to PostgreSQL, read back by PostgreSQL's CSV rules (an
+    unquoted empty field is NULL, a quoted one is an empty string).
+
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    df = pd.DataFrame({'alias': ['', None, 'x', 'say "hi", then \\N'],
+                       'event_seq': [0, 1, 2, 3]})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(db=os.path.join(tmp, 'checks.db'), dialect='sqlite', user='', password='', endpoint='',
+                               reuse=False)
+        for bulk in (False, True):
+            df_to_db(engine=engine, df=df, tbl='event_log', if_tbl_exists='replace', bulk=bulk)
+            result = db_to_df(query='SELECT * FROM event_log ORDER BY event_seq', engine=engine)
+            pd.testing.assert_frame_equal(result, df, obj=f'SQLite round trip with bulk={bulk}')
+        engine.dispose()
+
+    values = df.astype(object).where(df.notna(), None)                 # as DataFrame.to_sql() passes rows
+    buffer, n_rows = _copy_csv(values.itertuples(index=False, name=None))
+    rows = [[field[1:-1].replace('""', '"') if field.startswith('"') else field or None
+             for field in re.findall(r'(?:^|(?<=,))("(?:[^"]|"")*"|[^,]*)', line)]
+            for line in buffer.getvalue().splitlines()]
+    expected = [[alias, str(seq)] for alias, seq in values.itertuples(index=False, name=None)]
+    assert n_rows == len(df) and rows == expected, f'COPY reads back {rows}; expected {expected}'
+
+    print('df_to_db(bulk=True) keeps empty strings and nulls apart.') if verbose else None
+
+
+def check_single_parity(verbose=False):
+    """
+    Checks that add_event_delta_single() gives the same result with method='vectorized' as with method='iterrows', for
+    every combination of start_at_earliest, end_at_latest, use_earliest_if_no_start and use_latest_if_no_end, on a
+    synthetic event log with null ids, out of order.
+
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    df = generate_event_log(2000, seed=1)
+    df.loc[df.sample(frac=0.02, random_state=0).index, 'project_id'] = None
+    df = df.sample(frac=1, random_state=0)
+
+    flag_names = ('start_at_earliest', 'end_at_latest', 'use_earliest_if_no_start', 'use_latest_if_no_end')
+    for flags in itertools.product((True, False), repeat=len(flag_names)):
+        results = [add_event_delta_single(df=df, col_prefix='project_res_time', id_field='project_id',
+                                          date_field='event_date',
+                                          start_conditions={'event': 'Status', 'description': 'Created'},
+                                          end_conditions={'event': 'Status', 'description': 'Resolved'},
+                                          method=method, **dict(zip(flag_names, flags)))
+                   for method in ('iterrows', 'vectorized')]
+        pd.testing.assert_frame_equal(results[1], results[0], obj=f'vectorized with {dict(zip(flag_names, flags))}')
+
+    print('add_event_delta_single() is the same vectorized as with iterrows.') if verbose else None
+
+
+def check_paired_parity(verbose=False):
+    """
+    Checks that add_event_delta_paired() gives the same result with method='vectorized' as with method='iterrows', on
+    a synthetic event log with null ids, out of order. Employee correspondence matches both start and end conditions,
+    so pairs are opened and closed by rows that toggle, as well as by rows matching only one.
+
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    df = generate_event_log(2000, seed=2)
+    df.loc[df.sample(frac=0.02, random_state=0).index, 'project_id'] = None
+    df = df.sample(frac=1, random_state=0)
+
+    results = [add_event_delta_paired(df=df, col_prefix='project_corr_time', id_field='project_id',
+                                      date_field='event_date', start_conditions={'event': 'Correspondence'},
+                                      end_conditions={'event': 'Correspondence', 'is_employee': True}, method=method)
+               for method in ('iterrows', 'vectorized')]
+    pd.testing.assert_frame_equal(results[1], results[0], obj='vectorized')
+
+    print('add_event_delta_paired() is the same vectorized as with iterrows.') if verbose else None
+
+
+def check_pushdown(verbose=False):
+    """
+    Checks that db_event_delta_single() and db_event_delta_paired(), run on a temporary SQLite database, return the
+    same intervals as add_event_delta_single() and add_event_delta_paired() with output='intervals', for every
+    combination of the earliest and latest options of the single metric.
+
+    :param verbose:             bool, optional          if True, print status to terminal
+    :return:                    None
+    """
+
+    df = generate_event_log(2000, seed=3)
+    single = dict(id_field='project_id', date_field='event_date',
+                  start_conditions={'event': 'Status', 'description': 'Created'},
+                  end_conditions={'event': 'Status', 'description': 'Resolved'})
+    paired = dict(id_field='project_id', date_field='event_date', start_conditions={'event': 'Correspondence'},
+                  end_conditions={'event': 'Correspondence', 'is_employee': True})
+
+    def compare(db_result, intervals, name):
+        db_result = db_result.assign(start_ts=pd.to_datetime(db_result['start_ts']),
+                                     end_ts=pd.to_datetime(db_result['end_ts']))
+        columns = list(db_result.columns)
+        db_result, intervals = [result[columns].astype({'start_ts': 'datetime64[ns]', 'end_ts': 'datetime64[ns]'})
+                                .sort_values(columns).reset_index(drop=True) for result in (db_result, intervals)]
+        pd.testing.assert_frame_equal(db_result, intervals, check_dtype=False, atol=1e-3, obj=name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(db=os.path.join(tmp, 'checks.db'), dialect='sqlite', user='', password='', endpoint='',
+                               reuse=False)
+        df_to_db(engine=engine, df=df, tbl='event_log', if_tbl_exists='replace')
+
+        flag_names = ('start_at_earliest', 'end_at_latest', 'use_earliest_if_no_start', 'use_latest_if_no_end')
+        for flags in itertools.product((True, False), repeat=len(flag_names)):
+            options = dict(zip(flag_names, flags))
+            compare(db_event_delta_single(query='SELECT * FROM event_log', engine=engine, dialect='sqlite',
+                                          **single, **options),
+                    add_event_delta_single(df=df, col_prefix='project_res_time', output='intervals', **single,
+                                           **options),
+                    f'db_event_delta_single() with {options}')
+
+        compare(db_event_delta_paired(query='SELECT * FROM event_log', engine=engine, dialect='sqlite', **paired),
+                add_event_delta_paired(df=df, col_prefix='project_corr_time', output='intervals', **paired),
+                'db_event_delta_paired()')
+
+        engine.dispose()
+
+    print('SQL pushdown on SQLite gives the same intervals as pandas.') if verbose else None
+
+
+if __name__ == '__main__':
+    check_partitioned_reads(verbose=verbose)
+    check_complete_groups(verbose=verbose)
+    check_percentile_accuracy(verbose=verbose)
+    check_bulk_round_trip(verbose=verbose)
+    check_single_parity(verbose=verbose)
+    check_paired_parity(verbose=verbose)
+    check_pushdown(verbose=verbose)
@@ -50,10 +50,12 @@ engine = create_engine(                                         # create SQL con
 df = db_to_df(                                                  # create test DataFrame from SQL query
     query=audit_query,
     engine=engine,
+    optimize=True,                                              # parse dates, categorical event columns, downcast ids
+    date_field=event_date_field,
+    id_field=id_field,
     verbose=verbose
 )
 
-# df[event_date_field] = pd.to_datetime(df[event_date_field])   # date field must be datetime
 df_sorted = df.sort_values(by=[id_field, event_date_field])     # sort by IDs and date
 
 final_kpi_single_df = add_event_delta_single(                   # find start, end point pair; return df with added values